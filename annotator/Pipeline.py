@@ -1,25 +1,253 @@
-from __future__ import print_function
+import threading
 import pandas as pd
 import synapseclient as sc
-import readline
 from . import utils
+from . import client
+from . import trace
+from . import ops
+from . import backends
+from . import parallel
+from . import session
 from . import schema as schemaModule
 from copy import deepcopy
+from concurrent.futures import (Future, ThreadPoolExecutor, CancelledError,
+                                TimeoutError, wait)
 
 
-class Pipeline:
+def _then(future, func):
+    """ A future of `func` applied to the result of `future`. """
+    result = Future()
+
+    def done(f):
+        try:
+            result.set_result(func(f.result()))
+        except Exception as ex:
+            result.set_exception(ex)
+    future.add_done_callback(done)
+    return result
+
+
+class _Loading(object):
+    """ An attribute which may still be loading in the background.
+
+    Its value may be set to a Future, in which case reading it blocks
+    until the future completes and the attribute then takes the result
+    of the future (or raises its exception). Setting the attribute
+    discards any loading in progress.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = obj.__dict__.get(self.name)
+        if isinstance(value, Future):
+            value = value.result()
+            obj.__dict__[self.name] = value
+        return value
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.name] = value
+
+
+class PublishHandle(object):
+    """ A publish running in the background, returned by
+    `Pipeline.publish(background=True)`.
+
+    Rows are uploaded from a snapshot of the view taken when the publish
+    started, in chunks of `backends.CHUNK_SIZE` rows, after which the
+    snapshot is given the row versions it was stored with. The edits made
+    to the Pipeline in the meantime are then applied to it by
+    `self.result()` or by the next operation on the Pipeline.
+    """
+
+    def __init__(self, pipeline, snapshot):
+        self.viewId = pipeline._entityViewSchema.id
+        self.snapshot = snapshot
+        self.total = len(snapshot)
+        self.stored = 0
+        self.stage = 'uploading'
+        self._pipeline = pipeline
+        self._lock = threading.Lock()
+        self._cancelled = False
+        executor = ThreadPoolExecutor(max_workers=1)
+        self._future = executor.submit(trace.bind(self._run))
+        executor.shutdown(wait=False)
+
+    def _chunks(self):
+        if isinstance(self.snapshot, backends.SqliteView):
+            return self.snapshot.chunks()
+        return (self.snapshot.iloc[i:i + backends.CHUNK_SIZE]
+                for i in range(0, self.total, backends.CHUNK_SIZE))
+
+    def _checkCancelled(self):
+        if self._cancelled:
+            self.stage = 'cancelled'
+            raise CancelledError("Publish of {} canceled after {} of {} "
+                                 "rows.".format(self.viewId, self.stored,
+                                                self.total))
+
+    def _run(self):
+        for chunk in self._chunks():
+            with self._lock:
+                self._checkCancelled()
+            self._pipeline.syn.store(sc.Table(self.viewId, chunk))
+            self.stored += len(chunk)
+        with self._lock:
+            self._checkCancelled()
+            self.stage = 'fetching'
+        snapshot = self.snapshot
+        if isinstance(snapshot, backends.SqliteView):
+            snapshot = snapshot.snapshot()  # kept for `_reconcile`
+        view = self._pipeline._refresh(snapshot, self.viewId)
+        self.stage = 'done'
+        return view
+
+    @property
+    def progress(self):
+        """ Fraction of the rows uploaded so far. """
+        return self.stored / self.total if self.total else 1.0
+
+    def done(self):
+        """ Whether the publish finished, failed or was canceled. """
+        return self._future.done()
+
+    def cancel(self):
+        """ Stop uploading rows. Rows already stored on Synapse stay stored,
+        and the view of the Pipeline is left as it is.
+
+        Returns
+        -------
+        True if the publish will be canceled, False if it is done
+        uploading.
+        """
+        with self._lock:
+            if self.stage != 'uploading':
+                return False
+            self._cancelled = True
+            return True
+
+    def result(self, timeout=None):
+        """ Wait for the publish to finish and apply it to the Pipeline.
+
+        Parameters
+        ----------
+        timeout : float
+            Optional. Seconds to wait for. Defaults to waiting until done.
+
+        Returns
+        -------
+        The Synapse ID of the file view.
+
+        Raises
+        ------
+        concurrent.futures.TimeoutError if not done within `timeout`,
+        concurrent.futures.CancelledError if canceled, or the error which
+        made the publish fail.
+        """
+        if not wait([self._future], timeout).done:
+            raise TimeoutError()
+        self._pipeline._reconcile()
+        self._future.result()
+        return self.viewId
+
+
+class BuildHandle(object):
+    """ A file view being read in the background, returned by
+    `Pipeline.createFileView(wait=False)`.
+
+    Rows are read a page at a time as Synapse indexes the scope of the
+    view (see `utils.queryPages`). Accessing `view` of the Pipeline blocks
+    until all of them are read.
+    """
+
+    def __init__(self, pipeline, viewId, defaults=None):
+        self.viewId = viewId
+        self.rows = 0
+        self.stage = 'indexing'
+        self._pipeline = pipeline
+        self._defaults = defaults or {}
+        executor = ThreadPoolExecutor(max_workers=1)
+        self._future = executor.submit(trace.bind(self._run))
+        executor.shutdown(wait=False)
+
+    def _pages(self):
+        for page in utils.queryPages(self._pipeline.syn, self.viewId,
+                                     pageSize=backends.CHUNK_SIZE):
+            self.stage = 'fetching'
+            self.rows += len(page)
+            yield page
+
+    def _run(self):
+        pipeline = self._pipeline
+        if pipeline._backend == 'sqlite':
+            view = backends.SqliteView()
+            view.write(self._pages(), sortCols=pipeline._sortCols)
+        else:
+            pages = list(self._pages())
+            view = pd.concat(pages) if pages else None
+            if view is not None and pipeline._sortCols:
+                view = view.sort_index(axis=1)
+        if not self.rows:
+            view = pipeline._read(self.viewId)
+        for k, v in self._defaults.items():
+            view[k] = v
+        self.stage = 'done'
+        return view
+
+    def done(self):
+        """ Whether all rows were read, or reading them failed. """
+        return self._future.done()
+
+    def result(self, timeout=None):
+        """ Wait for all rows to be read.
+
+        Parameters
+        ----------
+        timeout : float
+            Optional. Seconds to wait for. Defaults to waiting until done.
+
+        Returns
+        -------
+        The Synapse ID of the file view.
+
+        Raises
+        ------
+        concurrent.futures.TimeoutError if not done within `timeout`, or
+        the error which made reading the view fail.
+        """
+        self._future.result(timeout)
+        return self.viewId
+
+
+@trace.tracedMethods
+class Pipeline(object):
     """ Annotations pipeline object. """
 
     BACKUP_LENGTH = 50
+    SQLITE_BACKUP_LENGTH = 5  # backups of the 'sqlite' backend are on disk
+
+    _suspendBackup = False
+    _publishing = None  # PublishHandle of a background publish
+
+    view = _Loading('view')
+    schema = _Loading('schema')
+    _meta = _Loading('_meta')
+    _entityViewSchema = _Loading('_entityViewSchema')
+    _index = _Loading('_index')
 
     def __init__(self, syn, view=None, meta=None, activeCols=[],
-                 metaActiveCols=[], links=None, sortCols=True, schema=None):
+                 metaActiveCols=[], links=None, sortCols=True, schema=None,
+                 confirm=None, lazy=False, backend='pandas', workers=1):
         """ Create a new Pipeline object.
 
         Parameters
         ----------
         syn : synapseclient.Synapse
-            Synapse object to communicate with Synapse.org.
+            Synapse object to communicate with Synapse.org. Calls are made
+            through an `annotator.client.Client` wrapping it.
         view : str or pandas.DataFrame
             Optional. The "data". If a str, needs to be the Synapse ID of
             a file view or table. Defaults to `None`.
@@ -40,49 +268,156 @@ class Pipeline:
         sortCols : bool
             Optional. Whether to sort the columns lexicographically in
             `view` and/or `meta`. Defaults to True.
+        schema : str or pandas.DataFrame
+            Optional. A flattened schema (see `schema.flattenJson`) or the
+            path or URL of a JSON schema. Defaults to `None`.
+        confirm : bool
+            Optional. How to answer requests for confirmation, e.g. to
+            publish despite validation warnings: `None` asks the user,
+            True proceeds and False declines. Defaults to `None`.
+        lazy : bool
+            Optional. Whether to defer `addDefaultValues`,
+            `substituteColumnValues`, `addFileFormatCol` and `inferValues`
+            to a plan, which is optimized and executed in a single pass
+            over `self.view` by `self.collect()`, `self.publish()` or any
+            other method which uses the view, e.g. `self.head()` or
+            `self.valueCounts()`, or which replaces it. Reading `self.view`
+            directly does not run the plan: call `self.collect()`, which
+            returns the view, instead. Ignored by the 'sqlite' backend.
+            Defaults to False.
+        backend : str
+            Optional. Where to keep `self.view`: 'pandas' keeps it in memory
+            as a pandas.DataFrame, 'sqlite' keeps it on disk as a
+            `backends.SqliteView`, for views too large for memory (see
+            `annotator.backends`). Defaults to 'pandas'.
+        workers : int
+            Optional. Number of processes to partition the rows of
+            `self.view` across for regular expression extraction
+            (`addKeyCol`, `addFileFormatCol`), validation and `inferValues`,
+            once the view has at least `parallel.MIN_ROWS` rows (see
+            `annotator.parallel`). If None, the number of processors.
+            Workers are only forked while no other thread runs (e.g. a
+            background load or publish); otherwise they are started
+            afresh and receive pickled partitions. Ignored by the 'sqlite'
+            backend. Defaults to 1.
+
+        Notes
+        -----
+        Views, metadata and schemas which need to be read from Synapse or
+        elsewhere are loaded concurrently in the background. Accessing
+        `self.view`, `self.schema` or the metadata blocks until the
+        corresponding load completes, and raises any error it met.
         """
-        self.syn = syn
-        self.view = view if view is None else self._parseView(view, sortCols)
-        self._entityViewSchema = (self.syn.get(view)
-                                  if isinstance(view, str) else None)
-        self.schema = (schemaModule.flattenJson(schema)
+        if backend not in backends.BACKENDS:
+            raise ValueError("`backend` must be one of {}.".format(
+                ", ".join(backends.BACKENDS)))
+        self.syn = client.wrap(syn)
+        self._ops = []
+        self._backend = backend
+        loads = [isinstance(view, str), isinstance(meta, (str, list)),
+                 isinstance(schema, str)]
+        executor = ThreadPoolExecutor(max_workers=max(1, sum(loads)))
+        if isinstance(view, str):
+            entity = executor.submit(trace.bind(self.syn.get), view)
+            if backend == 'sqlite':
+                df = _then(entity, lambda e: backends.synread(
+                    self.syn, view, e, sortCols))
+                self._index = None
+            else:
+                df = _then(entity, lambda e:
+                           utils._synread(view, e, self.syn, sortCols))
+                self._index = _then(df, lambda d: d.index)
+            self._entityViewSchema = entity
+            self.view = df
+        else:
+            self._entityViewSchema = None
+            self.view = (view if view is None
+                         else self._parseView(view, sortCols))
+            if backend == 'sqlite' and self.view is not None:
+                self.view = backends.SqliteView.fromFrame(self.view)
+            self._index = self.view.index if isinstance(
+                    self.view, pd.DataFrame) else None
+        self.schema = (executor.submit(trace.bind(schemaModule.flattenJson),
+                                       schema)
                        if isinstance(schema, str) else schema)
-        self._index = self.view.index if isinstance(
-                self.view, pd.DataFrame) else None
+        if isinstance(meta, (str, list)):
+            self._meta = executor.submit(trace.bind(self._parseView), meta,
+                                         sortCols, isMeta=True)
+        else:
+            self._meta = meta if meta is None else self._parseView(
+                    meta, sortCols, isMeta=True)
+        executor.shutdown(wait=False)
         self._activeCols = []
         if activeCols:
             self.addActiveCols(activeCols, backup=False)
-        self._meta = meta if meta is None else self._parseView(
-                meta, sortCols, isMeta=True)
         self._metaActiveCols = []
         if metaActiveCols:
             self.addActiveCols(metaActiveCols, isMeta=True, backup=False)
         self._sortCols = sortCols
+        self.confirm = confirm
+        self._lazy = lazy
+        self.workers = workers
+        self._plan = []
+        self._schemaChanges = {'drop': [], 'add': [], 'scope': []}
         self.keyCol = None
         self.links = links if isinstance(links, dict) else None
         self._backup = []
+        self._ops = []  # calls made while constructing are not recorded
 
     def backup(self, message):
         """ Backup the state of `self` and store in `self._backup` """
-        self._backup.append((Pipeline(
-            self.syn, self.view, self._meta, self._activeCols,
-            self._metaActiveCols, self.links, self._sortCols), message))
-        if len(self._backup) > self.BACKUP_LENGTH:
-            self._backup = self._backup[1:]
+        if self._suspendBackup:
+            return
+        if isinstance(self.view, backends.SqliteView):
+            backup = Pipeline(self.syn, None, self._meta, self._activeCols,
+                              self._metaActiveCols, self.links,
+                              self._sortCols)
+            backup.view = self.view.snapshot()
+            length = self.SQLITE_BACKUP_LENGTH
+        else:
+            backup = Pipeline(self.syn, self.view, self._meta,
+                              self._activeCols, self._metaActiveCols,
+                              self.links, self._sortCols)
+            length = self.BACKUP_LENGTH
+        backup._ops = list(self._ops)
+        self._backup.append((backup, message))
+        while len(self._backup) > length:
+            discarded, _ = self._backup.pop(0)
+            if isinstance(discarded.view, backends.SqliteView):
+                discarded.view.discard()
 
     def undo(self):
         """ Revert `self` to last recorded state. """
-        if self._backup:
-            backup, message = self._backup.pop()
-            self.syn = backup.syn
-            self.view = backup.view
-            self._activeCols = backup._activeCols
-            print("Undo: {}".format(message))
+        if self._plan and 'unit' not in self._plan[-1]:
+            op = self._plan.pop()
+            self._ops = self._ops[:-1]
+            print("Undo: {}".format(op['op']))
+        elif self._backup:
+            # deferred operations of a unit go with the backup made before it
+            self._plan = []
+            print("Undo: {}".format(self._restore()))
         else:
             print("At last available change.")
 
+    def _restore(self):
+        """ Revert `self` to its latest backup.
+
+        Returns
+        -------
+        The message of the backup.
+        """
+        backup, message = self._backup.pop()
+        if isinstance(self.view, backends.SqliteView):
+            self.view.discard()
+        self.syn = backup.syn
+        self.view = backup.view
+        self._activeCols = backup._activeCols
+        self._ops = backup._ops
+        return message
+
     def head(self):
         """ Print head of `self.view` """
+        self.collect()
         if hasattr(self.view, 'head'):
             print(self.view.head())
         else:
@@ -90,6 +425,7 @@ class Pipeline:
 
     def tail(self):
         """ Print tail of `self.view` """
+        self.collect()
         if hasattr(self.view, 'tail'):
             print(self.view.tail())
         else:
@@ -97,37 +433,56 @@ class Pipeline:
 
     def shape(self):
         """ Print shape of `self.view` """
+        self.collect()
         if hasattr(self.view, 'shape'):
             print(self.view.shape)
         else:
             print("No data view set.")
 
 
-    def drop(self, labels, axis):
+    @ops.recorded
+    def drop(self, labels, axis, ids=None):
         """ Delete rows or columns from a file view on Synapse.*
             Rows are only dropped locally. Deleting rows from a
             file view on Synapse would require deleting the file itself.
-            Columns are dropped both locally and remotely on Synapse.
+            Columns are dropped both locally and remotely on Synapse,
+            where they are dropped along with the other queued schema
+            changes at the next `self.publish` or `self.commitSchema`.
 
         Parameters
         ----------
         labels : str, list
             Can either be a str indicating the index (usually formatted
             ROWID_VERSION) or a list of str.
-            axis : int
+        axis : int
             For a two-dimensional dataframe, 0 indicates rows whereas
             1 indicates columns.
+        ids : str, list
+            Optional. Synapse IDs (the `id` column) of the rows to drop,
+            instead of `labels`. Row labels change with the row versions
+            whenever the view is published or read again, so dropped rows
+            are recorded by their ID if the view has an `id` column, and
+            replaying the operation drops the same rows of a refreshed
+            view.
 
         Returns
         -------
         A list of indices deleted.
         """
-        labels = [labels] if isinstance(labels, str) else labels
-        if axis == 0:
+        if ids is not None:
+            ids = [ids] if isinstance(ids, str) else list(ids)
+            idCol = self.view['id']
+            labels = list(idCol.index[idCol.isin(ids)])
+        else:
+            labels = [labels] if isinstance(labels, str) else list(labels)
+            if axis == 0 and 'id' in self.view.columns:
+                idCol = self.view['id']
+                ops.resolve(self, labels=None,
+                            ids=list(idCol[idCol.index.isin(labels)]))
+        if axis == 0 and self._index is not None:
             self._index = self._index.drop(labels)
         elif axis == 1:
-            self._entityViewSchema = utils.dropColumns(
-                    self.syn, self._entityViewSchema, labels)
+            self._alterSchema(drop=labels)
             if isinstance(self.schema, pd.DataFrame):
                 self.schema = self.schema[[l not in labels
                                            for l in self.schema.key]]
@@ -163,6 +518,7 @@ class Pipeline:
         style : str
             Optional. One of 'numbers' or 'letters'. Defaults to 'numbers'.
         """
+        self.collect()
         if hasattr(self.view, 'columns'):
             self._prettyPrintColumns(self.view.columns, style)
         else:
@@ -208,31 +564,139 @@ class Pipeline:
             print("No active columns.")
 
 
-    def addView(self, scope):
+    @ops.recorded
+    def addView(self, scope, fetch=True):
         """ Add further Folders/Projects to the scope of `self.view`.
 
+        Only the rows of the files in `scope` are read from Synapse, and
+        those not in `self.view` yet are appended to it. The rows already
+        in `self.view` are left as they are, with their local edits.
+
         Parameters
         ----------
         scope : str, list
             The Synapse IDs of the entites to add to the scope.
+        fetch : bool
+            Optional. Whether to update the scope of the file view on
+            Synapse and read the new rows now, along with the other queued
+            schema changes. Otherwise the scope change is queued, and the
+            new rows are read at the next `self.publish` or
+            `self.commitSchema`. Defaults to True.
 
         Returns
         -------
         synapseclient.Schema
         """
-        self._entityViewSchema = utils.addToScope(self.syn,
-                self._entityViewSchema, scope)
-        # Assuming row version/id values stay the same for the before-update
-        # rows, we can carry over values from the old view.
-        oldIndices = self._index
-        oldColumns = self.view.columns
-        newView = utils.synread(self.syn, self._entityViewSchema.id, silent=True)
-        for c in oldColumns:
-            newView.loc[oldIndices,c] = self.view[c].values
-        self.view = newView
-        self._index = self.view.index
+        scope = [scope] if isinstance(scope, str) else list(scope)
+        self._alterSchema(scope=scope)
+        if fetch:
+            self.commitSchema()
+        return self._entityViewSchema
 
+    @ops.recorded
+    def addColumns(self, cols):
+        """ Add columns to the file view on Synapse, at the next
+        `self.publish` or `self.commitSchema`.
 
+        Parameters
+        ----------
+        cols : str, dict, or list
+            Column definitions, as accepted by `utils.makeColumns`, or a
+            list of column definitions (dict or synapseclient.Column).
+            Columns replace the columns of the same name.
+        """
+        if isinstance(cols, list) and cols and not isinstance(cols[0], str):
+            cols = [dict(c) for c in cols]
+        else:
+            cols = utils.makeColumns(cols, asSynapseCols=False)
+        self._alterSchema(add=cols)
+
+    @ops.recorded
+    def optimizeColumns(self, cols=None, apply=False):
+        """ Propose column types and sizes which fit the values of
+        `self.view`, to keep rows narrow (see `utils.proposeColumns`).
+
+        Parameters
+        ----------
+        cols : str or list
+            Optional. Columns to optimize. Defaults to the active columns.
+        apply : bool
+            Optional. Whether to queue the changed columns as schema
+            changes, applied by `self.publish` or `self.commitSchema`.
+            Defaults to False.
+
+        Returns
+        -------
+        pandas.DataFrame indexed by column, comparing the current and the
+        proposed column types and sizes. Columns which are not in the file
+        view yet are proposed as new columns.
+        """
+        cols = [cols] if isinstance(cols, str) else cols
+        cols = [c for c in (self._activeCols if cols is None else cols)
+                if c in self.view.columns]
+        current = {c['name']: c for c in
+                   self.syn.getTableColumns(self._entityViewSchema.id)}
+        current.update((c['name'], c) for c in self._schemaChanges['add'])
+        for c in self._schemaChanges['drop']:
+            current.pop(c, None)
+        profile = (self.view.profile(cols)
+                   if isinstance(self.view, backends.SqliteView)
+                   else utils.profileColumns(self.view, cols))
+        proposal = utils.proposeColumns(profile, current)
+        if apply:
+            self._alterSchema(add=list(proposal.column[proposal.changed]))
+        return proposal
+
+    def _alterSchema(self, drop=(), add=(), scope=()):
+        """ Queue changes to the schema of the file view, coalescing them
+        with the changes already queued. See `utils.updateSchema`. """
+        changes = self._schemaChanges
+        for name in drop:
+            changes['add'] = [c for c in changes['add'] if c['name'] != name]
+            if name not in changes['drop']:
+                changes['drop'].append(name)
+        for col in add:
+            changes['add'] = [c for c in changes['add']
+                              if c['name'] != col['name']] + [dict(col)]
+        changes['scope'] += [s for s in scope if s not in changes['scope']]
+
+    def commitSchema(self):
+        """ Apply the queued schema changes (see `self.drop`, `self.addView`
+        and `self.addColumns`) to the file view on Synapse with a single
+        update, and read the rows of any Folders/Projects added to its
+        scope.
+
+        Returns
+        -------
+        synapseclient.Schema
+        """
+        changes = self._schemaChanges
+        if not any(changes.values()):
+            return self._entityViewSchema
+        self._entityViewSchema = utils.updateSchema(
+                self.syn, self._entityViewSchema, **changes)
+        self._schemaChanges = {'drop': [], 'add': [], 'scope': []}
+        if changes['scope'] and self.view is not None:
+            self._appendScope(changes['scope'])
+        return self._entityViewSchema
+
+    def _appendScope(self, scope):
+        """ Append the rows of `scope` not in `self.view` yet. """
+        if isinstance(self.view, backends.SqliteView):
+            self.view.append(utils.readScope(
+                self.syn, self._entityViewSchema.id, scope,
+                sortCols=self._sortCols))
+            return
+        newRows = utils.readScope(self.syn, self._entityViewSchema.id, scope,
+                                  exclude=self.view.index,
+                                  sortCols=self._sortCols)
+        view = pd.concat([self.view, newRows], sort=False)
+        self.view = view.sort_index(axis=1) if self._sortCols else view
+        self._index = (newRows.index if self._index is None
+                       else self._index.append(newRows.index))
+
+
+    @ops.recorded
     def addActiveCols(self, activeCols, path=False, isMeta=False, backup=True):
         """ Add column names to `self._activeCols` or `self._metaActiveCols`.
 
@@ -274,6 +738,7 @@ class Pipeline:
         elif path:
             pass
 
+    @ops.recorded
     def addDefaultValues(self, colVals, backup=True):
         """ Set all values in a column of `self.view` to a single value.
 
@@ -288,12 +753,15 @@ class Pipeline:
         if self.view is None:
             print("No data view set.")
             return
+        if self._defer('addDefaultValues', colVals=colVals):
+            return
         if backup:
             self.backup("addDefaultValues")
         for k in colVals:
             self.view[k] = colVals[k]
 
-    def addKeyCol(self):
+    @ops.recorded
+    def addKeyCol(self, dataKey=None, metaKey=None, regex=None):
         """ Add a key column to `self.view`.
 
         A key column is a column in `self.view` whose values can be matched in a
@@ -303,35 +771,51 @@ class Pipeline:
         users requirements is found, the key column is automatically added to
         `self.view` with the same name as the column matched upon
         in `self._meta`.
+
+        Parameters
+        ----------
+        dataKey : str
+            Optional. Column in `self.view` to apply the regular expression
+            to. Prompts the user for `dataKey` and `metaKey` if either is
+            not set.
+        metaKey : str
+            Optional. Column in `self._meta` to match upon.
+        regex : str
+            Optional. A regular expression with one capture group. If set,
+            the user is not prompted for one and, if some captured values
+            are not found in the metadata, a ValueError is raised unless
+            confirmation is given (see `self.confirm`).
         """
         if self.view is None or self._meta is None:
             print("No data view set.")
             return
         self.backup("addKeyCol")
-        link = self._linkCols(1)
-        dataKey, metaKey = link.popitem()
+        if dataKey is None or metaKey is None:
+            dataKey, metaKey = self._linkCols(1).popitem()
+        if regex is not None:
+            newCol, missing = self._checkKeyCol(dataKey, metaKey, regex)
+            if missing:
+                if not self._getUserConfirmation():
+                    raise ValueError("{} values of {} captured by {} are not "
+                                     "found in {}.".format(
+                                         missing, dataKey, regex, metaKey))
+            ops.resolve(self, dataKey=dataKey, metaKey=metaKey)
+            self.keyCol = metaKey
+            self._setKeyCol(dataKey, metaKey, regex, newCol)
+            return
         regex = ''
         print("Data", "\n\n")
         print("head")
-        print(self.view[dataKey].head(), "\n\n")
+        print(self.view.head()[dataKey], "\n\n")
         print()
         print("tail")
-        print(self.view[dataKey].tail(), "\n\n")
+        print(self.view.tail()[dataKey], "\n\n")
         print("Metadata", "\n\n")
         print(self._meta[metaKey].head(), "\n\n")
         while True:
             regex = self._inputDefault("regex: ", regex)
-            newCol = utils.colFromRegex(self.view[dataKey].values, regex)
-            missingVals = [v not in self._meta[metaKey].values.astype(str)
-                           for v in newCol]
-            if any(missingVals):
-                before_regex = self.view[dataKey][missingVals]
-                after_regex = [newCol[i] for i in range(len(newCol))
-                               if missingVals[i]]
-                print("The following values were not found in the metadata:")
-                for i in range(len(before_regex)):
-                    print(after_regex[i], "<-", before_regex[i])
-                print()
+            newCol, missing = self._checkKeyCol(dataKey, metaKey, regex)
+            if missing:
                 proceedAnyways = self._getUserConfirmation()
                 if proceedAnyways:
                     break
@@ -339,8 +823,74 @@ class Pipeline:
                     continue
             else:
                 break
+        ops.resolve(self, dataKey=dataKey, metaKey=metaKey, regex=regex)
         self.keyCol = metaKey
-        self.view[metaKey] = newCol
+        self._setKeyCol(dataKey, metaKey, regex, newCol)
+
+    def _checkKeyCol(self, dataKey, metaKey, regex):
+        """ Apply `regex` to a column of `self.view` and print the captured
+        values which are missing from a column of `self._meta`.
+
+        Returns
+        -------
+        The list of captured values (None under the 'sqlite' backend, which
+        does not read them into memory) and the number of missing values.
+        """
+        if isinstance(self.view, backends.SqliteView):
+            missing, sample = self.view.unmatched(
+                    dataKey, regex, self._meta[metaKey].values)
+            if missing:
+                print("The following values were not found in the metadata:")
+                for after, before in sample:
+                    print(after, "<-", before)
+                if missing > len(sample):
+                    print("... and {} more".format(missing - len(sample)))
+                print()
+            return None, missing
+        newCol, missingVals = self._matchKeyCol(dataKey, metaKey, regex)
+        if any(missingVals):
+            self._printMissingKeys(dataKey, newCol, missingVals)
+        return newCol, sum(missingVals)
+
+    def _setKeyCol(self, dataKey, metaKey, regex, newCol):
+        """ Add the key column found by `self._checkKeyCol` to `self.view`. """
+        if isinstance(self.view, backends.SqliteView):
+            self.view.capture(dataKey, metaKey, regex)
+        else:
+            self.view[metaKey] = newCol
+
+    def _matchKeyCol(self, dataKey, metaKey, regex):
+        """ Apply `regex` to a column of `self.view` and look up the results
+        in a column of `self._meta`.
+
+        Parameters
+        ----------
+        dataKey : str
+            Column in `self.view` to apply `regex` to.
+        metaKey : str
+            Column in `self._meta` to look up the results in.
+        regex : str
+            A regular expression with at least one capture group.
+
+        Returns
+        -------
+        The list of values captured by `regex` and a list of bools, True
+        where the captured value is missing from the metadata.
+        """
+        metaValues = set(self._meta[metaKey].values.astype(str))
+        return parallel.matchKeys(self.view[dataKey].values, regex,
+                                  metaValues, self.workers)
+
+    def _printMissingKeys(self, dataKey, newCol, missingVals):
+        """ Print the values captured from `dataKey` which are missing from
+        the metadata (see `self._matchKeyCol`). """
+        before_regex = self.view[dataKey].values[missingVals]
+        after_regex = [newCol[i] for i in range(len(newCol))
+                       if missingVals[i]]
+        print("The following values were not found in the metadata:")
+        for i in range(len(before_regex)):
+            print(after_regex[i], "<-", before_regex[i])
+        print()
 
     def _inputDefault(self, prompt, prefill=''):
         """ Get input from the user from a prompt with preexisting text.
@@ -356,12 +906,14 @@ class Pipeline:
         -------
         User input.
         """
+        import readline
         readline.set_startup_hook(lambda: readline.insert_text(prefill))
         try:
             return input(prompt)
         finally:
             readline.set_startup_hook()
 
+    @ops.recorded
     def addFileFormatCol(self, referenceCol='name', newColName='fileFormat'):
         """ Add a file format column using a preprogrammed regular expression.
 
@@ -372,12 +924,19 @@ class Pipeline:
         fileFormatColName : str
             Optional. Name of newly created column. Defaults to 'fileFormat'.
         """
+        if self._defer('addFileFormatCol', referenceCol=referenceCol,
+                       newColName=newColName):
+            return
         self.backup("addFileFormatCol")
-        regex = r"\.(\w+)(?:\.gz)?$"
-        filetypeCol = utils.colFromRegex(
-                self.view[referenceCol].values, regex)
+        if isinstance(self.view, backends.SqliteView):
+            self.view.capture(referenceCol, newColName, utils.FILE_FORMAT_REGEX)
+            return
+        filetypeCol = parallel.colFromRegex(
+                self.view[referenceCol].values, utils.FILE_FORMAT_REGEX,
+                self.workers)
         self.view[newColName] = filetypeCol
 
+    @ops.recorded
     def addLinks(self, links=None, append=True, backup=True):
         """ Add link values to `self.links`
 
@@ -398,6 +957,7 @@ class Pipeline:
             self.backup("addLinks")
         if links is None:
             links = self._linkCols(-1)
+            ops.resolve(self, links=links)
         if not isinstance(links, dict):
             raise TypeError("`links` must be a dictionary-like object")
         if not self.links or not append:
@@ -436,6 +996,7 @@ class Pipeline:
             return False
         return True
 
+    @ops.recorded
     def substituteColumnValues(self, col, mod):
         """ Substitute values in a column according to a mapping.
 
@@ -446,9 +1007,14 @@ class Pipeline:
         mod : dict
             Mappings from the old to new values.
         """
+        if self._defer('substituteColumnValues', col=col, mod=mod):
+            return
         self.backup("substituteColumnValues")
+        if isinstance(self.view, backends.SqliteView):
+            self.view.substitute(col, mod)
+            return
         self.view.loc[:, col] = utils.substituteColumnValues(
-                self.view[col].values)
+                self.view[col].values, mod)
 
     def _parseView(self, view, sortCols, isMeta=False):
         """ Turn `view` into a pandas DataFrame.
@@ -470,17 +1036,17 @@ class Pipeline:
         """
         if isinstance(view, str):
             return utils.synread(self.syn, view, sortCols=sortCols)
-        elif isinstance(view, list) and meta:
+        elif isinstance(view, list) and isMeta:
             return utils.combineSynapseTabulars(self.syn, view, axis=1)
         elif isinstance(view, pd.DataFrame):
             if sortCols:
-                view = view.sort_index(1)
+                view = view.sort_index(axis=1)
             return deepcopy(view)
         else:
             raise TypeError(
                     "{} is not a supported data input type".format(type(view)))
 
-    def publish(self, validate=True):
+    def publish(self, validate=True, background=False, optimize=False):
         """ Store `self.view` back to the file view it was derived
         from on Synapse.
 
@@ -489,7 +1055,25 @@ class Pipeline:
         validate : bool
             Optional. Whether to warn of possible errors in `self.view`.
             Defaults to True.
+        background : bool
+            Optional. Whether to upload a snapshot of `self.view` on a
+            background thread, so that work can go on meanwhile. Edits made
+            in the meantime are kept and applied to the published view.
+            Defaults to False.
+        optimize : bool
+            Optional. Whether to right-size the active columns to their
+            values first (see `self.optimizeColumns`). Defaults to False.
+
+        Queued schema changes are applied first (see `self.commitSchema`).
+
+        Returns
+        -------
+        The Synapse ID of the file view, or a `PublishHandle` if
+        `background` is True.
         """
+        if self._publishing is not None:
+            self._publishing.result()
+        self.collect()
         if validate:
             warnings = self._validate()
             if len(warnings):
@@ -500,15 +1084,52 @@ class Pipeline:
                 if not continueAnyways:
                     print("Publish canceled.")
                     return
-        t = sc.Table(self._entityViewSchema.id, self.view)
+        if optimize:
+            self.optimizeColumns(apply=True)
+        self.commitSchema()
+        if background:
+            snapshot = (self.view.snapshot() if isinstance(
+                self.view, backends.SqliteView) else self.view.copy())
+            self._publishing = PublishHandle(self, snapshot)
+            return self._publishing
         print("Storing to Synapse...")
-        t_online = self.syn.store(t)
+        if isinstance(self.view, backends.SqliteView):
+            for chunk in self.view.chunks():
+                self.syn.store(sc.Table(self._entityViewSchema.id, chunk))
+        else:
+            t = sc.Table(self._entityViewSchema.id, self.view)
+            t_online = self.syn.store(t)
         print("Fetching new table index...")
-        self.view = utils.synread(self.syn, self._entityViewSchema.id)
-        self._index = self.view.index
+        self.view = self._refresh(self.view, self._entityViewSchema.id)
+        self._index = self.view.index if isinstance(
+                self.view, pd.DataFrame) else None
         print("You're good to go :~)")
         return self._entityViewSchema.id
 
+    def _reconcile(self):
+        """ Apply a finished background publish to `self.view`: replace it
+        with the published view, with its new row versions, carrying over
+        the edits made since the publish started. """
+        handle = self._publishing
+        if handle is None or not handle.done():
+            return
+        self._publishing = None
+        try:
+            view = handle._future.result()
+        except Exception:
+            view = None  # raised by `handle.result()`
+        if isinstance(handle.snapshot, backends.SqliteView):
+            if view is not None:
+                view.rebase(handle.snapshot, self.view)
+                self.view.discard()
+            handle.snapshot.discard()
+        elif view is not None:
+            view = utils.rebaseEdits(handle.snapshot, self.view, view)
+        if view is not None:
+            self.view = view
+            self._index = self.view.index if isinstance(
+                    self.view, pd.DataFrame) else None
+
     def _getUserConfirmation(self, message="Proceed anyways? (y) or (n): "):
         """ Get confirmation from user.
 
@@ -522,7 +1143,11 @@ class Pipeline:
         True if user input begins with 'Y' or 'y'.
         False if user input begins with 'N' or 'n'.
         Otherwise asks user to input confirmation again.
+        If `self.confirm` is set, returns it without asking.
         """
+        if self.confirm is not None:
+            print(message + ("y" if self.confirm else "n"))
+            return self.confirm
         proceed = ''
         while not proceed:
             proceed = input(message)
@@ -534,6 +1159,82 @@ class Pipeline:
             elif len(proceed) and proceed[0].lower() == 'n':
                 return False
 
+    def operations(self):
+        """ The operation log of `self`.
+
+        Returns
+        -------
+        A list of the mutating methods called on `self` since it was
+        created, as dicts of the method name (`op`) and its arguments
+        (`args`), including the values entered at prompts. Undone
+        operations are not included. See `annotator.ops`.
+        """
+        return deepcopy(self._ops)
+
+    def exportOperations(self, path):
+        """ Write the operation log of `self` to `path` as JSON, to be
+        replayed later with `self.replay`. """
+        ops.dump(self._ops, path)
+
+    def replay(self, log, fuse=True):
+        """ Apply the operations of a log to `self`, without prompting.
+
+        Parameters
+        ----------
+        log : list or str
+            An operation log (see `self.operations`) or the path of one
+            written by `self.exportOperations`.
+        fuse : bool
+            Optional. Whether to fuse adjacent operations, e.g. successive
+            substitutions of a column, so that they are applied in a single
+            pass. Defaults to True.
+
+        The replay is backed up (and can be undone) as a whole, not
+        operation by operation. Operations which a lazy Pipeline defers
+        are run as an optimized plan (see `self.explain`).
+        """
+        ops.replay(self, log, fuse=fuse)
+
+    def save(self, path):
+        """ Save the state of `self` to the directory `path`, to be
+        restored with `Pipeline.load`. See `annotator.session`. """
+        session.save(self, path)
+
+    @classmethod
+    def load(cls, path, syn, check=False):
+        """ Restore a Pipeline saved with `self.save`, without reading
+        the view from Synapse.
+
+        Parameters
+        ----------
+        path : str
+            Directory the Pipeline was saved to.
+        syn : synapseclient.Synapse
+            Synapse object to communicate with Synapse.org.
+        check : bool
+            Optional. Whether to verify that the file view has not changed
+            since it was saved, by its etag, and raise a ValueError if it
+            has. Defaults to False.
+
+        Returns
+        -------
+        Pipeline
+        """
+        return session.load(path, syn, check=check)
+
+    @trace.untraced
+    def stats(self):
+        """ Time and memory spent in each operation on `self`.
+
+        Only recorded while tracing is enabled (see `annotator.trace`).
+
+        Returns
+        -------
+        pandas.DataFrame aggregating the operations called on `self`, and
+        the `utils` and `schema` functions they called, by name.
+        """
+        return trace.stats(owner=self)
+
     def onweb(self):
         """ View the file view which `self.view` derives from in a browser. """
         self.syn.onweb(self._entityViewSchema.id)
@@ -545,23 +1246,28 @@ class Pipeline:
         """
         warnings = []
         # check that no columns have null values
-        null_cols = self.view[self._activeCols].isnull().any()
-        for i in null_cols.iteritems():
+        if isinstance(self.view, backends.SqliteView):
+            null_cols = self.view.hasNulls(self._activeCols)
+        else:
+            null_cols = self.view[self._activeCols].isnull().any()
+        for i in null_cols.items():
             col, hasna = i
             if hasna:
                 warnings.append("{} has null values.".format(col))
         # cross check values with allowed values in self.schema
         if self.schema is not None:
-            malformed_values = schemaModule.validateView(self.view, self.schema)
+            malformed_values = schemaModule.validateView(
+                    self.view, self.schema, workers=self.workers)
             if malformed_values:
                 for k in malformed_values:
                     warnings.append("{} contains the following values which are "
                                     "not specified in the schema: {}".format(
                                         k, ", ".join(map(str, malformed_values[k]))) +
                                     "\n\tPossible values are {}".format(
-                                        ", ".join(self.schema.loc[k].value.values)))
+                                        ", ".join(self.schema.loc[[k]].value.values)))
         return warnings
 
+    @ops.recorded
     def removeActiveCols(self, activeCols):
         """ Remove a column name from `self._activeCols`
 
@@ -601,8 +1307,12 @@ class Pipeline:
 
     def valueCounts(self):
         """ Print the value counts of all `self._activeCols`. """
+        self.collect()
         for c in self._activeCols:
-            print(self.view[c].value_counts(dropna=False), end="\n")
+            if isinstance(self.view, backends.SqliteView):
+                print(self.view.valueCounts(c), end="\n")
+            else:
+                print(self.view[c].value_counts(dropna=False), end="\n")
 
     def _prettyPrintColumns(self, cols, style):
         """ Helper function to print columns in a legible way.
@@ -628,7 +1338,8 @@ class Pipeline:
                 padding = " " if (len(cols) > 10 and i < 10) else ""
                 print(str(i), "{}|".format(padding), cols[i])
 
-    def createFileView(self, name, parent, scope, addCols=None, schema=None):
+    def createFileView(self, name, parent, scope, addCols=None, schema=None,
+                       wait=True):
         """ Create and store a file view for further manipulation.
 
         Parameters
@@ -645,6 +1356,12 @@ class Pipeline:
             A path to a .json file specifying a schema the file view should
             conform to -- or a pandas.DataFrame alreay in flattened format.
             (See `schema.flattenJson`).
+        wait : bool
+            Optional. Whether to wait for the rows of the file view to be
+            read. Otherwise they are read in the background while Synapse
+            indexes the scope, page by page, and a `BuildHandle` is
+            returned at once. Accessing `self.view` blocks until the rows
+            are read. Defaults to True.
 
         If `addCols` is a dict:
             Add keys as columns. If a key's value is `None`, then insert an empty
@@ -665,8 +1382,10 @@ class Pipeline:
 
         Returns
         -------
-        Synapse ID of newly created fileview.
+        Synapse ID of newly created fileview, or a `BuildHandle` if `wait`
+        is False.
         """
+        self.collect()  # the plan belongs to the view being replaced
         self.backup("createFileView")
 
         # Fetch default keys, plus any preexisting annotation keys
@@ -702,16 +1421,27 @@ class Pipeline:
 
         # Store columns to Synapse as EntityViewSchema. Default column values
         # are added to `self.view` but not yet stored to Synapse.
-        cols = [sc.Column(**c) for c in cols]
+        cols = utils.createColumns(self.syn, cols)
         entityViewSchema = sc.EntityViewSchema(name=name, columns=cols,
                                                parent=parent, scopes=scope)
         self._entityViewSchema = self.syn.store(entityViewSchema)
-        self.view = utils.synread(self.syn, self._entityViewSchema.id)
-        self._index = self.view.index
+        if not wait:
+            defaults = addCols if isinstance(addCols, dict) else None
+            handle = BuildHandle(self, self._entityViewSchema.id, defaults)
+            if defaults:
+                ops.record(self, 'addDefaultValues', colVals=defaults)
+            self.view = handle._future
+            self._index = _then(handle._future, lambda v: v.index if isinstance(
+                    v, pd.DataFrame) else None)
+            return handle
+        self.view = self._read(self._entityViewSchema.id)
+        self._index = self.view.index if isinstance(
+                self.view, pd.DataFrame) else None
         if isinstance(addCols, dict):
             self.addDefaultValues(addCols, False)
         return self._entityViewSchema.id
 
+    @ops.recorded
     def transferLinks(self, cols=None, on=None, how='left', dropOn=True):
         """ Copy metadata to `self.view`, matching on `self.keyCol`.
 
@@ -726,7 +1456,8 @@ class Pipeline:
             Defaults to `self.keyCol`.
         how : str, optional
             How to merge the metadata on the data.
-            Defaults to 'left' (keep only the keys in the data).
+            Defaults to 'left' (keep only the keys in the data). The
+            'sqlite' backend only supports 'left'.
         dropOn : bool, optional
             Drops the column, `on`, used to align the data
             with the metadata. Defaults to True.
@@ -739,11 +1470,20 @@ class Pipeline:
             on = self.keyCol
         if not self.links:
             raise RuntimeError("Need to link metadata values first.")
+        if isinstance(self.view, backends.SqliteView) and how != 'left':
+            raise ValueError("The sqlite backend only transfers links with "
+                             "how='left', not how={!r}.".format(how))
         self.backup("transferLinks")
         if not cols:
             cols = list(self.links.keys())
             if on in cols:
                 cols.pop(cols.index(on))
+        if isinstance(self.view, backends.SqliteView):
+            self.view.transfer(self._meta, {c: self.links[c] for c in cols},
+                               on)
+            if dropOn:
+                self.view.drop(on, axis=1)
+            return
         metaCols = list(set(self.links.values()))
         renamedCols = {}
         for c in metaCols:
@@ -763,11 +1503,12 @@ class Pipeline:
         for c in cols:
             v = self.links[c]
             if v in renamedCols:
-                v = renamedCols[c]
+                v = renamedCols[v]
             self.view[c] = merged[v].values
         if dropOn:
-            self.view.drop(on, 1, inplace=True)
+            self.view.drop(on, axis=1, inplace=True)
 
+    @ops.recorded
     def inferValues(self, col, referenceCols):
         """ Fill in values for indices which match on `referenceCols`
         and which have a single, unique, non-NaN value in `col`.
@@ -782,8 +1523,77 @@ class Pipeline:
         if self.view is None:
             print("No data view set.")
             return
+        if self._defer('inferValues', col=col, referenceCols=referenceCols):
+            return
         self.backup("inferValues")
-        self.view = utils.inferValues(self.view, col, referenceCols)
+        if isinstance(self.view, backends.SqliteView):
+            self.view.infer(col, referenceCols)
+            return
+        self.view = parallel.inferValues(self.view, col, referenceCols,
+                                         self.workers)
+
+    def _read(self, synId):
+        """ Read a table or file view from Synapse with the backend of
+        `self`. """
+        if self._backend == 'sqlite':
+            # not `self.view`, which may be the pending build of this read
+            view = self.__dict__.get('view')
+            database = (view.database if isinstance(
+                view, backends.SqliteView) else None)
+            return backends.synread(self.syn, synId, sortCols=self._sortCols,
+                                    database=database)
+        return utils.synread(self.syn, synId)
+
+    def _refresh(self, view, synId):
+        """ Give a view just stored to `synId` the row versions (and
+        etags) Synapse gave its rows, reading only those instead of the
+        whole view.
+
+        Returns
+        -------
+        A relabelled copy of `view`, or `view` relabelled in place for the
+        'sqlite' backend.
+        """
+        columns = ['etag'] if 'etag' in view.columns else list(
+                view.columns[:1])
+        fresh = utils.readIndex(self.syn, synId, columns)
+        if isinstance(view, backends.SqliteView):
+            view.relabel(fresh)
+            return view
+        return utils.relabel(view, fresh)
+
+    def _defer(self, op, **args):
+        """ Add an operation to the plan of a lazy Pipeline.
+
+        Returns
+        -------
+        True if the operation was deferred, False if it should run now.
+        """
+        if not self._lazy or self._backend == 'sqlite':
+            return False
+        self._plan.append({'op': op, 'args': deepcopy(args)})
+        return True
+
+    def collect(self):
+        """ Execute the deferred operations of a lazy Pipeline.
+
+        The plan is optimized (see `self.explain`) and run in a single
+        pass over `self.view`, backed up as a whole.
+
+        Returns
+        -------
+        `self.view`
+        """
+        if self._plan:
+            plan, self._plan = self._plan, []
+            self.backup("collect")
+            self.view = ops.execute(self.view, ops.optimize(plan))
+        return self.view
+
+    def explain(self):
+        """ Print the deferred operations of a lazy Pipeline and the
+        optimized plan `self.collect()` would execute. """
+        print(ops.explain(self._plan))
 
     def _linkCols(self, iters):
         """ Helper function to return a dictionary with data columns as keys
@@ -1,4 +1,37 @@
-from annotator.Pipeline import Pipeline
-from annotator import utils
-from annotator import schema
+""" Synapse annotations automation.
+
+Submodules and `Pipeline` are imported on first access, so that importing
+annotator (e.g. to run the command line interface) does not import
+pandas and synapseclient until they are needed.
+"""
+import sys
+import types
+import importlib
+
 __all__ = ['Pipeline', 'utils']
+
+_SUBMODULES = ('Pipeline', 'backends', 'cache', 'client', 'ledger', 'ops',
+               'parallel', 'runner', 'schema', 'session', 'testing', 'trace',
+               'utils')
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        if name == 'Pipeline' and isinstance(value, types.ModuleType):
+            # importing the submodule binds it here: keep the class instead
+            value = value.Pipeline
+        super(_Package, self).__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        importlib.import_module('annotator.' + name)
+        return globals()[name]
+    raise AttributeError("module 'annotator' has no attribute " + repr(name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_SUBMODULES))
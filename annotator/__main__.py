@@ -1,24 +1,24 @@
-from __future__ import absolute_import
-from __future__ import division
-from __future__ import print_function
-from __future__ import unicode_literals
-from future.utils import iteritems
-from six.moves.urllib.parse import urlparse
-from six.moves.urllib.request import urlopen
-import subprocess
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 import os
 import sys
 import json
-import six
+import time
 import argparse
 import getpass
-import pandas
-import synapseutils
-import synapseclient
-from synapseclient import Entity, Project, Column, Team, Wiki, Folder
-from annotator import schema
+from annotator import cache
+from annotator import client
+from annotator import trace
+from annotator import ledger
 
+# pandas, synapseclient, synapseutils, requests and the annotator modules which depend on them are imported by the
+# functions which need them, so that `annotator -h` and commands which fail early don't pay for importing them.
 
+ANNOTATION_CACHE_TTL = 24 * 60 * 60  # seconds a cached annotation JSON is used without revalidating it
+JSON_CHUNK_SIZE = 64 * 1024  # characters of an annotations JSON file read at a time
+
+
+@trace.traced(name='login')
 def synapseLogin():
     """
     First tries to login to synapse by finding the local auth key cached on user's computing platform, if not found,
@@ -27,44 +27,95 @@ def synapseLogin():
 
     :return:
     """
+    import synapseclient
     try:
         syn = synapseclient.login()
     except Exception as e:
         print('Please provide your synapse username/email and password (You will only be prompted once)')
         username = input("Username: ")
-        password = getpass.getpass(("Password for " + username + ": ").encode('utf-8'))
+        password = getpass.getpass("Password for " + username + ": ")
         syn = synapseclient.login(email=username, password=password, rememberMe=True)
 
     return syn
 
 
-def updateTable(syn, tableSynId, newTable, releaseVersion):
+def _batches(df, batchSize):
+    """
+    Splits a data frame into consecutive chunks of at most batchSize rows.
+
+    :param df:
+    :param batchSize:
+    :return: generator of data frames
+    """
+    for start in range(0, len(df), batchSize):
+        yield df.iloc[start:start + batchSize]
+
+
+def updateTable(syn, tableSynId, newTable, releaseVersion, key=("key", "value", "module"), batchSize=5000):
     """
-    Gets the current annotation table, deletes all it's rows, then updates the table with new content generated
-    from all the json files on synapseAnnotations. In the process also updates the table annotation to the latest
-    releaseversion.
+    Gets the current annotation table and diffs it against the new content generated from all the json files on
+    synapseAnnotations, matching rows on their (key, value, module) identity. Only the rows that differ are deleted,
+    inserted or updated, in batches of at most batchSize rows per transaction. Once every batch is stored, also
+    updates the table annotation to the latest releaseversion, so that a table left half updated by a failed batch
+    is not marked as released (running the update again completes it), and prints a summary of the changeset.
 
     :param syn:
     :param tableSynId:
     :param newTable:
     :param releaseVersion:
+    :param key:
+    :param batchSize:
     :return:
     """
-    currentTable = syn.tableQuery("SELECT * FROM %s" % tableSynId)
-
-    # If current table has rows, delete all the rows
-    if currentTable.asRowSet().rows:
-        deletedRows = syn.delete(currentTable.asRowSet())
+    import synapseclient
+    from annotator import client, utils
+    syn = client.wrap(syn)
+    key = list(key)
+    currentTable = syn.tableQuery("SELECT * FROM %s" % tableSynId).asDataFrame()
+    newTable = newTable.reset_index(drop=True)
+    deleted, inserted, updated = utils.diffDataFrames(currentTable, newTable, key)
 
-    # get table schema and set it's release version annotation
+    tableSchema = syn.get(tableSynId)
+    for rows in _batches(deleted, batchSize):
+        syn.delete(synapseclient.Table(tableSchema, rows))
+    for rows in _batches(updated[newTable.columns], batchSize):
+        syn.store(synapseclient.Table(tableSchema, rows))
+    for rows in _batches(inserted, batchSize):
+        syn.store(synapseclient.Table(tableSchema, rows))
+
+    # set the release version annotation last, once every row is stored
+    syn.metadata.invalidate(tableSynId)
     tableSchema = syn.get(tableSynId)
     tableSchema.annotations = {"annotationReleaseVersion": str(releaseVersion)}
-    updated_schema_release = syn.store(tableSchema)
+    syn.store(tableSchema)
+
+    _printChangeset(deleted, inserted, updated)
 
-    # store the new table on synapse
-    table = syn.store(synapseclient.Table(tableSchema, newTable))
 
+def _printChangeset(deleted, inserted, updated):
+    """
+    Prints the number of deleted, inserted and updated rows, per module.
+
+    :param deleted:
+    :param inserted:
+    :param updated:
+    :return:
+    """
+    import pandas
+    changes = {'deleted': deleted, 'inserted': inserted, 'updated': updated}
+    summary = pandas.DataFrame({change: rows['module'].value_counts() if 'module' in rows else pandas.Series(dtype=int)
+                                for change, rows in changes.items()},
+                               columns=['deleted', 'inserted', 'updated'])
+    summary = summary.fillna(0).astype(int)
+
+    if summary.empty:
+        print('Annotation table is up to date, no rows changed.')
+    else:
+        summary.loc['total'] = summary.sum()
+        print(summary.to_string())
 
+
+@trace.traced(name='json2table')
 def json2table(args, syn):
     """
     Given a synapse table id with the schema
@@ -72,13 +123,14 @@ def json2table(args, syn):
                          "source", "module"]
     get the most updated release version annotations json files from github Sage-Bionetworks/synapseAnnotations
     normalize the json files per module and create a melted data frame by concatenating all the modules data.
-    then upload the melted data frame to the synapse table by completely deleting all rows then replacing content.
+    then diff the melted data frame against the synapse table and upload only the rows that changed.
     This process also updates the synapse table annotations with the latest release version.
 
     :param args:
     :param syn:
     :return:
     """
+    from annotator import schema
 
     if args.tableId is not None:
         tableSynId = args.tableId
@@ -90,26 +142,20 @@ def json2table(args, syn):
     else:
         releaseVersion = schema.getAnnotationsRelease()
 
-    all_modules = []
     key = ["key", "value", "module"]
     annotation_schema = ["key", "description", "columnType", "maximumSize", "value", "valueDescription",
                          "source", "module"]
 
     names = schema.moduleJsonPath(releaseVersion)
 
-    for module, path in iteritems(names):
-        module_df = schema.flattenJson(path, module)
-        all_modules.append(module_df)
-
-    # concat the list of all normalized dataframes into one annotation dataframe
-    all_modules_df = pandas.concat(all_modules)
+    # download and normalize all modules in parallel, concatenated into one annotation dataframe
+    all_modules_df = schema.flattenModules(names, jobs=args.jobs)
 
     # re-arrange columns/fields and sort data.
     all_modules_df = all_modules_df[annotation_schema]
     all_modules_df.sort_values(key, ascending=[True, True, True], inplace=True)
-    all_modules_df.valueDescription = all_modules_df.valueDescription.str.encode('utf-8')
 
-    updateTable(syn, tableSynId=tableSynId, newTable=all_modules_df, releaseVersion=releaseVersion)
+    updateTable(syn, tableSynId=tableSynId, newTable=all_modules_df, releaseVersion=releaseVersion, key=key)
 
 
 def createColumnsFromJson(path, defaultMaximumSize=250):
@@ -123,6 +169,7 @@ def createColumnsFromJson(path, defaultMaximumSize=250):
     :param defaultMaximumSize:
     :return:
     """
+    import synapseclient
     with open(path) as json_file:
         data = json.load(json_file)
 
@@ -138,6 +185,7 @@ def createColumnsFromJson(path, defaultMaximumSize=250):
     return cols
 
 
+@trace.traced(name='emptyview')
 def emptyView(args, syn):
     """
     Given synapse scopes, creates an empty project/file view schema to be annotated.
@@ -146,6 +194,8 @@ def emptyView(args, syn):
     :param syn:
     :return:
     """
+    import synapseclient
+    from annotator import utils
     project_id = args.id
     scopes = args.scopes
     json_files = args.json
@@ -163,6 +213,7 @@ def emptyView(args, syn):
     # create synapse columns from annotations json file
     cols = []
     [cols.extend(createColumnsFromJson(j)) for j in json_files]
+    cols = utils.createColumns(syn, cols)
 
     # create schema and print the saved schema
     view = syn.store(synapseclient.EntityViewSchema(name=view_name, parent=project_id, scopes=scopes, columns=cols,
@@ -213,6 +264,9 @@ def _getSynapseDir(syn, synapse_id, local_root, dir_list):
     :param dir_list:
     :return:
     """
+    import synapseclient
+    import synapseutils
+    syn = client.wrap(syn)
     synapse_dir = {}
     synapse_root = syn.get(synapse_id)
 
@@ -220,49 +274,299 @@ def _getSynapseDir(syn, synapse_id, local_root, dir_list):
         dirpath = dirpath.replace(synapse_root.name, os.path.abspath(local_root))
         synapse_dir[dirpath] = dirpath_id
 
+    # folders of the same depth are independent of each other, so each level is created concurrently
+    levels = {}
     for directory in dir_list:
+        if directory not in synapse_dir:
+            levels.setdefault(directory.count(os.path.sep), []).append(directory)
 
-        if not synapse_dir.has_key(directory):
-            new_folder = synapseclient.Folder(os.path.basename(directory),
-                                              synapse_dir[os.path.dirname(directory)])
-            new_folder = syn.store(new_folder)
+    for level in sorted(levels):
+        new_folders = [synapseclient.Folder(os.path.basename(directory), synapse_dir[os.path.dirname(directory)])
+                       for directory in levels[level]]
+        new_folders = syn.map(syn.store, new_folders)
+
+        for directory, new_folder in zip(levels[level], new_folders):
             synapse_dir[directory] = new_folder.id
 
     return synapse_dir
 
 
+def _iterJsonArray(chunks):
+    """
+    Incrementally decodes the elements of a top-level JSON array, one at a time. `chunks` is read only as far as
+    needed to decode the next element, so that elements are decoded while the rest of a streamed document is still
+    being received, and at most one element is held in memory besides the element being decoded.
+
+    :param chunks: the JSON text, or an iterable of consecutive pieces of it
+    :return: generator of decoded elements
+    :raises ValueError: if the text is not a JSON array, or is truncated
+    """
+    chunks = iter([chunks] if isinstance(chunks, str) else chunks)
+    decoder = json.JSONDecoder()
+    whitespace = ' \t\n\r'
+    text, i = '', 0
+    expected = '['
+
+    while True:
+        while i < len(text) and text[i] in whitespace:
+            i += 1
+        if i == len(text):
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise ValueError('Truncated JSON array.')
+            text, i = chunk, 0
+            continue
+
+        if expected == '[':
+            if text[i] != '[':
+                raise ValueError('A JSON array is required.')
+            i, expected = i + 1, 'element'
+        elif text[i] == ']':
+            return
+        elif expected == ',':
+            if text[i] != ',':
+                raise ValueError("Expecting ',' delimiter: %r" % text[i:i + 20])
+            i, expected = i + 1, 'element'
+        else:
+            try:
+                element, end = decoder.raw_decode(text, i)
+            except ValueError:
+                element, end = None, None
+            if end is None or end == len(text):
+                # the element may go on in the next chunk
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    text, i = text[i:] + chunk, 0
+                    continue
+                if end is None:
+                    decoder.raw_decode(text, i)  # raises the decoding error
+            yield element
+            text, i = text[end:], 0
+            expected = ','
+
+
+def _jsonKeys(chunks):
+    """
+    Extracts the annotation keys (the 'name' of every element) from a Synapse annotations JSON document.
+
+    :param chunks: the document, or an iterable of consecutive pieces of it
+    :return:
+    """
+    return [d['name'] for d in _iterJsonArray(chunks) if isinstance(d, dict) and 'name' in d]
+
+
+def _isCacheEntry(entry):
+    """
+    Whether a document read from the annotation cache is a valid cache entry.
+
+    :param entry:
+    :return:
+    """
+    return (isinstance(entry, dict) and isinstance(entry.get('keys'), list)
+            and isinstance(entry.get('fetched'), (int, float)))
+
+
+def _fetchAnnotationKeys(url, annotation_cache, ttl=ANNOTATION_CACHE_TTL):
+    """
+    Gets the annotation keys of a remote annotations JSON file. Keys are cached on disk together with the response
+    ETag: a cache entry younger than `ttl` is used without any network I/O, an older one is revalidated with a
+    conditional request and only downloaded again if it changed. The response is decoded as it is streamed. Invalid
+    cache entries are dropped and the file is downloaded again.
+
+    :param url:
+    :param annotation_cache:
+    :param ttl:
+    :return:
+    :raises ValueError: if the file is not a valid annotations JSON file
+    """
+    import requests
+    entry = annotation_cache.get(url)
+
+    if entry is not None and not _isCacheEntry(entry):
+        annotation_cache.delete(url)
+        entry = None
+
+    if entry is not None and time.time() - entry['fetched'] < ttl:
+        return entry['keys']
+
+    headers = {'If-None-Match': entry['etag']} if entry is not None and entry.get('etag') else {}
+    response = requests.get(url, headers=headers, stream=True)
+
+    try:
+        if response.status_code == 304:
+            entry['fetched'] = time.time()
+        else:
+            response.raise_for_status()
+            response.encoding = response.encoding or 'utf-8'
+            try:
+                keys = _jsonKeys(response.iter_content(JSON_CHUNK_SIZE, decode_unicode=True))
+            except ValueError as e:
+                annotation_cache.delete(url)
+                raise ValueError('%s is not a valid annotations JSON file: %s' % (url, e))
+            entry = {'etag': response.headers.get('ETag'), 'fetched': time.time(), 'keys': keys}
+    finally:
+        response.close()
+
+    annotation_cache.set(url, entry)
+    return entry['keys']
+
+
+def _readAnnotationKeys(path):
+    """
+    Gets the annotation keys of a local annotations JSON file, decoded as it is read.
+
+    :param path:
+    :return:
+    :raises ValueError: if the file is not a valid annotations JSON file
+    """
+    with open(path, 'r') as jfile:
+        try:
+            return _jsonKeys(iter(lambda: jfile.read(JSON_CHUNK_SIZE), ''))
+        except ValueError as e:
+            raise ValueError('%s is not a valid annotations JSON file: %s' % (path, e))
+
+
 def _getAnnotationKey(dirs):
     """
-     Get the list of annotation keys (manifest columns)
+     Get the list of annotation keys (manifest columns). Remote JSON files are fetched concurrently and cached
+     on disk (see _fetchAnnotationKeys).
 
     :param dirs:
     :return:
     """
     key_list = ['used', 'executed']
 
-    if dirs is not None:
+    if dirs is None:
+        return key_list
 
-        for directory in dirs:
+    paths = []
+    for directory in dirs:
+        base, ext = os.path.splitext(os.path.basename(urlparse(directory).path))
 
-            if urlparse(directory).scheme != '':
-                jfile = urlopen(directory)
-            else:
-                jfile = open(directory, 'r')
+        if ext == '.json':
+            paths.append(directory)
+        else:
+            sys.stderr.write('File %s cannot be parsed. JSON format is required.\n' % directory)
 
-            base, ext = os.path.splitext(os.path.basename(directory))
+    annotation_cache = cache.DiskCache('annotations')
 
-            if ext == '.json':
-                data = json.load(jfile)
-            else:
-                sys.stderr.write('File %s cannot be parsed. JSON format is required.\n' % directory)
-
-            data = pandas.DataFrame(data)
-            annotation_key = data['name']
-            key_list = key_list + list(annotation_key)
+    def fetch(path):
+        try:
+            if urlparse(path).scheme != '':
+                return _fetchAnnotationKeys(path, annotation_cache)
+            return _readAnnotationKeys(path)
+        except ValueError as e:
+            sys.stderr.write('%s. Its annotation keys are skipped.\n' % e)
+            return []
+
+    if paths:
+        with ThreadPoolExecutor(max_workers=min(8, len(paths))) as executor:
+            for annotation_key in executor.map(trace.bind(fetch), paths):
+                key_list = key_list + annotation_key
 
     return key_list
 
 
+class _AnnotationTrie(object):
+    """
+    A path trie of folder-level annotations. Each node holds the annotations read from the sidecar file of its
+    directory, the manifest rows of the files directly inside it and its sub-directories keyed by name.
+    """
+
+    def __init__(self):
+        self.annotations = {}
+        self.files = []
+        self.children = {}
+
+    def node(self, parts):
+        """
+        Returns the node at the end of the path components `parts`, creating missing nodes on the way.
+
+        :param parts:
+        :return:
+        """
+        node = self
+        for part in parts:
+            child = node.children.get(part)
+            if child is None:
+                child = node.children[part] = _AnnotationTrie()
+            node = child
+        return node
+
+    def resolve(self, n_files):
+        """
+        Walks the trie once, merging annotations from the root down so that deeper folders override shallower ones,
+        and hands every file the resolved annotations of its folder.
+
+        :param n_files: number of manifest rows indexed in the trie
+        :return: list of annotation dictionaries aligned with the manifest rows
+        """
+        resolved = [None] * n_files
+        stack = [(self, {})]
+
+        while stack:
+            node, inherited = stack.pop()
+
+            if node.annotations:
+                inherited = dict(inherited)
+                inherited.update(node.annotations)
+
+            for i in node.files:
+                resolved[i] = inherited
+
+            stack.extend((child, inherited) for child in node.children.values())
+
+        return resolved
+
+
+def _readSidecar(path):
+    """
+    Reads a folder-level annotation sidecar file, a JSON object of annotation key-value pairs.
+
+    :param path:
+    :return: dictionary of annotations, empty if the file cannot be parsed
+    """
+    try:
+        with open(path, 'r') as sidecar:
+            annotations = json.load(sidecar)
+    except ValueError:
+        annotations = None
+
+    if not isinstance(annotations, dict):
+        sys.stderr.write('Sidecar %s cannot be parsed. A JSON object of annotations is required.\n' % path)
+        return {}
+
+    return annotations
+
+
+def _getSidecarAnnotations(file_list, local_root, sidecar_name):
+    """
+    Separates annotation sidecar files from the files to be synced, and propagates the sidecar annotations down the
+    directory hierarchy. Deeper folders override the values set by shallower ones.
+
+    :param file_list:
+    :param local_root:
+    :param sidecar_name:
+    :return: the file list without sidecars, and a list of annotation dictionaries aligned with it
+    """
+    root = os.path.abspath(local_root)
+    trie = _AnnotationTrie()
+    files = []
+
+    for path in file_list:
+        dirpath, name = os.path.split(path)
+        parts = [p for p in dirpath[len(root):].split(os.path.sep) if p]
+        node = trie.node(parts)
+
+        if name == sidecar_name:
+            node.annotations = _readSidecar(path)
+        else:
+            node.files.append(len(files))
+            files.append(path)
+
+    return files, trie.resolve(len(files))
+
+
 def _getName(path, synapse_dir, local_root, depth):
     """
     Finds the name of files in local directory.
@@ -292,7 +596,7 @@ def _getName(path, synapse_dir, local_root, depth):
     return name, parent
 
 
-def create_sync_manifest(file_list, key_list, synapse_dir, local_root, depth):
+def create_sync_manifest(file_list, key_list, synapse_dir, local_root, depth, annotations=None):
     """
     Creates manifest designed for the input of sync function.
 
@@ -301,28 +605,37 @@ def create_sync_manifest(file_list, key_list, synapse_dir, local_root, depth):
     :param synapse_dir:
     :param local_root:
     :param depth:
+    :param annotations: optional list of annotation dictionaries aligned with file_list, used to fill in the
+                        annotation values of each file. Keys missing from key_list are added as columns.
     :return:
     """
+    import pandas
     result = pandas.DataFrame()
     result['path'] = file_list
-    result['name'] = ""
-    result['parent'] = ""
-
-    for index, row in result.iterrows():
-        row[['name', 'parent']] = _getName(row['path'], synapse_dir, local_root, depth)
+    names = [_getName(path, synapse_dir, local_root, depth) for path in file_list]
+    result['name'] = [name for name, _ in names]
+    result['parent'] = [parent for _, parent in names]
 
     cols = list(result.columns)
-    result = pandas.concat([result, pandas.DataFrame(columns=key_list)])
-    result = result[cols + key_list] # reorder the columns
+    key_list = list(key_list)
+
+    if annotations is not None:
+        values = pandas.DataFrame.from_records(annotations, index=result.index)
+        key_list = key_list + [k for k in values.columns if k not in key_list]
+        result = pandas.concat([result, values], axis=1)
+
+    result = result.reindex(columns=cols + key_list) # reorder the columns
     save_path = os.path.join(os.getcwd(),'annotations_manifest.csv')
     result.to_csv(save_path, index=False)
     sys.stderr.write('Manifest has been created on local directory: \n %s \n' % os.getcwd())
 
 
+@trace.traced(name='sync_manifest')
 def sync_manifest(args, syn):
     """
     Creates a manifest (filepath by annotations) designed for the input of synapse sync
     function to facilitate file organization and annotations of those files on synapse.
+    Annotation values found in folder-level sidecar files are filled in for every file beneath them.
 
     :param args:
     :param syn:
@@ -338,10 +651,42 @@ def sync_manifest(args, syn):
         depth = int(depth)
 
     dir_list, file_list = _getLists(local_root, depth)
+    file_list, values = _getSidecarAnnotations(file_list, local_root, args.sidecar)
     synapse_dir = _getSynapseDir(syn, synapse_id, local_root, dir_list)
     key_list = _getAnnotationKey(annotations)
 
-    create_sync_manifest(file_list, key_list, synapse_dir, local_root, depth)
+    create_sync_manifest(file_list, key_list, synapse_dir, local_root, depth, annotations=values)
+
+
+@trace.traced(name='run')
+def run(args, syn):
+    """
+    Runs annotation pipelines described by YAML or JSON spec files without user interaction (see annotator.runner),
+    printing the outcome of each and writing them to args.output as JSON if given.
+
+    :param args:
+    :param syn:
+    :return:
+    """
+    from annotator import runner
+    results = runner.runSpecs(syn, args.specs, jobs=args.jobs, confirm=args.yes, publish=not args.no_publish)
+
+    for result in results:
+        if 'error' in result:
+            outcome = 'failed: ' + result['error']
+        else:
+            outcome = '%s %s' % ('published' if result['published'] else 'not published', result['view'])
+            if result['warnings']:
+                outcome += ' (%d warnings)' % len(result['warnings'])
+        print('%s: %s' % (result['name'], outcome))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    failed = [r for r in results if 'error' in r]
+    if failed:
+        raise RuntimeError('%d of %d specs failed.' % (len(failed), len(results)))
 
 
 def buildParser():
@@ -351,6 +696,9 @@ def buildParser():
     :return:
     """
     parser = argparse.ArgumentParser()
+    parser.add_argument('--ledger', nargs='?', const='', metavar='PATH',
+                        help='Print a summary of the HTTP requests made by the command to stderr and, if PATH is '
+                             'given, write every request to PATH as JSON.')
 
     subparsers = parser.add_subparsers(title='commands',
                                        description='The following commands are available:',
@@ -363,6 +711,8 @@ def buildParser():
     parser_json2table.add_argument('--releaseVersion',
                                  help='Sage-Bionetworks/synapseAnnotations release version tag name',
                                  required=False, type=str)
+    parser_json2table.add_argument('--jobs', help='Number of modules to download and flatten in parallel '
+                                                  '(default: number of processors)', required=False, type=int)
     parser_json2table.set_defaults(func=json2table)
 
     parser_emptyview = subparsers.add_parser('emptyview', help='Given synapse scopes, creates empty project/file view '
@@ -400,8 +750,28 @@ def buildParser():
                                                        'folders to mirror. Any file/folder beyond this number would '
                                                        'be expanded into the hierarchy number indicated.',
                                      default=None, required=False)
+    parser_syncmanifest.add_argument('--sidecar', help='Name of the folder-level annotation files (default: '
+                                                       '%(default)s). A JSON object of annotations found in any '
+                                                       'folder is applied to every file beneath it, deeper folders '
+                                                       'overriding shallower ones.',
+                                     default='annotations.json', required=False)
     parser_syncmanifest.set_defaults(func=sync_manifest)
 
+    parser_run = subparsers.add_parser('run', help='Runs annotation pipelines described by YAML or JSON spec files '
+                                                   'without user interaction.')
+    parser_run.add_argument('specs', nargs='+', help='Spec files (see annotator.runner for their format).')
+    parser_run.add_argument('-j', '--jobs', help='Number of specs to run concurrently (default: %(default)s).',
+                            default=1, type=int, required=False)
+    parser_run.add_argument('-y', '--yes', action='store_true',
+                            help='Proceed when confirmation is requested: accept key columns with values missing '
+                                 'from the metadata and publish despite validation warnings. By default such specs '
+                                 'fail or are not published.', required=False)
+    parser_run.add_argument('--no-publish', action='store_true',
+                            help='Run every step but publishing.', required=False)
+    parser_run.add_argument('-o', '--output', help='Write the outcome of every spec to this file as JSON.',
+                            required=False)
+    parser_run.set_defaults(func=run)
+
     return parser
 
 
@@ -412,7 +782,7 @@ def _annotator_error_msg(ex):
     :param ex:
     :return:
     """
-    if isinstance(ex, six.string_types):
+    if isinstance(ex, str):
         return ex
 
     return '\n' + ex.__class__.__name__ + ': ' + str(ex) + '\n\n'
@@ -429,11 +799,31 @@ def performMain(args, syn):
                 sys.stderr.write(_annotator_error_msg(ex))
 
 
+def _reportLedger(path):
+    """
+    Prints the request ledger summary to stderr and writes the full ledger to path, if any.
+
+    :param path: JSON file path, or the empty string
+    :return:
+    """
+    import pandas
+    with pandas.option_context('display.width', 200, 'display.max_rows', None):
+        sys.stderr.write(str(ledger.summary()) + '\n')
+    if path:
+        ledger.export(path)
+
+
 def main():
     args = buildParser().parse_args()
-    syn = synapseLogin()
+    if args.ledger is not None:
+        ledger.enable()
+    syn = client.lazy(synapseLogin)
 
-    performMain(args, syn)
+    try:
+        performMain(args, syn)
+    finally:
+        if args.ledger is not None:
+            _reportLedger(args.ledger)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,797 @@
+""" Storage backends for the views of Pipeline objects.
+
+By default a Pipeline keeps its view in a pandas DataFrame. File views too
+large for memory can instead be kept in an on-disk SQLite database:
+
+    >>> p = Pipeline(syn, "syn123", meta="syn456", backend='sqlite')
+    >>> p.addKeyCol('name', 'specimenID', r'^(\\w+)_R\\d')
+    >>> p.transferLinks()
+    >>> p.publish()
+
+Under the 'sqlite' backend `self.view` is a `SqliteView`. The view is
+read from Synapse and published back in chunks of `CHUNK_SIZE` rows, and
+`addKeyCol`, `transferLinks`, `inferValues`, `substituteColumnValues`,
+`addDefaultValues`, `addFileFormatCol`, validation and backups run as SQL
+statements, so that memory use is bounded by the chunk size (and the size
+of the metadata) rather than by the size of the view.
+"""
+import os
+import re
+import json
+import sqlite3
+import tempfile
+import itertools
+import threading
+import functools
+import contextlib
+import pandas as pd
+
+BACKENDS = ('pandas', 'sqlite')
+CHUNK_SIZE = 50000
+INDEX = '_index'  # column of the row labels, usually ROWID_VERSION
+_ROW_ID = "substr({0}.{1}, 1, instr({0}.{1} || '_', '_') - 1)"
+
+
+def _quote(name):
+    return '"{}"'.format(str(name).replace('"', '""'))
+
+
+@functools.lru_cache(maxsize=64)
+def _compile(regex):
+    return re.compile(regex)
+
+
+def _capture(regex, value):
+    """ The first group of `regex` in `value`, as `utils.colFromRegex`. """
+    if not isinstance(value, str):
+        return None
+    m = _compile(regex).search(value)
+    return m.group(1) if m else None
+
+
+def _regexp(regex, value):
+    """ Implementation of the REGEXP operator. """
+    return value is not None and _compile(regex).search(str(value)) is not None
+
+
+def _value(v):
+    """ `v` as a value SQLite can store. """
+    if v is None or isinstance(v, (str, int, float, bytes)):
+        return None if isinstance(v, float) and v != v else v
+    if isinstance(v, (list, tuple, dict)):
+        return json.dumps(v)
+    if hasattr(v, 'item'):  # numpy scalar
+        return _value(v.item())
+    if pd.isnull(v):
+        return None
+    return str(v)
+
+
+def _records(df):
+    """ The rows of `df` as tuples of their label and values. """
+    columns = [[str(i) for i in df.index]]
+    for i in range(df.shape[1]):
+        s = df.iloc[:, i]
+        if s.dtype.kind in 'iuf':
+            columns.append(s.astype(object).where(s.notnull(), None).tolist())
+        else:
+            columns.append([_value(v) for v in s.tolist()])
+    return list(zip(*columns))
+
+
+def _labelled(df):
+    """ `df` indexed by ROWID_VERSION labels, as
+    `synapseclient.table.CsvFileTable.asDataFrame` does. """
+    if 'ROW_ID' not in df or 'ROW_VERSION' not in df:
+        return df
+    parts = [df.pop('ROW_ID'), df.pop('ROW_VERSION')]
+    if 'ROW_ETAG' in df:
+        parts.append(df.pop('ROW_ETAG'))
+    df.index = ["_".join(map(str, p)) for p in zip(*parts)]
+    return df
+
+
+def _frameChunks(df, chunkSize):
+    for start in range(0, len(df), chunkSize):
+        yield df.iloc[start:start + chunkSize]
+
+
+class Database(object):
+    """ A SQLite database holding the tables of `SqliteView` objects. """
+
+    def __init__(self, path=None):
+        """ Open a database.
+
+        Parameters
+        ----------
+        path : str
+            Optional. Path of the database file. Defaults to a temporary
+            file, removed when the database is closed.
+        """
+        self._temporary = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix='annotator-', suffix='.sqlite')
+            os.close(fd)
+        self.path = path
+        self.lock = threading.RLock()
+        self._names = itertools.count()
+        self.connection = sqlite3.connect(path, check_same_thread=False,
+                                          isolation_level=None)
+        self.connection.create_function('capture', 2, _capture)
+        self.connection.create_function('regexp', 2, _regexp)
+        for pragma in ('journal_mode = OFF', 'synchronous = OFF',
+                       'temp_store = FILE', 'cache_size = -65536'):
+            self.connection.execute('PRAGMA ' + pragma)
+
+    def execute(self, sql, params=()):
+        with self.lock:
+            self.connection.execute(sql, params)
+
+    def fetch(self, sql, params=()):
+        """ All rows of the results of a query. Statements are run to
+        completion, so that none is left pending while other threads
+        alter tables. """
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def executemany(self, sql, rows):
+        with self.lock:
+            self.connection.execute('BEGIN')
+            try:
+                self.connection.executemany(sql, rows)
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    def name(self, prefix='view'):
+        """ A table name not in use yet. """
+        return "{}_{}".format(prefix, next(self._names))
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+            if self._temporary and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class SqliteView(object):
+    """ A file view stored in a table of a SQLite database.
+
+    Supports the parts of the pandas.DataFrame interface Pipeline uses to
+    display and modify a view (`head`, `tail`, `shape`, `columns`,
+    `view[col]` and `view[col] = value`, `drop`), but modifies the view in
+    place. Use `toFrame` to read the whole view into memory.
+    """
+
+    def __init__(self, database=None, table=None, chunkSize=CHUNK_SIZE):
+        """ Wrap a table of `database`, or a new empty table.
+
+        Parameters
+        ----------
+        database : Database
+            Optional. Defaults to a new temporary database.
+        table : str
+            Optional. Name of an existing table in `database`.
+        chunkSize : int
+            Optional. Number of rows to read or write at once.
+            Defaults to `CHUNK_SIZE`.
+        """
+        self.database = database if database is not None else Database()
+        self.table = table if table is not None else self.database.name()
+        self.chunkSize = chunkSize
+        self._length = None
+        if table is None:
+            self._create([])
+
+    @classmethod
+    def fromFrame(cls, df, database=None, chunkSize=CHUNK_SIZE):
+        """ A SqliteView of the rows of a pandas.DataFrame. """
+        view = cls(database, chunkSize=chunkSize)
+        view.write(_frameChunks(df, chunkSize), columns=list(df.columns))
+        return view
+
+    @classmethod
+    def fromCsv(cls, path, database=None, chunkSize=CHUNK_SIZE,
+                sortCols=True, **kwargs):
+        """ A SqliteView of a delimited file, read `chunkSize` rows at a
+        time. ROW_ID and ROW_VERSION columns become the row labels.
+        Other keyword arguments are passed to `pandas.read_csv`. """
+        view = cls(database, chunkSize=chunkSize)
+        chunks = (_labelled(c) for c in
+                  pd.read_csv(path, chunksize=chunkSize, **kwargs))
+        view.write(chunks, sortCols=sortCols)
+        return view
+
+    @classmethod
+    def load(cls, path, database=None, chunkSize=CHUNK_SIZE):
+        """ A SqliteView of a copy of the view saved to `path` by
+        `save`, so that the saved view is left unchanged. """
+        view = cls(database, chunkSize=chunkSize)
+        view._copy(path, 'saved.view', view.table)
+        return view
+
+    def save(self, path):
+        """ Copy the view to a new SQLite database at `path`. """
+        if os.path.exists(path):
+            os.remove(path)
+        self._copy(path, self.table, 'saved.view')
+
+    def _copy(self, path, source, target):
+        """ Copy table `source` to table `target`, where the database at
+        `path` is attached as `saved`. """
+        def qualified(name):
+            return '.'.join(_quote(n) for n in name.split('.', 1)) \
+                if name.startswith('saved.') else _quote(name)
+        with self.database.lock:
+            self.database.execute('ATTACH DATABASE ? AS saved', (path,))
+            try:
+                self.database.execute('DROP TABLE IF EXISTS {}'.format(
+                    qualified(target)))
+                self.database.execute(
+                    'CREATE TABLE {} AS SELECT * FROM {} ORDER BY rowid'
+                    .format(qualified(target), qualified(source)))
+            finally:
+                self.database.execute('DETACH DATABASE saved')
+        self._length = None
+
+    def _create(self, columns):
+        self.database.execute('DROP TABLE IF EXISTS {}'.format(
+            _quote(self.table)))
+        self.database.execute('CREATE TABLE {} ({})'.format(
+            _quote(self.table), ", ".join(map(_quote, [INDEX] + columns))))
+        self._length = 0
+
+    def write(self, chunks, columns=None, sortCols=False):
+        """ Replace the rows of the view with those of DataFrames.
+
+        Parameters
+        ----------
+        chunks : iterable of pandas.DataFrame
+        columns : list
+            Optional. Columns of the view. Defaults to the columns of the
+            first chunk.
+        sortCols : bool
+            Optional. Whether to order `columns` lexicographically.
+            Defaults to False.
+        """
+        created = False
+        for chunk in chunks:
+            if not created:
+                columns = list(chunk.columns) if columns is None else columns
+                columns = sorted(columns) if sortCols else columns
+                self._create(columns)
+                created = True
+            chunk = chunk.reindex(columns=columns)
+            self.database.executemany(
+                'INSERT INTO {} VALUES ({})'.format(
+                    _quote(self.table), ", ".join("?" * (len(columns) + 1))),
+                _records(chunk))
+        if not created:
+            self._create(sorted(columns or []) if sortCols else
+                         list(columns or []))
+        self._length = None
+
+    @property
+    def columns(self):
+        info = self.database.fetch('PRAGMA table_info({})'.format(
+            _quote(self.table)))
+        return pd.Index([r[1] for r in info if r[1] != INDEX])
+
+    def __len__(self):
+        if self._length is None:
+            self._length = self.database.fetch(
+                'SELECT COUNT(*) FROM {}'.format(_quote(self.table)))[0][0]
+        return self._length
+
+    @property
+    def shape(self):
+        return len(self), len(self.columns)
+
+    def _check(self, cols):
+        missing = [c for c in cols if c not in self.columns]
+        if missing:
+            raise KeyError("{} not in view".format(missing))
+
+    def _frame(self, rows, columns):
+        df = pd.DataFrame.from_records(rows, columns=[INDEX] + columns)
+        df = df.set_index(INDEX)
+        df.index.name = None
+        return df
+
+    def query(self, where='', params=(), columns=None):
+        """ Read the rows of the view `self.chunkSize` at a time, in the
+        order they were written in.
+
+        Parameters
+        ----------
+        where : str
+            Optional. An SQL condition on the rows to read.
+        params : tuple
+            Optional. Parameters of `where`.
+        columns : list
+            Optional. Columns to read. Defaults to all columns.
+
+        Yields
+        ------
+        pandas.DataFrame indexed by row label
+        """
+        columns = list(self.columns) if columns is None else list(columns)
+        self._check(columns)
+        sql = 'SELECT rowid, {} FROM {} WHERE rowid > ?{} ORDER BY rowid ' \
+            'LIMIT {:d}'.format(", ".join(map(_quote, [INDEX] + columns)),
+                                _quote(self.table),
+                                " AND ({})".format(where) if where else "",
+                                self.chunkSize)
+        last = 0
+        while True:
+            rows = self.database.fetch(sql, (last,) + tuple(params))
+            if not rows:
+                break
+            last = rows[-1][0]
+            yield self._frame([r[1:] for r in rows], columns)
+
+    def chunks(self, columns=None):
+        """ All rows of the view, as DataFrames of `self.chunkSize` rows. """
+        return self.query(columns=columns)
+
+    def toFrame(self):
+        """ The whole view as a pandas.DataFrame. """
+        chunks = list(self.chunks())
+        if not chunks:
+            return pd.DataFrame(columns=self.columns)
+        return pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+
+    def _select(self, columns, order):
+        rows = self.database.fetch('SELECT {} FROM {} ORDER BY {}'.format(
+            ", ".join(map(_quote, [INDEX] + columns)), _quote(self.table),
+            order))
+        return self._frame(rows, columns)
+
+    def head(self, n=5):
+        return self._select(list(self.columns), 'rowid LIMIT {:d}'.format(n))
+
+    def tail(self, n=5):
+        return self._select(list(self.columns),
+                            'rowid DESC LIMIT {:d}'.format(n)).iloc[::-1]
+
+    def __getitem__(self, col):
+        """ Column `col` as a pandas.Series, read into memory. """
+        self._check([col])
+        return self._select([col], 'rowid')[col]
+
+    def __setitem__(self, col, value):
+        """ Set every value of column `col` to `value`. """
+        if isinstance(value, (list, tuple, pd.Series)):
+            raise TypeError("Only single values can be assigned to a "
+                            "column of a SqliteView.")
+        self.addColumn(col)
+        self.database.execute('UPDATE {} SET {} = ?'.format(
+            _quote(self.table), _quote(col)), (_value(value),))
+
+    def addColumn(self, col):
+        """ Add an empty column `col`, if it does not exist already. """
+        if col not in self.columns:
+            self.database.execute('ALTER TABLE {} ADD COLUMN {}'.format(
+                _quote(self.table), _quote(col)))
+
+    def drop(self, labels, axis=0):
+        """ Delete rows (`axis` 0) or columns (`axis` 1) of the view.
+
+        Returns
+        -------
+        `self`, modified in place.
+        """
+        labels = [labels] if isinstance(labels, str) else list(labels)
+        if axis == 0:
+            with self._temporary(labels) as values:
+                self.database.execute(
+                    'DELETE FROM {} WHERE {} IN (SELECT value FROM {})'.format(
+                        _quote(self.table), _quote(INDEX), values))
+            self._length = None
+        elif axis == 1:
+            self._check(labels)
+            columns = [c for c in self.columns if c not in labels]
+            if sqlite3.sqlite_version_info >= (3, 35):
+                for c in labels:
+                    self.database.execute(
+                        'ALTER TABLE {} DROP COLUMN {}'.format(
+                            _quote(self.table), _quote(c)))
+            else:
+                self._rebuild(columns)
+        return self
+
+    def _rebuild(self, columns):
+        """ Copy the view to a new table of `columns` only. """
+        table = self.database.name()
+        self.database.execute('CREATE TABLE {} ({})'.format(
+            _quote(table), ", ".join(map(_quote, [INDEX] + columns))))
+        select = ", ".join(map(_quote, [INDEX] + columns))
+        self.database.execute('INSERT INTO {0} SELECT {1} FROM {2} '
+                              'ORDER BY rowid'.format(
+                                  _quote(table), select, _quote(self.table)))
+        self.discard()
+        self.table = table
+
+    @contextlib.contextmanager
+    def _temporary(self, values):
+        """ A temporary table of `values`, a list or a DataFrame, for the
+        duration of the context. Yields its quoted name. """
+        table = _quote(self.database.name('temp'))
+        if isinstance(values, pd.DataFrame):
+            columns = list(values.columns)
+            rows = [r[1:] for r in _records(values)]
+        else:
+            columns = ['value']
+            rows = [(_value(v),) for v in values]
+        self.database.execute('CREATE TEMP TABLE {} ({})'.format(
+            table, ", ".join(map(_quote, columns))))
+        try:
+            self.database.executemany('INSERT INTO {} VALUES ({})'.format(
+                table, ", ".join("?" * len(columns))), rows)
+            self.database.execute('CREATE INDEX {} ON {} ({})'.format(
+                _quote(self.database.name('index')), table,
+                _quote(columns[0])))
+            yield table
+        finally:
+            self.database.execute('DROP TABLE {}'.format(table))
+
+    def capture(self, source, target, regex):
+        """ Set column `target` to the first group of `regex` found in
+        column `source`, as `utils.colFromRegex` does. """
+        if not _compile(regex).groups:
+            raise RuntimeError("`regex` must have at least one capture group.")
+        self._check([source])
+        self.addColumn(target)
+        self.database.execute('UPDATE {} SET {} = capture(?, {})'.format(
+            _quote(self.table), _quote(target), _quote(source)), (regex,))
+
+    def unmatched(self, source, regex, values, limit=50):
+        """ Values of column `source` whose first `regex` group is not
+        one of `values`, compared as strings.
+
+        Returns
+        -------
+        The number of unmatched rows and a list of up to `limit` pairs
+        of their captured and original values.
+        """
+        if not _compile(regex).groups:
+            raise RuntimeError("`regex` must have at least one capture group.")
+        self._check([source])
+        values = pd.Series(values).dropna().astype(str).unique()
+        with self._temporary(values) as keys:
+            select = ('FROM (SELECT capture(?, {0}) AS k, {0} AS s FROM {1}) '
+                      'WHERE k IS NULL OR k NOT IN (SELECT value FROM {2})'
+                      .format(_quote(source), _quote(self.table), keys))
+            count = self.database.fetch('SELECT COUNT(*) ' + select,
+                                        (regex,))[0][0]
+            sample = self.database.fetch(
+                'SELECT k, s {} LIMIT {:d}'.format(select, limit), (regex,))
+        return count, sample
+
+    def substitute(self, col, mod):
+        """ Substitute values of column `col` according to the mapping
+        `mod`, as `utils.substituteColumnValues` does. """
+        self._check([col])
+        mapping = pd.DataFrame(
+                [(k, v) for k, v in mod.items() if k is not None],
+                columns=['old', 'new'])
+        with self._temporary(mapping) as m:
+            self.database.execute(
+                'UPDATE {0} SET {1} = (SELECT m.new FROM {2} AS m '
+                'WHERE m.old = {0}.{1}) WHERE {1} IN (SELECT old FROM {2})'
+                .format(_quote(self.table), _quote(col), m))
+
+    def transfer(self, meta, links, on):
+        """ Set the columns of the view to the values of the matching
+        rows of the metadata, as a left merge on `on` would.
+
+        Parameters
+        ----------
+        meta : pandas.DataFrame
+        links : dict
+            Mappings from columns of the view to columns of `meta`.
+        on : str
+            Column of both the view and `meta` to match upon, compared as
+            strings. Rows of the view take the values of the first
+            matching row of `meta`, or null if there is none.
+        """
+        self._check([on])
+        metaCols = list(set(links.values()))
+        relevant = meta.loc[:, metaCols].copy()
+        relevant.insert(0, on + '_key', meta[on].astype(str).values)
+        names = {c: 'm{}'.format(i) for i, c in enumerate(metaCols)}
+        relevant.columns = ['key'] + [names[c] for c in metaCols]
+        for c in links:
+            self.addColumn(c)
+        with self._temporary(relevant) as m:
+            self.database.execute('UPDATE {} SET {}'.format(
+                _quote(self.table), ", ".join(
+                    '{} = (SELECT m.{} FROM {} AS m WHERE m.key = '
+                    'CAST({}.{} AS TEXT) LIMIT 1)'.format(
+                        _quote(c), names[v], m, _quote(self.table),
+                        _quote(on))
+                    for c, v in links.items())))
+
+    def infer(self, col, referenceCols):
+        """ Fill in `col` for rows which match on `referenceCols` and have
+        a single, unique, non-null value in `col`, as `utils.inferValues`
+        does. """
+        refs = [referenceCols] if isinstance(referenceCols, str) \
+            else list(referenceCols)
+        self._check([col] + refs)
+        groups = _quote(self.database.name('temp'))
+        quoted = list(map(_quote, refs))
+        self.database.execute(
+            'CREATE TEMP TABLE {0} AS SELECT {1}, MIN({2}) AS value, '
+            'COUNT(DISTINCT {2}) AS n FROM {3} WHERE {4} GROUP BY {1}'.format(
+                groups, ", ".join(quoted), _quote(col), _quote(self.table),
+                " AND ".join(q + " IS NOT NULL" for q in quoted)))
+        try:
+            self.database.execute('CREATE INDEX {} ON {} ({})'.format(
+                _quote(self.database.name('index')), groups,
+                ", ".join(quoted)))
+            match = " AND ".join('g.{0} = {1}.{0}'.format(
+                q, _quote(self.table)) for q in quoted)
+            self.database.execute(
+                'UPDATE {0} SET {1} = (SELECT g.value FROM {2} AS g WHERE {3}) '
+                'WHERE EXISTS (SELECT 1 FROM {2} AS g WHERE g.n = 1 AND {3})'
+                .format(_quote(self.table), _quote(col), groups, match))
+            unable = self.database.fetch(
+                'SELECT {} FROM {} WHERE n != 1'.format(
+                    ", ".join(quoted), groups))
+            for k in unable:
+                print("Unable to infer value when {} = {}".format(
+                    referenceCols, k[0] if len(k) == 1 else k))
+        finally:
+            self.database.execute('DROP TABLE {}'.format(groups))
+
+    def hasNulls(self, cols):
+        """ Whether each of `cols` has null values.
+
+        Returns
+        -------
+        pandas.Series of bools indexed by column
+        """
+        cols = list(cols)
+        self._check(cols)
+        if not cols:
+            return pd.Series([], dtype=bool)
+        row = self.database.fetch('SELECT {} FROM {}'.format(
+            ", ".join('COALESCE(MAX({} IS NULL), 0)'.format(_quote(c))
+                      for c in cols), _quote(self.table)))[0]
+        return pd.Series([bool(v) for v in row], index=cols)
+
+    def profile(self, cols):
+        """ `utils.profileColumns` of columns of the view, computed with
+        one query. """
+        from . import utils
+        cols = list(cols)
+        self._check(cols)
+        stats = []
+        for c in cols:
+            text = 'CAST({} AS TEXT)'.format(_quote(c))
+            stats += ['COUNT({})'.format(_quote(c)),
+                      'COUNT(DISTINCT {})'.format(text),
+                      'COALESCE(MAX(LENGTH({})), 0)'.format(text)]
+            stats += ['COALESCE(MIN(CASE WHEN {0} IS NULL THEN 1 ELSE '
+                      'regexp({1}, {2}) END), 1)'.format(
+                          _quote(c), "'{}'".format(regex.replace("'", "''")),
+                          text)
+                      for regex in (utils.INTEGER_REGEX, utils.DOUBLE_REGEX,
+                                    utils.BOOLEAN_REGEX)]
+            stats.append("COALESCE(MAX(regexp('{}', {})), 0)".format(
+                utils.LEADING_ZERO_REGEX, text))
+        row = self.database.fetch('SELECT {} FROM {}'.format(
+            ", ".join(stats), _quote(self.table)))[0] if cols else []
+        return pd.DataFrame(
+            [[int(v) if i < 3 else bool(v)
+              for i, v in enumerate(row[j * 7:(j + 1) * 7])]
+             for j in range(len(cols))], index=cols,
+            columns=['values', 'distinct', 'maxLength', 'integer', 'double',
+                     'boolean', 'leadingZeros'])
+
+    def unique(self, col):
+        """ The distinct values of column `col`. """
+        self._check([col])
+        return [r[0] for r in self.database.fetch(
+            'SELECT DISTINCT {} FROM {}'.format(_quote(col),
+                                                _quote(self.table)))]
+
+    def valueCounts(self, col):
+        """ Number of rows per value of column `col`, as
+        `pandas.Series.value_counts(dropna=False)`. """
+        self._check([col])
+        rows = self.database.fetch(
+            'SELECT {0}, COUNT(*) AS n FROM {1} GROUP BY {0} '
+            'ORDER BY n DESC'.format(_quote(col), _quote(self.table)))
+        return pd.Series([r[1] for r in rows], index=[r[0] for r in rows],
+                         name=col)
+
+    def update(self, other):
+        """ Set the values of the rows of the view which are also in the
+        SqliteView `other` (by label) to their values in `other`. """
+        columns = list(other.columns)
+        for c in columns:
+            self.addColumn(c)
+        if not columns:
+            return
+        self.database.execute('CREATE INDEX IF NOT EXISTS {} ON {} ({})'.format(
+            _quote(other.table + '_index'), _quote(other.table),
+            _quote(INDEX)))
+        match = 'o.{0} = {1}.{0}'.format(_quote(INDEX), _quote(self.table))
+        self.database.execute(
+            'UPDATE {0} SET {1} WHERE {2} IN (SELECT {2} FROM {3})'.format(
+                _quote(self.table), ", ".join(
+                    '{0} = (SELECT {0} FROM {1} AS o WHERE {2})'.format(
+                        _quote(c), _quote(other.table), match)
+                    for c in columns), _quote(INDEX), _quote(other.table)))
+
+    def append(self, df):
+        """ Add the rows of a pandas.DataFrame whose ROW_ID (see
+        `utils.rebaseEdits`) is not in the view yet, and its columns which
+        are not in the view yet. Rows of the view are left as they are.
+
+        Returns
+        -------
+        The number of rows added.
+        """
+        before = len(self)
+        for c in df.columns:
+            self.addColumn(c)
+        rows = SqliteView.fromFrame(df, self.database, self.chunkSize)
+        try:
+            view, new = _quote(self.table), _quote(rows.table)
+            columns = ", ".join(_quote(c) for c in [INDEX] + list(df.columns))
+            self.database.execute(
+                'INSERT INTO {0} ({1}) SELECT {1} FROM {2} WHERE {3} NOT IN '
+                '(SELECT {4} FROM {0})'.format(
+                    view, columns, new, _ROW_ID.format(new, _quote(INDEX)),
+                    _ROW_ID.format(view, _quote(INDEX))))
+        finally:
+            rows.discard()
+        self._length = None
+        return len(self) - before
+
+    def relabel(self, fresh):
+        """ Give the rows of the view the labels and the values of the
+        columns of the rows of a pandas.DataFrame with the same ROW_ID, as
+        `utils.relabel` does. """
+        rows = SqliteView.fromFrame(fresh, self.database, self.chunkSize)
+        try:
+            view, new = _quote(self.table), _quote(rows.table)
+            current = _ROW_ID.format(view, _quote(INDEX))
+            self.database.execute('CREATE TABLE {} AS SELECT {} AS id, * '
+                                  'FROM {}'.format(
+                                      _quote(rows.table + '_id'),
+                                      _ROW_ID.format(new, _quote(INDEX)),
+                                      new))
+            new = _quote(rows.table + '_id')
+            self.database.execute('CREATE INDEX {} ON {} (id)'.format(
+                _quote(rows.table + '_index'), new))
+            columns = [INDEX] + [c for c in fresh.columns
+                                 if c in self.columns]
+            self.database.execute(
+                'UPDATE {0} SET {1} WHERE {2} IN (SELECT id FROM {3})'.format(
+                    view, ", ".join(
+                        '{0} = (SELECT n.{0} FROM {1} AS n WHERE n.id = {2})'
+                        .format(_quote(c), new, current) for c in columns),
+                    current, new))
+        finally:
+            self.database.execute('DROP TABLE IF EXISTS {}'.format(
+                _quote(rows.table + '_id')))
+            rows.discard()
+
+    def rebase(self, snapshot, edited):
+        """ Apply to the view the edits made to the SqliteView `edited`
+        since it was copied from the SqliteView `snapshot`, as
+        `utils.rebaseEdits` does. Rows are matched on their ROW_ID. """
+        rowId = _ROW_ID
+        view, before, after = (_quote(v.table) for v in
+                               (self, snapshot, edited))
+        self.database.execute('CREATE INDEX IF NOT EXISTS {} ON {} ({})'.format(
+            _quote(snapshot.table + '_index'), before, _quote(INDEX)))
+        self.database.execute(
+            'DELETE FROM {0} WHERE {1} IN (SELECT {2} FROM {3} WHERE {4} '
+            'NOT IN (SELECT {4} FROM {5}))'.format(
+                view, rowId.format(view, _quote(INDEX)),
+                rowId.format(before, _quote(INDEX)), before, _quote(INDEX),
+                after))
+        beforeCols, afterCols = list(snapshot.columns), list(edited.columns)
+        dropped = [c for c in beforeCols if c not in afterCols
+                   and c in self.columns]
+        if dropped:
+            self.drop(dropped, axis=1)
+        for c in afterCols:
+            if c in beforeCols:
+                select = ('SELECT {0} AS id, a.{1} AS value FROM {2} AS a '
+                          'JOIN {3} AS b ON a.{4} = b.{4} '
+                          'WHERE a.{1} IS NOT b.{1}'.format(
+                              rowId.format('a', _quote(INDEX)), _quote(c),
+                              after, before, _quote(INDEX)))
+            else:
+                select = 'SELECT {} AS id, a.{} AS value FROM {} AS a'.format(
+                    rowId.format('a', _quote(INDEX)), _quote(c), after)
+            changes = _quote(self.database.name('temp'))
+            self.database.execute('CREATE TEMP TABLE {} AS {}'.format(
+                changes, select))
+            try:
+                if not self.database.fetch('SELECT COUNT(*) FROM {}'.format(
+                        changes))[0][0]:
+                    continue
+                self.database.execute('CREATE INDEX {} ON {} (id)'.format(
+                    _quote(self.database.name('index')), changes))
+                self.addColumn(c)
+                current = rowId.format(view, _quote(INDEX))
+                self.database.execute(
+                    'UPDATE {0} SET {1} = (SELECT value FROM {2} AS e '
+                    'WHERE e.id = {3}) WHERE {3} IN (SELECT id FROM {2})'
+                    .format(view, _quote(c), changes, current))
+            finally:
+                self.database.execute('DROP TABLE {}'.format(changes))
+        self._length = None
+
+    def snapshot(self):
+        """ A copy of the view, in a new table of the same database. """
+        copy = SqliteView(self.database, self.database.name(), self.chunkSize)
+        self.database.execute('CREATE TABLE {} AS SELECT * FROM {} '
+                              'ORDER BY rowid'.format(_quote(copy.table),
+                                                      _quote(self.table)))
+        copy._length = self._length
+        return copy
+
+    def discard(self):
+        """ Delete the table of the view. """
+        if self.database.connection is not None:
+            self.database.execute('DROP TABLE IF EXISTS {}'.format(
+                _quote(self.table)))
+
+
+def synread(syn, synId, entity=None, sortCols=True, database=None,
+            chunkSize=CHUNK_SIZE):
+    """ Read a Synapse table, file view or delimited file into a
+    SqliteView, `chunkSize` rows at a time.
+
+    Parameters
+    ----------
+    syn : synapseclient.Synapse
+    synId : str
+    entity : synapseclient.Entity
+        Optional. The entity `synId` refers to, if already fetched.
+    sortCols : bool
+        Optional. Whether to sort columns lexicographically.
+        Defaults to True.
+    database : Database
+        Optional. Database to store the view in. Defaults to a new
+        temporary database.
+    chunkSize : int
+        Optional. Defaults to `CHUNK_SIZE`.
+
+    Returns
+    -------
+    SqliteView
+    """
+    import synapseclient as sc
+    entity = syn.get(synId) if entity is None else entity
+    if isinstance(entity, sc.entity.File):
+        return SqliteView.fromCsv(entity.path, database, chunkSize, sortCols,
+                                  sep=None, engine="python")
+    q = syn.tableQuery("select * from %s" % synId)
+    if getattr(q, 'filepath', None):  # query results downloaded as CSV
+        return SqliteView.fromCsv(
+                q.filepath, database, chunkSize, sortCols,
+                sep=getattr(q, 'separator', ','),
+                quotechar=getattr(q, 'quoteCharacter', '"'),
+                escapechar=getattr(q, 'escapeCharacter', '\\'))
+    view = SqliteView(database, chunkSize=chunkSize)
+    df = q.asDataFrame()
+    view.write(_frameChunks(df, chunkSize), columns=list(df.columns),
+               sortCols=sortCols)
+    return view
@@ -0,0 +1,87 @@
+import os
+import json
+import hashlib
+import tempfile
+
+CACHE_DIR = os.environ.get(
+        'ANNOTATOR_CACHE_DIR',
+        os.path.join(os.path.expanduser('~'), '.annotator', 'cache'))
+
+
+def cacheDir(namespace, root=None):
+    """ Get (and create if necessary) the directory of a cache namespace.
+
+    Parameters
+    ----------
+    namespace : str
+        Name of the cache, e.g. 'annotations'.
+    root : str
+        Optional. Root cache directory. Defaults to `CACHE_DIR`, which
+        can be set with the ANNOTATOR_CACHE_DIR environment variable.
+
+    Returns
+    -------
+    Path to the namespace directory.
+    """
+    path = os.path.join(root or CACHE_DIR, namespace)
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+    return path
+
+
+class DiskCache(object):
+    """ A persistent store of JSON documents, one file per key.
+
+    Keys are arbitrary strings (URLs, content hashes, ...) and are hashed
+    to file names. Writes are atomic, so concurrent readers never see
+    a partially written document.
+    """
+
+    def __init__(self, namespace, root=None):
+        """ Create a new DiskCache object.
+
+        Parameters
+        ----------
+        namespace : str
+            Name of the cache. Each namespace lives in its own directory.
+        root : str
+            Optional. Root cache directory. Defaults to `CACHE_DIR`.
+        """
+        self.path = cacheDir(namespace, root)
+
+    def _file(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, digest + '.json')
+
+    def get(self, key, default=None):
+        """ Fetch the document stored under `key`, or `default`. """
+        try:
+            with open(self._file(key), 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return default
+
+    def set(self, key, value):
+        """ Store the JSON serializable `value` under `key`. """
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(value, f)
+            os.replace(tmp, self._file(key))
+        except Exception:
+            os.remove(tmp)
+            raise
+
+    def delete(self, key):
+        """ Remove `key` from the cache, if present. """
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+
+    def __contains__(self, key):
+        return os.path.exists(self._file(key))
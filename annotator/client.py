@@ -0,0 +1,503 @@
+import time
+import random
+import weakref
+import threading
+from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
+from . import cache
+from . import trace
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+WRITE_RETRY_STATUSES = (429,)  # rejected before being applied
+THROTTLE_STATUSES = (429, 503)
+SCHEMA_TYPE = 'org.sagebionetworks.repo.model.table.'  # concreteType prefix
+
+_attempts = threading.local()
+_metadata = weakref.WeakKeyDictionary()  # synapseclient.Synapse -> cache
+_limiters = weakref.WeakKeyDictionary()  # synapseclient.Synapse -> limiter
+_pooled = weakref.WeakSet()  # requests sessions with a sized pool
+
+
+def _status(ex):
+    """ HTTP status code of the response which raised `ex`, if any. """
+    response = getattr(ex, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+def _retryAfter(ex):
+    """ Seconds to wait according to the Retry-After header, if any. """
+    response = getattr(ex, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def attempt():
+    """ Number of times the call running on this thread has been retried. """
+    return getattr(_attempts, 'value', 0)
+
+
+def _isRetryable(ex, idempotent=True):
+    """ Whether a call which raised `ex` may be retried. Calls which are
+    not idempotent are only retried if the server refused them, since
+    other errors may come after the server applied them. """
+    status = _status(ex)
+    if status is not None:
+        return status in (RETRY_STATUSES if idempotent
+                          else WRITE_RETRY_STATUSES)
+    # connection resets, timeouts, ...
+    return idempotent and type(ex).__name__ in (
+        'ConnectionError', 'Timeout', 'ReadTimeout', 'ConnectTimeout',
+        'ChunkedEncodingError')
+
+
+class AdaptiveLimiter(object):
+    """ Limit the number of concurrent requests, adapting the limit to
+    the server's responses.
+
+    The limit grows by one after a limit's worth of successful requests
+    and is halved whenever the server throttles us (429/503), so the
+    number of requests in flight hovers just below what the server
+    accepts.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=16):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self._inFlight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """ Block until a request may be sent. """
+        with self._condition:
+            while self._inFlight >= self.limit:
+                self._condition.wait()
+            self._inFlight += 1
+
+    def release(self, throttled=False):
+        """ Record the end of a request.
+
+        Parameters
+        ----------
+        throttled : bool
+            Optional. Whether the server throttled the request.
+            Defaults to False.
+        """
+        with self._condition:
+            self._inFlight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.limit:
+                    self.limit = min(self.maximum, self.limit + 1)
+                    self._successes = 0
+            self._condition.notify_all()
+
+
+def _isSchema(entity):
+    """ Whether `entity` is the schema of a table or view. """
+    return str(getattr(entity, 'get', lambda k: None)('concreteType')
+               ).startswith(SCHEMA_TYPE)
+
+
+def _copy(entity):
+    """ A deep copy of a synapseclient.Entity. """
+    import synapseclient as sc
+    return sc.Entity.create(deepcopy(dict(entity.properties)),
+                            deepcopy(dict(entity.annotations)),
+                            deepcopy(entity.local_state()))
+
+
+class MetadataCache(object):
+    """ Metadata of tables and file views which rarely changes within a
+    session, shared by the Clients of a synapseclient.Synapse object.
+
+    Schemas (table and view entities) are kept by Synapse ID, and replaced
+    by the schema returned when one is stored through a Client. Column
+    models of a schema are kept under the etag of the schema, which changes
+    whenever its columns do, so they never go stale, and may be persisted
+    on disk across sessions. The default columns of a scope are kept by
+    the set of its Synapse IDs until rows or entities are stored through a
+    Client, which may add annotation keys to the scope.
+
+    Changes made on Synapse other than through a Client sharing this cache
+    are not seen until `invalidate` is called.
+    """
+
+    def __init__(self, persist=False, root=None):
+        """ Create a new MetadataCache object.
+
+        Parameters
+        ----------
+        persist : bool
+            Optional. Whether to also keep column models in the 'metadata'
+            `cache.DiskCache`. Defaults to False.
+        root : str
+            Optional. Root cache directory. Defaults to `cache.CACHE_DIR`.
+        """
+        self._schemas = {}
+        self._columns = {}
+        self._scopes = {}
+        self._lock = threading.Lock()
+        self.disk = cache.DiskCache('metadata', root) if persist else None
+
+    def schema(self, synId):
+        """ A copy of the cached schema of `synId`, or None. """
+        with self._lock:
+            schema = self._schemas.get(synId)
+        return None if schema is None else _copy(schema)
+
+    def setSchema(self, schema):
+        with self._lock:
+            self._schemas[schema['id']] = _copy(schema)
+
+    def _columnsKey(self, synId):
+        schema = self._schemas.get(synId)
+        etag = None if schema is None else schema.get('etag')
+        return None if etag is None else "{}.{}".format(synId, etag)
+
+    def columns(self, synId):
+        """ The cached column models (as dicts) of the schema of `synId`,
+        if its schema is cached, or None. """
+        with self._lock:
+            key = self._columnsKey(synId)
+            if key is None:
+                return None
+            if key not in self._columns and self.disk is not None:
+                cols = self.disk.get(key)
+                if cols is not None:
+                    self._columns[key] = cols
+            return deepcopy(self._columns.get(key))
+
+    def setColumns(self, synId, cols):
+        with self._lock:
+            key = self._columnsKey(synId)
+            if key is None:
+                return
+            self._columns[key] = [dict(c) for c in cols]
+            if self.disk is not None:
+                self.disk.set(key, self._columns[key])
+
+    def defaultColumns(self, scope):
+        """ The cached default columns of `scope`, or None. """
+        with self._lock:
+            return deepcopy(self._scopes.get(frozenset(scope)))
+
+    def setDefaultColumns(self, scope, cols):
+        with self._lock:
+            self._scopes[frozenset(scope)] = [dict(c) for c in cols]
+
+    def invalidate(self, synId=None):
+        """ Forget the schema of `synId`, if any, and the default columns
+        of every scope. """
+        with self._lock:
+            self._schemas.pop(synId, None)
+            self._scopes.clear()
+
+    def clear(self):
+        """ Forget everything kept in memory. """
+        with self._lock:
+            self._schemas.clear()
+            self._columns.clear()
+            self._scopes.clear()
+
+
+class Client(object):
+    """ A thin layer over synapseclient.Synapse shared by annotator.
+
+    Every call goes through an adaptive concurrency limiter and is retried
+    with exponential backoff and jitter on throttling and transient
+    errors (only on throttling for calls which write to Synapse, see
+    `write`). Connections are kept alive in a pool sized for concurrent
+    use. The limiter and the pool are shared by the Clients of a
+    synapseclient.Synapse object, so that wrapping it again is cheap and
+    concurrent callers are limited together. Schemas and column models of tables and views are cached (see
+    `MetadataCache`). Attributes not defined here are passed through to the
+    wrapped synapseclient.Synapse object, which may be created lazily on
+    first use (see `lazy`).
+    """
+
+    def __init__(self, syn, maxRetries=6, backoff=0.5, maxBackoff=60,
+                 limiter=None, poolSize=32, metadata=None):
+        """ Create a new Client object.
+
+        Parameters
+        ----------
+        syn : synapseclient.Synapse
+        maxRetries : int
+            Optional. Number of times to retry a failed call. Defaults to 6.
+        backoff : float
+            Optional. Base delay in seconds of the exponential backoff.
+            Defaults to 0.5.
+        maxBackoff : float
+            Optional. Maximum delay in seconds between retries.
+            Defaults to 60.
+        limiter : AdaptiveLimiter
+            Optional. Limiter to share between the Clients of `syn`.
+            Defaults to the limiter already shared by the Clients of
+            `syn`, or a new AdaptiveLimiter.
+        poolSize : int
+            Optional. Number of keep-alive connections to pool per host.
+            Defaults to 32.
+        metadata : MetadataCache
+            Optional. Metadata cache to share between the Clients of
+            `syn`, e.g. one persisted on disk. Defaults to the cache
+            already shared by the Clients of `syn`, or a new in-memory one.
+        """
+        self._syn = syn
+        self._factory = None
+        self._poolSize = poolSize
+        self._lock = threading.Lock()
+        self.maxRetries = maxRetries
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+        self._limiter = limiter
+        self._local = threading.local()
+        self._metadataCache = metadata
+        if syn is not None and metadata is not None:
+            _metadata[syn] = metadata
+        if syn is not None and limiter is not None:
+            _limiters[syn] = limiter
+        self._mountPool(poolSize)
+
+    @property
+    def syn(self):
+        """ The wrapped synapseclient.Synapse object, created on first
+        access by lazy Clients. """
+        if self._syn is None and self._factory is not None:
+            with self._lock:
+                if self._syn is None:
+                    self._syn = self._factory()
+                    self._mountPool(self._poolSize)
+        return self._syn
+
+    def __getattr__(self, name):
+        if name in ('_syn', '_factory', '_poolSize', '_lock', '_local',
+                    '_metadataCache', '_limiter'):
+            raise AttributeError(name)  # not yet initialized
+        return getattr(self.syn, name)
+
+    @property
+    def metadata(self):
+        """ The MetadataCache of the wrapped synapseclient.Synapse object.
+        """
+        syn = self.syn
+        with self._lock:
+            if syn not in _metadata:
+                _metadata[syn] = (MetadataCache() if self._metadataCache
+                                  is None else self._metadataCache)
+            return _metadata[syn]
+
+    @property
+    def limiter(self):
+        """ The AdaptiveLimiter of the wrapped synapseclient.Synapse
+        object. """
+        syn = self.syn
+        with self._lock:
+            if syn not in _limiters:
+                _limiters[syn] = (AdaptiveLimiter() if self._limiter is None
+                                  else self._limiter)
+            return _limiters[syn]
+
+    def _mountPool(self, poolSize):
+        """ Size the connection pool of the underlying requests session,
+        once per session so that its open connections are kept. """
+        session = getattr(self._syn, '_requests_session', None)
+        if session is None or not hasattr(session, 'mount'):
+            return
+        with self._lock:
+            if session in _pooled:
+                return
+            _pooled.add(session)
+        from requests.adapters import HTTPAdapter
+        adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+    def call(self, func, *args, **kwargs):
+        """ Call `func`, retrying on throttling and transient errors.
+
+        `func` must be safe to call again after failing, e.g. a read.
+        Use `write` for calls which change data on Synapse.
+
+        Parameters
+        ----------
+        func : callable
+            Usually a method of the wrapped synapseclient.Synapse object.
+        *args, **kwargs
+            Passed to `func`.
+
+        Returns
+        -------
+        The return value of `func`.
+        """
+        return self._call(func, args, kwargs, idempotent=True)
+
+    def write(self, func, *args, **kwargs):
+        """ Call `func`, which changes data on Synapse, e.g. by storing
+        rows, retrying only when the server throttles it.
+
+        Other errors may come after the server applied the change, and
+        calling `func` again would apply it twice. See `call`.
+        """
+        return self._call(func, args, kwargs, idempotent=False)
+
+    def _call(self, func, args, kwargs, idempotent):
+        if getattr(self._local, 'active', False):
+            # already inside a call on this thread, which owns the retries
+            return func(*args, **kwargs)
+        limiter = self.limiter
+        attempt = 0
+        while True:
+            limiter.acquire()
+            self._local.active = True
+            _attempts.value = attempt
+            try:
+                result = func(*args, **kwargs)
+            except Exception as ex:
+                self._local.active = False
+                _attempts.value = 0
+                limiter.release(throttled=_status(ex) in THROTTLE_STATUSES)
+                if (attempt >= self.maxRetries
+                        or not _isRetryable(ex, idempotent)):
+                    raise
+                delay = _retryAfter(ex)
+                if delay is None:
+                    delay = random.uniform(0, self.backoff * 2 ** attempt)
+                delay = min(self.maxBackoff, delay)
+                attempt += 1
+                time.sleep(delay)
+            else:
+                self._local.active = False
+                _attempts.value = 0
+                limiter.release()
+                return result
+
+    def map(self, func, iterable):
+        """ Call `func` on every item of `iterable` concurrently.
+
+        Calls are subject to the same limiter and retries as `call`, or
+        to those of the Client method `func` is, e.g. `self.store`.
+
+        Parameters
+        ----------
+        func : callable
+        iterable : iterable
+            Arguments to `func`, one call per item.
+
+        Returns
+        -------
+        A list of results, in the order of `iterable`.
+        """
+        items = list(iterable)
+        if len(items) <= 1:
+            return [self.call(func, i) for i in items]
+        workers = min(len(items), self.limiter.maximum)
+        if getattr(func, '__self__', None) is self:
+            call = trace.bind(func)  # retries its own calls
+        else:
+            call = trace.bind(lambda i: self.call(func, i))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(call, items))
+
+    def get(self, obj, *args, **kwargs):
+        """ `synapseclient.Synapse.get`. Schemas of tables and views are
+        read from `self.metadata` when cached. """
+        cacheable = (isinstance(obj, str) and not args
+                     and 'version' not in kwargs)
+        if cacheable:
+            schema = self.metadata.schema(obj)
+            if schema is not None:
+                return schema
+        entity = self.call(self.syn.get, obj, *args, **kwargs)
+        if cacheable and _isSchema(entity):
+            self.metadata.setSchema(entity)
+        return entity
+
+    def store(self, obj, *args, **kwargs):
+        """ `synapseclient.Synapse.store`, updating `self.metadata`. """
+        result = self.write(self.syn.store, obj, *args, **kwargs)
+        if _isSchema(result):
+            self.metadata.setSchema(result)
+        else:
+            self.metadata.invalidate(getattr(obj, 'tableId', None))
+        return result
+
+    def delete(self, obj, *args, **kwargs):
+        result = self.call(self.syn.delete, obj, *args, **kwargs)
+        self.metadata.invalidate(obj if isinstance(obj, str)
+                                 else getattr(obj, 'id', None))
+        return result
+
+    def tableQuery(self, *args, **kwargs):
+        return self.call(self.syn.tableQuery, *args, **kwargs)
+
+    def getTableColumns(self, table, *args, **kwargs):
+        """ `synapseclient.Synapse.getTableColumns`, as a list. Column
+        models of cached schemas are read from `self.metadata`. """
+        synId = table if isinstance(table, str) else table['id']
+        cols = self.metadata.columns(synId)
+        if cols is not None:
+            import synapseclient as sc
+            return [sc.Column(**c) for c in cols]
+        cols = self.call(lambda: list(self.syn.getTableColumns(
+                table, *args, **kwargs)))
+        self.metadata.setColumns(synId, cols)
+        return cols
+
+    def createColumns(self, *args, **kwargs):
+        return self.write(self.syn.createColumns, *args, **kwargs)
+
+    def restGET(self, *args, **kwargs):
+        return self.call(self.syn.restGET, *args, **kwargs)
+
+    def restPOST(self, *args, **kwargs):
+        return self.write(self.syn.restPOST, *args, **kwargs)
+
+    def restPUT(self, *args, **kwargs):
+        return self.call(self.syn.restPUT, *args, **kwargs)
+
+
+def wrap(syn):
+    """ Get a Client for `syn`.
+
+    Parameters
+    ----------
+    syn : synapseclient.Synapse or Client
+
+    Returns
+    -------
+    `syn` itself if it is already a Client (or None), otherwise a new
+    Client wrapping `syn`, sharing the limiter, connection pool and
+    metadata cache of the other Clients of `syn`.
+    """
+    if syn is None or isinstance(syn, Client):
+        return syn
+    return Client(syn)
+
+
+def lazy(factory, **kwargs):
+    """ Get a Client which creates its synapseclient.Synapse object, e.g.
+    by logging in, only when it is first used.
+
+    Parameters
+    ----------
+    factory : callable
+        Called without arguments to create the synapseclient.Synapse
+        object.
+    **kwargs
+        Passed to `Client`.
+
+    Returns
+    -------
+    A Client.
+    """
+    c = Client(None, **kwargs)
+    c._factory = factory
+    return c
@@ -0,0 +1,206 @@
+""" Opt-in accounting of the HTTP requests made by annotator operations.
+
+While the ledger is enabled every request sent through `requests` --
+Synapse calls made by synapseclient as well as GitHub calls -- is
+recorded with its method, endpoint, status, latency, bytes sent and
+received and retry attempt, and attributed to the traced operation (see
+`annotator.trace`) which triggered it.
+
+    >>> from annotator import ledger
+    >>> ledger.enable()
+    >>> p.addView("syn123")
+    >>> print(ledger.summary())
+    >>> ledger.export("requests.json")
+
+From the command line, use `annotator --ledger [PATH] <COMMAND>`.
+"""
+import re
+import json
+import time
+import threading
+import collections
+from . import trace
+from . import client
+
+MAX_ENTRIES = 100000
+
+_enabled = False
+_entries = collections.deque(maxlen=MAX_ENTRIES)
+_originalSend = None
+
+_SYNAPSE_ID = re.compile(r"syn\d+(\.\d+)?", re.IGNORECASE)
+_NUMBER = re.compile(r"(?<=/)\d+(?=/|$)")
+_HEX = re.compile(r"(?<=/)[0-9a-f]{16,}(?=/|$)", re.IGNORECASE)
+
+
+def enable():
+    """ Start recording HTTP requests. Also enables `annotator.trace`,
+    which attributes requests to operations. """
+    global _enabled, _originalSend
+    if not trace.enabled():
+        trace.enable()
+    if _originalSend is None:
+        import requests
+        _originalSend = requests.Session.send
+        requests.Session.send = _send
+    _enabled = True
+
+
+def disable():
+    """ Stop recording HTTP requests. Recorded requests are kept. """
+    global _enabled, _originalSend
+    if _originalSend is not None:
+        import requests
+        requests.Session.send = _originalSend
+        _originalSend = None
+    _enabled = False
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    """ Forget all recorded requests. """
+    _entries.clear()
+
+
+def entries():
+    """ Recorded requests, oldest first.
+
+    Returns
+    -------
+    list of dict
+    """
+    return list(_entries)
+
+
+def endpoint(url):
+    """ `url` without its query, Synapse IDs and other identifiers,
+    so that requests to the same API endpoint are grouped together.
+
+    Parameters
+    ----------
+    url : str
+
+    Returns
+    -------
+    str, e.g. "repo-prod.prod.sagebase.org/repo/v1/entity/{id}/bundle"
+    """
+    from urllib.parse import urlparse
+    parsed = urlparse(url)
+    path = _SYNAPSE_ID.sub("{id}", parsed.path)
+    path = _HEX.sub("{hash}", path)
+    path = _NUMBER.sub("{n}", path)
+    return parsed.netloc + path
+
+
+def _service(host):
+    if 'github' in host:
+        return 'github'
+    if 'synapse' in host or 'sagebase' in host:
+        return 'synapse'
+    return host
+
+
+def _size(body):
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    return None  # streamed upload of unknown length
+
+
+def _received(response):
+    """ Bytes of the response body, without reading streamed bodies. """
+    content = getattr(response, '_content', False)
+    if content not in (False, None):
+        return len(content)
+    try:
+        return int(response.headers.get('Content-Length'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _send(session, request, **kwargs):
+    start = time.perf_counter()
+    response = error = None
+    try:
+        response = _originalSend(session, request, **kwargs)
+        return response
+    except Exception as ex:
+        error = type(ex).__name__
+        raise
+    finally:
+        if _enabled:
+            _record(request, response, time.perf_counter() - start, error)
+
+
+def _record(request, response, latency, error):
+    operations = trace.operations()
+    url = getattr(request, 'url', '') or ''
+    point = endpoint(url)
+    _entries.append({
+        'operation': operations[0] if operations else None,
+        'caller': operations[-1] if operations else None,
+        'method': getattr(request, 'method', None),
+        'service': _service(point.split('/')[0]),
+        'endpoint': point,
+        'status': getattr(response, 'status_code', None),
+        'latency': latency,
+        'sent': _size(getattr(request, 'body', None)),
+        'received': _received(response) if response is not None else None,
+        'attempt': client.attempt(),
+        'error': error,
+        'thread': threading.current_thread().ident})
+
+
+def summary(by=('operation', 'service', 'method', 'endpoint')):
+    """ Aggregate recorded requests.
+
+    Parameters
+    ----------
+    by : list-like
+        Optional. Fields of the recorded requests to group by. Defaults to
+        the top-level operation, service, method and endpoint.
+
+    Returns
+    -------
+    pandas.DataFrame with the number of requests, retries and errors
+    (failed requests or HTTP statuses >= 400), total and maximum latency
+    and total bytes sent and received per group, sorted by number of
+    requests.
+    """
+    import pandas as pd
+    by = list(by)
+    columns = ['requests', 'retries', 'errors', 'latency', 'max_latency',
+               'sent', 'received']
+    recorded = entries()
+    if not recorded:
+        return pd.DataFrame(columns=by + columns).set_index(by)
+    df = pd.DataFrame(recorded)
+    df[by] = df[by].fillna('-')
+    df['retry'] = df.attempt > 0
+    df['failed'] = df.error.notnull() | (df.status.fillna(0) >= 400)
+    grouped = df.groupby(by)
+    result = pd.DataFrame({
+        'requests': grouped.size(),
+        'retries': grouped.retry.sum(),
+        'errors': grouped.failed.sum(),
+        'latency': grouped.latency.sum(),
+        'max_latency': grouped.latency.max(),
+        'sent': grouped.sent.sum(),
+        'received': grouped.received.sum()}, columns=columns)
+    return result.sort_values('requests', ascending=False)
+
+
+def export(path):
+    """ Write every recorded request and the summary to `path` as JSON.
+
+    Parameters
+    ----------
+    path : str
+    """
+    table = summary().reset_index()
+    with open(path, 'w') as f:
+        json.dump({'requests': entries(),
+                   'summary': json.loads(table.to_json(orient='records'))},
+                  f, indent=2)
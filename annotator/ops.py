@@ -0,0 +1,433 @@
+""" Operation logs of Pipeline sessions.
+
+Every mutating Pipeline method called by the user is recorded in
+`Pipeline._ops` as a dict of the method name (`op`) and its arguments
+(`args`), including the values entered at prompts (e.g. the regex of
+`addKeyCol`). A log can be exported to JSON and replayed against a fresh
+or refreshed view, in which case adjacent operations are fused where
+possible so that the view is modified in as few passes as possible.
+"""
+import json
+import functools
+from copy import deepcopy
+
+VERSION = 1
+
+
+def recorded(method):
+    """ Decorate a Pipeline method to record its calls in `self._ops`.
+
+    Calls made from within another recorded method are not recorded
+    themselves. The method may call `resolve` to record arguments it
+    prompted the user for.
+    """
+    from inspect import signature
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        bound = signature(method).bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        callArgs = dict(bound.arguments)
+        for k in ('self', 'backup'):
+            callArgs.pop(k, None)
+        stack = self.__dict__.setdefault('_opStack', [])
+        if not stack and self._publishing is not None:
+            self._reconcile()  # apply a finished background publish
+        if (not stack and self.__dict__.get('_plan')
+                and method.__name__ not in DEFERRABLE):
+            self.collect()  # run deferred operations first, in order
+        stack.append(callArgs)
+        try:
+            result = method(self, *args, **kwargs)
+        finally:
+            stack.pop()
+        if not stack:
+            self._ops.append({'op': method.__name__,
+                              'args': deepcopy(callArgs)})
+        return result
+    return wrapper
+
+
+def record(pipeline, op, **args):
+    """ Record a call of `op` which ran without calling the method, e.g.
+    in the background, unless a recorded method is running. """
+    if not pipeline.__dict__.get('_opStack'):
+        pipeline._ops.append({'op': op, 'args': deepcopy(args)})
+
+
+def resolve(pipeline, **args):
+    """ Record the arguments a recorded method resolved while running,
+    e.g. by prompting the user. """
+    stack = pipeline.__dict__.get('_opStack')
+    if stack:
+        stack[-1].update(args)
+
+
+def _encode(obj):
+    """ Make `obj` JSON serializable, keeping dicts with keys other than
+    strings and numpy scalars. """
+    if isinstance(obj, dict):
+        if all(isinstance(k, str) for k in obj):
+            return {k: _encode(v) for k, v in obj.items()}
+        return {'__items__': [[_encode(k), _encode(v)] for k, v in obj.items()]}
+    if isinstance(obj, (list, tuple)):
+        return [_encode(v) for v in obj]
+    if hasattr(obj, 'to_dict') and hasattr(obj, 'columns'):  # DataFrame
+        return {'__frame__': json.loads(obj.to_json(orient='split'))}
+    if hasattr(obj, 'item') and not isinstance(obj, (str, bytes)):
+        return obj.item()  # numpy scalar
+    return obj
+
+
+def _decode(obj):
+    if isinstance(obj, dict):
+        if set(obj) == {'__items__'}:
+            return {_hashable(_decode(k)): _decode(v)
+                    for k, v in obj['__items__']}
+        if set(obj) == {'__frame__'}:
+            import pandas as pd
+            frame = obj['__frame__']
+            return pd.DataFrame(frame['data'], index=frame['index'],
+                                columns=frame['columns'])
+        return {k: _decode(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_decode(v) for v in obj]
+    return obj
+
+
+def _hashable(key):
+    return tuple(key) if isinstance(key, list) else key
+
+
+def dump(log, path):
+    """ Write an operation log to `path` as JSON. """
+    with open(path, 'w') as f:
+        json.dump({'version': VERSION, 'ops': _encode(list(log))}, f,
+                  indent=2)
+
+
+def load(path):
+    """ Read an operation log written by `dump`.
+
+    Returns
+    -------
+    list of dict
+    """
+    with open(path) as f:
+        doc = json.load(f)
+    if doc.get('version') != VERSION:
+        raise ValueError("Unsupported operation log version: {}".format(
+            doc.get('version')))
+    return _decode(doc['ops'])
+
+
+def _compose(first, second):
+    """ A single substitution mapping equivalent to applying `first` and
+    then `second`. """
+    composed = {}
+    for k, v in first.items():
+        try:
+            composed[k] = second.get(v, v)
+        except TypeError:  # unhashable value
+            composed[k] = v
+    for k, v in second.items():
+        if k not in first:
+            composed[k] = v
+    return composed
+
+
+def fuse(log):
+    """ Fuse adjacent operations of a log.
+
+    - consecutive `addDefaultValues` are merged, later values winning,
+    - consecutive `substituteColumnValues` of a column are composed,
+    - a substitution of a column just set by `addDefaultValues` is applied
+      to the default value instead,
+    - a substitution of a column overwritten by the next `addDefaultValues`
+      is dropped,
+    - consecutive `addActiveCols` with the same options are merged.
+
+    Parameters
+    ----------
+    log : list of dict
+
+    Returns
+    -------
+    A new, equivalent log.
+    """
+    fused = []
+    for op in deepcopy(list(log)):
+        name, args = op['op'], op['args']
+        last = fused[-1] if fused else None
+        if name == 'addDefaultValues':
+            while (last is not None and last['op'] == 'substituteColumnValues'
+                   and last['args']['col'] in args['colVals']):
+                fused.pop()
+                last = fused[-1] if fused else None
+            if last is not None and last['op'] == 'addDefaultValues':
+                last['args']['colVals'].update(args['colVals'])
+                continue
+        elif name == 'substituteColumnValues' and last is not None:
+            col, mod = args['col'], args['mod']
+            if (last['op'] == 'substituteColumnValues'
+                    and last['args']['col'] == col):
+                last['args']['mod'] = _compose(last['args']['mod'], mod)
+                continue
+            if (last['op'] == 'addDefaultValues'
+                    and col in last['args']['colVals']):
+                value = last['args']['colVals'][col]
+                try:
+                    last['args']['colVals'][col] = mod.get(value, value)
+                    continue
+                except TypeError:  # unhashable default value
+                    pass
+        elif (name == 'addActiveCols' and last is not None
+              and last['op'] == 'addActiveCols'
+              and isinstance(args['activeCols'], list)
+              and isinstance(last['args']['activeCols'], list)
+              and (last['args']['path'], last['args']['isMeta'])
+              == (args['path'], args['isMeta'])):
+            last['args']['activeCols'] += [
+                c for c in args['activeCols']
+                if c not in last['args']['activeCols']]
+            continue
+        fused.append(op)
+    return fused
+
+
+_fuse = fuse
+
+
+def replay(pipeline, log, fuse=True):
+    """ Apply the operations of a log to `pipeline`.
+
+    A single backup is made before replaying, so that `pipeline.undo()`
+    reverts the whole replay, and none during it. If an operation fails,
+    `pipeline` is reverted to this backup before the exception is raised.
+
+    The operations are replayed as by a lazy Pipeline: runs of `DEFERRABLE`
+    operations are planned and executed in a single pass once the next
+    operation needs the view, or at the end (see `optimize`). If
+    `pipeline` is lazy itself, the last run is left in its plan, marked as
+    part of the replay, and `pipeline.undo()` discards it with the rest.
+    Deferred operations of `pipeline` are executed before replaying.
+
+    Parameters
+    ----------
+    pipeline : annotator.Pipeline
+    log : list of dict or str
+        An operation log or the path of one written by `dump`.
+    fuse : bool
+        Optional. Whether to fuse adjacent operations first (see `fuse`).
+        Defaults to True.
+    """
+    if not isinstance(log, list):
+        log = load(log)
+    if fuse:
+        log = _fuse(log)
+    pipeline.collect()
+    pipeline.backup("replay")
+    pipeline._suspendBackup = True
+    lazy, pipeline._lazy = pipeline._lazy, True
+    try:
+        for op in log:
+            getattr(pipeline, op['op'])(**deepcopy(op['args']))
+        if not lazy:
+            pipeline.collect()
+        for op in pipeline._plan:
+            op['unit'] = 'replay'
+    except Exception:
+        pipeline._plan = []
+        pipeline._restore()
+        raise
+    finally:
+        pipeline._lazy = lazy
+        pipeline._suspendBackup = False
+
+
+# Operations a lazy Pipeline defers to a plan (see `Pipeline.collect`).
+DEFERRABLE = ('addDefaultValues', 'substituteColumnValues',
+              'addFileFormatCol', 'inferValues')
+
+
+def _reads(op):
+    """ Columns of the view whose values `op` depends on. """
+    args = op['args']
+    if op['op'] == 'substituteColumnValues':
+        return {args['col']}
+    if op['op'] == 'addFileFormatCol':
+        return {args['referenceCol']}
+    if op['op'] == 'inferValues':
+        refs = args['referenceCols']
+        return {args['col']} | set([refs] if isinstance(refs, str) else refs)
+    return set()
+
+
+def _writes(op):
+    """ Columns of the view `op` assigns to. """
+    args = op['args']
+    if op['op'] == 'addDefaultValues':
+        return set(args['colVals'])
+    if op['op'] == 'addFileFormatCol':
+        return {args['newColName']}
+    return {args['col']}
+
+
+def _dropOverwritten(plan):
+    """ Drop assignments which are overwritten before being read. """
+    kept = []
+    overwritten = set()
+    for op in reversed(plan):
+        if op['op'] == 'addDefaultValues':
+            colVals = {k: v for k, v in op['args']['colVals'].items()
+                       if k not in overwritten}
+            if not colVals:
+                continue
+            op = {'op': op['op'], 'args': {'colVals': colVals}}
+        elif _writes(op) <= overwritten:
+            continue
+        overwritten -= _reads(op)
+        if op['op'] in ('addDefaultValues', 'addFileFormatCol'):
+            overwritten |= _writes(op)
+        kept.append(op)
+    return kept[::-1]
+
+
+def _mergeColumnOps(plan):
+    """ Merge substitutions into the previous substitution of, or default
+    value assigned to, the same column, and default values into previous
+    default values, across operations on other columns. """
+    merged = []
+    for op in plan:
+        cols = _reads(op) | _writes(op)
+        previous = None
+        for i in range(len(merged) - 1, -1, -1):
+            if (_reads(merged[i]) | _writes(merged[i])) & cols:
+                previous = merged[i]
+                break
+        if op['op'] == 'addDefaultValues':
+            # the closest earlier addDefaultValues, unless an operation in
+            # between touches these columns
+            for candidate in merged[::-1]:
+                if candidate['op'] == 'addDefaultValues':
+                    candidate['args']['colVals'].update(op['args']['colVals'])
+                    op = None
+                    break
+                if candidate is previous:
+                    break
+        elif op['op'] == 'substituteColumnValues' and previous is not None:
+            col, mod = op['args']['col'], op['args']['mod']
+            if (previous['op'] == 'substituteColumnValues'
+                    and previous['args']['col'] == col):
+                previous['args']['mod'] = _compose(previous['args']['mod'],
+                                                   mod)
+                op = None
+            elif previous['op'] == 'addDefaultValues':
+                value = previous['args']['colVals'][col]
+                try:
+                    previous['args']['colVals'][col] = mod.get(value, value)
+                    op = None
+                except TypeError:  # unhashable default value
+                    pass
+        if op is not None:
+            merged.append(op)
+    return merged
+
+
+def optimize(plan):
+    """ An equivalent, cheaper plan of deferred operations.
+
+    Assignments overwritten before being read are dropped, substitutions
+    of a column are composed into one mapping (or applied to the default
+    value the column was just set to) and default values are merged into
+    a single assignment, as long as no operation in between touches the
+    columns concerned.
+
+    Parameters
+    ----------
+    plan : list of dict
+        Operations of `DEFERRABLE` methods, in the format of operation
+        logs.
+
+    Returns
+    -------
+    list of dict
+    """
+    return _mergeColumnOps(_dropOverwritten(deepcopy(list(plan))))
+
+
+def execute(view, plan):
+    """ Run a plan of deferred operations over `view` in a single pass.
+
+    Every operation computes its column from the columns computed so far,
+    and the view is only rebuilt once, with all new columns at the end.
+
+    Parameters
+    ----------
+    view : pandas.DataFrame
+    plan : list of dict
+
+    Returns
+    -------
+    A new pandas.DataFrame.
+    """
+    import pandas as pd
+    from . import utils
+    columns = {}
+
+    def column(name):
+        value = columns[name] if name in columns else view[name]
+        if not hasattr(value, '__len__') or isinstance(value, str):
+            value = pd.Series(value, index=view.index)  # default value
+        return value
+
+    for op in plan:
+        name, args = op['op'], op['args']
+        if name == 'addDefaultValues':
+            columns.update(args['colVals'])
+        elif name == 'substituteColumnValues':
+            columns[args['col']] = utils.substituteColumnValues(
+                    list(column(args['col'])), args['mod'])
+        elif name == 'addFileFormatCol':
+            columns[args['newColName']] = utils.colFromRegex(
+                    list(column(args['referenceCol'])),
+                    utils.FILE_FORMAT_REGEX)
+        elif name == 'inferValues':
+            refs = args['referenceCols']
+            refs = [refs] if isinstance(refs, str) else list(refs)
+            frame = pd.DataFrame({c: column(c) for c in refs + [args['col']]},
+                                 index=view.index)
+            columns[args['col']] = utils.inferValues(
+                    frame, args['col'], args['referenceCols'])[args['col']]
+        else:
+            raise ValueError("{} can not be deferred.".format(name))
+    if not columns:
+        return view
+    view = view.copy()
+    for name, value in columns.items():
+        view[name] = value.values if isinstance(value, pd.Series) else value
+    return view
+
+
+def describe(op):
+    """ A one-line description of an operation. """
+    return "{}({})".format(op['op'], ", ".join(
+        "{}={!r}".format(k, v) for k, v in sorted(op['args'].items())))
+
+
+def explain(plan):
+    """ Describe a plan of deferred operations and its optimization.
+
+    Returns
+    -------
+    str
+    """
+    optimized = optimize(plan)
+    lines = ["Deferred operations ({}):".format(len(plan))]
+    lines += ["  {}. {}".format(i + 1, describe(op))
+              for i, op in enumerate(plan)]
+    lines.append("Optimized plan ({} operations, executed in a single pass "
+                 "over the view):".format(len(optimized)))
+    lines += ["  {}. {}".format(i + 1, describe(op))
+              for i, op in enumerate(optimized)]
+    return "\n".join(lines)
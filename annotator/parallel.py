@@ -0,0 +1,235 @@
+""" Partitioned execution of CPU-heavy Pipeline transforms.
+
+The columns a transform reads are split into contiguous row ranges, one
+per worker process, and the per-partition results are reassembled in row
+order, so that results do not depend on the number of workers.
+
+Where processes can be forked (Linux), workers inherit the column buffers
+from the parent process and only receive the bounds of their partition:
+the buffers are shared copy-on-write and never pickled. Elsewhere each
+partition is pickled to its worker.
+
+A process is only forked while it runs no other thread: a lock held by
+another thread at the time of the fork (e.g. of a view loading in the
+background, a `BuildHandle` or the connection pool of the client) would
+stay held forever in the workers. While other threads run, workers are
+started by a fork server (or spawned) and partitions are pickled.
+
+Views smaller than `MIN_ROWS` rows are processed serially, as the cost of
+starting processes would outweigh the gain.
+"""
+import os
+import sys
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from . import utils
+
+MIN_ROWS = 100000
+
+_shared = {}  # token -> columns, inherited by forked workers
+_tokens = itertools.count()
+
+
+def partitions(n, parts):
+    """ Split `n` rows into at most `parts` contiguous ranges of nearly
+    equal size.
+
+    Returns
+    -------
+    list of (start, stop) tuples
+    """
+    parts = max(1, min(parts, n))
+    size, extra = divmod(n, parts)
+    bounds = []
+    start = 0
+    for i in range(parts):
+        stop = start + size + (1 if i < extra else 0)
+        bounds.append((start, stop))
+        start = stop
+    return bounds
+
+
+def _forkContext():
+    """ A multiprocessing context which forks, if supported and safe, i.e.
+    no other thread is running. """
+    methods = multiprocessing.get_all_start_methods()
+    if sys.platform != 'darwin' and 'fork' in methods:
+        if threading.active_count() == 1:
+            return multiprocessing.get_context('fork')
+    return None
+
+
+def _startContext():
+    """ A multiprocessing context which starts workers without forking
+    this process, for pools which run alongside other threads. """
+    methods = multiprocessing.get_all_start_methods()
+    if sys.platform != 'darwin' and 'forkserver' in methods:
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def _context():
+    """ The multiprocessing context to start workers with, and whether
+    they are forked. """
+    context = _forkContext()
+    if context is not None:
+        return context, True
+    return _startContext(), False
+
+
+def _workers(workers):
+    return workers or os.cpu_count() or 1
+
+
+def serial(workers, rows):
+    """ Whether `rows` rows should be processed in this process. """
+    return _workers(workers) == 1 or rows < MIN_ROWS
+
+
+def _run(func, token, columns, start, stop, args):
+    """ Run `func` on a partition, in a worker process. """
+    if columns is None:
+        columns = [c[start:stop] for c in _shared[token]]
+    return func(*(list(columns) + list(args)))
+
+
+def mapPartitions(func, columns, args=(), workers=None):
+    """ Apply `func` to row partitions of `columns` in a process pool.
+
+    Parameters
+    ----------
+    func : callable
+        A module-level function taking a partition of each of `columns`
+        followed by `args`.
+    columns : list of array-like
+        Columns of equal length.
+    args : tuple
+        Optional. Further arguments to `func`, pickled to every worker.
+    workers : int
+        Optional. Number of processes. Defaults to the number of
+        processors.
+
+    Returns
+    -------
+    The list of the results of `func` on every partition, in row order.
+    """
+    bounds = partitions(len(columns[0]), _workers(workers))
+    context, forked = _context()
+    token = next(_tokens)
+    if forked:
+        _shared[token] = columns
+    try:
+        with ProcessPoolExecutor(max_workers=len(bounds),
+                                 mp_context=context) as executor:
+            futures = [executor.submit(
+                _run, func, token, None if forked
+                else [c[start:stop] for c in columns], start, stop, args)
+                for start, stop in bounds]
+            return [f.result() for f in futures]
+    finally:
+        _shared.pop(token, None)
+
+
+def _regexPartition(values, regex):
+    return utils.colFromRegex(values, regex)
+
+
+def colFromRegex(values, regex, workers=1):
+    """ `utils.colFromRegex`, partitioned across `workers` processes. """
+    if serial(workers, len(values)):
+        return utils.colFromRegex(values, regex)
+    return list(itertools.chain.from_iterable(
+        mapPartitions(_regexPartition, [values], (regex,), workers)))
+
+
+def _matchPartition(values, regex, keys):
+    newCol = utils.colFromRegex(values, regex)
+    return newCol, [v not in keys for v in newCol]
+
+
+def matchKeys(values, regex, keys, workers=1):
+    """ Apply `regex` to `values` and look up the results in `keys`.
+
+    Parameters
+    ----------
+    values : array-like
+    regex : str
+        A regular expression with at least one capture group.
+    keys : set
+    workers : int
+        Optional. Number of processes. Defaults to 1.
+
+    Returns
+    -------
+    The list of values captured by `regex` and a list of bools, True
+    where the captured value is not in `keys`.
+    """
+    if serial(workers, len(values)):
+        return _matchPartition(values, regex, keys)
+    results = mapPartitions(_matchPartition, [values], (regex, keys), workers)
+    return ([v for newCol, _ in results for v in newCol],
+            [m for _, missing in results for m in missing])
+
+
+def _uniquePartition(*columns):
+    return [pd.unique(np.asarray(c, dtype=object)) for c in columns]
+
+
+def uniqueValues(view, cols, workers=1):
+    """ The distinct values of columns of `view`.
+
+    Returns
+    -------
+    dict of column names to sets of values
+    """
+    cols = list(cols)
+    if not cols:
+        return {}
+    if serial(workers, len(view)):
+        return {c: set(view.loc[:, c].unique()) for c in cols}
+    results = mapPartitions(_uniquePartition,
+                            [view[c].values for c in cols], workers=workers)
+    return {c: set(pd.unique(np.concatenate([r[i] for r in results])))
+            for i, c in enumerate(cols)}
+
+
+def _groupPartition(keys, values):
+    """ The non-null keys of a partition and its distinct pairs of
+    non-null keys and values. """
+    df = pd.DataFrame({'key': keys, 'value': values}).dropna(subset=['key'])
+    return (pd.unique(df.key.values),
+            df.dropna(subset=['value']).drop_duplicates())
+
+
+def inferValues(df, col, referenceCols, workers=1):
+    """ `utils.inferValues`, with the values of every group gathered
+    across `workers` processes.
+
+    Only a single reference column is partitioned. Several are processed
+    serially.
+    """
+    if not isinstance(referenceCols, str) or serial(workers, len(df)):
+        return utils.inferValues(df, col, referenceCols)
+    results = mapPartitions(_groupPartition,
+                            [df[referenceCols].values, df[col].values],
+                            workers=workers)
+    keys = pd.unique(np.concatenate([k for k, _ in results]))
+    pairs = pd.concat([p for _, p in results]).drop_duplicates()
+    counts = pairs.groupby('key').value.count()
+    single = pairs[pairs.key.isin(counts.index[counts == 1])]
+    inferred = pd.Series(single.value.values, index=single.key.values)
+    unable = [k for k in keys if k not in inferred.index]
+    try:
+        unable = sorted(unable)
+    except TypeError:
+        pass
+    for k in unable:
+        print("Unable to infer value when {} = {}".format(referenceCols, k))
+    df = df.copy()
+    mask = df[referenceCols].isin(inferred.index)
+    df.loc[mask, col] = df.loc[mask, referenceCols].map(inferred)
+    return df
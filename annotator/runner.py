@@ -0,0 +1,179 @@
+""" Run annotation pipelines described by YAML or JSON specs, without
+user interaction.
+
+A spec describes the steps to run on one file view; every key but `view`
+(or `create`) is optional:
+
+    name: PEC ChIP-seq                  # defaults to the spec's file name
+    view: syn123                        # or create a new file view:
+    # create: {name: ..., parent: syn1, scope: [syn2], addCols: {...}}
+    meta: syn456                        # or a list of IDs to concatenate
+    schema: annotations.json            # path or URL of a JSON schema
+    sortCols: true
+    backend: sqlite                     # for views too large for memory
+    activeCols: [assay, tissue]
+    defaults: {consortium: PEC}
+    keyCol: {data: name, meta: ChIP_Seq_ID, regex: '^([A-Z]+_PFC_\\d+)_'}
+    links: {individualID: Individual ID, cellType: NeuN}
+    transferLinks: {how: left, dropOn: true}    # or true
+    fileFormat: true                    # or {referenceCol, newColName}
+    substitutions: {cellType: {Pos: NeuN+, Neg: NeuN-}}
+    infer: [{col: tissue, referenceCols: [individualID]}]
+    publish: {validate: true, optimize: false}  # or true / false
+
+Steps run in the order above. Requests for confirmation (unmatched key
+values, validation warnings before publishing) are answered by the
+`confirm` policy instead of prompting.
+"""
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from . import trace
+
+SPEC_KEYS = ('name', 'view', 'create', 'meta', 'schema', 'sortCols',
+             'backend', 'activeCols', 'defaults', 'keyCol', 'links', 'transferLinks',
+             'fileFormat', 'substitutions', 'infer', 'publish')
+
+
+def loadSpec(path):
+    """ Read a spec from a YAML or JSON file.
+
+    Parameters
+    ----------
+    path : str
+        Files ending in .json are read as JSON, others as YAML
+        (which requires PyYAML).
+
+    Returns
+    -------
+    dict
+    """
+    with open(path) as f:
+        if path.lower().endswith('.json'):
+            spec = json.load(f)
+        else:
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("PyYAML is required to read {}. Install "
+                                  "it with `pip install pyyaml` or use a "
+                                  "JSON spec.".format(path))
+            spec = yaml.safe_load(f)
+    if not isinstance(spec, dict):
+        raise ValueError("{} does not describe a mapping.".format(path))
+    spec.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    return spec
+
+
+def validateSpec(spec):
+    """ Raise a ValueError if `spec` is malformed. """
+    unknown = sorted(set(spec).difference(SPEC_KEYS))
+    if unknown:
+        raise ValueError("Unknown spec keys: {}. Valid keys are {}.".format(
+            ", ".join(unknown), ", ".join(SPEC_KEYS)))
+    if ('view' in spec) == ('create' in spec):
+        raise ValueError("A spec needs exactly one of `view` or `create`.")
+    keyCol = spec.get('keyCol')
+    if keyCol is not None and (not isinstance(keyCol, dict) or
+                               set(keyCol) != {'data', 'meta', 'regex'}):
+        raise ValueError("`keyCol` needs `data`, `meta` and `regex`.")
+    if (keyCol or spec.get('links')) and 'meta' not in spec:
+        raise ValueError("`keyCol` and `links` need `meta`.")
+
+
+def _options(value):
+    """ Keyword arguments of a step given as a bool or a dict. """
+    return value if isinstance(value, dict) else {}
+
+
+@trace.traced
+def runSpec(syn, spec, confirm=False, publish=True):
+    """ Run the steps of a spec on a new Pipeline.
+
+    Parameters
+    ----------
+    syn : synapseclient.Synapse
+    spec : dict
+        See the module documentation.
+    confirm : bool
+        Optional. Whether to proceed when confirmation is requested.
+        If False, a key column with unmatched values fails the spec and
+        validation warnings cancel publishing. Defaults to False.
+    publish : bool
+        Optional. Whether to honour the `publish` step of the spec.
+        Defaults to True.
+
+    Returns
+    -------
+    dict with the spec `name`, the `view` ID, whether it was `published`
+    and the validation `warnings`.
+    """
+    from .Pipeline import Pipeline
+    validateSpec(spec)
+    sortCols = spec.get('sortCols', True)
+    p = Pipeline(syn, view=spec.get('view'), meta=spec.get('meta'),
+                 schema=spec.get('schema'), sortCols=sortCols,
+                 confirm=confirm, backend=spec.get('backend', 'pandas'))
+    if 'create' in spec:
+        p.createFileView(**spec['create'])
+    if spec.get('activeCols'):
+        p.addActiveCols(spec['activeCols'], backup=False)
+    if spec.get('defaults'):
+        p.addDefaultValues(spec['defaults'], backup=False)
+    if spec.get('keyCol'):
+        keyCol = spec['keyCol']
+        p.addKeyCol(keyCol['data'], keyCol['meta'], keyCol['regex'])
+    if spec.get('links'):
+        p.addLinks(spec['links'], backup=False)
+    if spec.get('transferLinks'):
+        p.transferLinks(**_options(spec['transferLinks']))
+    if spec.get('fileFormat'):
+        p.addFileFormatCol(**_options(spec['fileFormat']))
+    for col, mod in (spec.get('substitutions') or {}).items():
+        p.substituteColumnValues(col, mod)
+    for inference in spec.get('infer') or []:
+        p.inferValues(inference['col'], inference['referenceCols'])
+    options = _options(spec.get('publish'))
+    validate = options.get('validate', True)
+    warnings = p._validate() if validate else []
+    published = False
+    if publish and spec.get('publish') and (not warnings or confirm):
+        p.publish(validate=False, optimize=options.get('optimize', False))
+        published = True
+    return {'name': spec['name'], 'view': p._entityViewSchema.id,
+            'published': published, 'warnings': warnings}
+
+
+def runSpecs(syn, specs, jobs=1, confirm=False, publish=True):
+    """ Run many specs, `jobs` at a time.
+
+    A failing spec does not stop the others.
+
+    Parameters
+    ----------
+    syn : synapseclient.Synapse
+    specs : list
+        Specs (dicts) or paths of spec files.
+    jobs : int
+        Optional. Number of specs to run concurrently. Defaults to 1.
+    confirm, publish : bool
+        Optional. See `runSpec`.
+
+    Returns
+    -------
+    A list of results (see `runSpec`) in the order of `specs`, with an
+    `error` instead for the specs which failed.
+    """
+    def run(spec):
+        try:
+            if not isinstance(spec, dict):
+                spec = loadSpec(spec)
+            return runSpec(syn, spec, confirm=confirm, publish=publish)
+        except Exception as ex:
+            name = spec.get('name') if isinstance(spec, dict) else spec
+            return {'name': name, 'error': "{}: {}".format(
+                type(ex).__name__, ex)}
+    if jobs == 1 or len(specs) <= 1:
+        return [run(s) for s in specs]
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(trace.bind(run), specs))
@@ -1,12 +1,18 @@
-from __future__ import unicode_literals
+import io
 import os
 import requests
 import json
 import pandas as pd
+from concurrent.futures import (ThreadPoolExecutor, ProcessPoolExecutor,
+                                as_completed)
 from . import utils
+from . import trace
+from . import backends
+from . import parallel
 
 
 
+@trace.traced
 def getAnnotationsRelease():
     """
 
@@ -20,6 +26,7 @@ def getAnnotationsRelease():
     return releaseVersion
 
 
+@trace.traced
 def moduleJsonPath(releaseVersion=None):
     """ get and load the list of json files from data folder (given the api endpoint url - ref master - latest vesion)
      then construct a dictionary of module names and its associated raw data github url endpoints.
@@ -48,6 +55,7 @@ def moduleJsonPath(releaseVersion=None):
     return names
 
 
+@trace.traced
 def flattenJson(path, module=None):
     """Normalize semi-structured JSON schema data into a flat table.
 
@@ -80,7 +88,7 @@ def flattenJson(path, module=None):
     json_record.reset_index(inplace=True)
 
     for i, jsn in enumerate(json_record['enumValues']):
-        normalized_values_df = pd.io.json.json_normalize(jsn)
+        normalized_values_df = pd.json_normalize(jsn)
 
         # re-name 'description' defined in dictionary to valueDescription
         # to match table on synapse schema
@@ -104,32 +112,99 @@ def flattenJson(path, module=None):
     return module_df
 
 
-def validateView(view, schema, syn=None):
+def _readJson(path):
+    """ Fetch the text of a JSON document from a url or filepath. """
+    if '://' not in path:
+        with io.open(path, encoding='utf-8') as f:
+            return f.read()
+    response = requests.get(path)
+    response.raise_for_status()
+    return response.text
+
+
+def _flattenText(module, text):
+    """ `flattenJson` on the text of a JSON document. """
+    return flattenJson(io.StringIO(text), module)
+
+
+@trace.traced
+def flattenModules(names, jobs=None):
+    """ Download and flatten many annotation modules in parallel.
+
+    Module JSON is fetched over a bounded thread pool and each document
+    is flattened in a process pool as soon as its download completes.
+    The download threads are running when the flattening processes start,
+    so these are never forked (see `annotator.parallel`). Calls traced in
+    the flattening processes, e.g. `flattenJson`, are not recorded by the
+    trace or the ledger of this process.
+
+    Parameters
+    ----------
+    names : dict
+        Module names and the URL (or filepath) of their JSON
+        (see moduleJsonPath).
+    jobs : int
+        Optional. Maximum number of concurrent downloads and of flattening
+        processes. Defaults to the number of processors. If 1, modules are
+        processed serially in this process.
+
+    Returns
+    -------
+    pd.DataFrame of all flattened modules, concatenated in the order of
+    their module names.
+    """
+    modules = sorted(names)
+    if jobs == 1:
+        return pd.concat([_flattenText(m, _readJson(names[m])) for m in modules])
+    jobs = jobs or os.cpu_count()
+    with ThreadPoolExecutor(max_workers=jobs) as downloads, \
+            ProcessPoolExecutor(max_workers=jobs,
+                                mp_context=parallel._startContext()) as flattens:
+        texts = {downloads.submit(trace.bind(_readJson), names[m]): m
+                 for m in modules}
+        frames = {}
+        for text in as_completed(texts):
+            m = texts[text]
+            frames[m] = flattens.submit(_flattenText, m, text.result())
+        return pd.concat([frames[m].result() for m in modules])
+
+
+@trace.traced
+def validateView(view, schema, syn=None, workers=1):
     """ Check that a view conforms with a schema.
 
     Parameters
     ----------
-    view : pandas DataFrame, str
-        A DataFrame or Synapse ID -- anything that can be read by
-        utils.synread.
+    view : pandas DataFrame, backends.SqliteView, str
+        A DataFrame, SqliteView or Synapse ID -- anything that can be read
+        by utils.synread.
     schema : pandas DataFrame, str
         A DataFrame in flattened schema format (see flattenJson) or
         path to .json file.
     syn : synapseclient.Synapse
         Optional. A Synapse object for retreiving `view` from Synapse.
         Defaults to None.
+    workers : int
+        Optional. Number of processes to gather the values of large views
+        with (see `annotator.parallel`). Defaults to 1.
 
     Returns
     -------
     dict of malformed values.
     """
-    view = utils.synread(syn, view)
+    if not isinstance(view, backends.SqliteView):
+        view = utils.synread(syn, view)
     schema = flattenJson(schema) if isinstance(schema, str) else schema
     to_examine = schema.index.intersection(view.columns)
+    if not isinstance(view, backends.SqliteView):
+        values = parallel.uniqueValues(view, to_examine.unique(), workers)
     malformed = {}
     for k in to_examine:
         allowed_vals = set(schema.loc[k].value)
-        actual_vals = set(view.loc[:,k].unique())
+        if isinstance(view, backends.SqliteView):
+            actual_vals = set(view.unique(k))
+        else:
+            actual_vals = values[k]
         malformed_vals = actual_vals.difference(allowed_vals)
         if malformed_vals:
             malformed[k] = malformed_vals
@@ -0,0 +1,205 @@
+""" Saved Pipeline sessions.
+
+`Pipeline.save` writes the state of a session to a directory, from which
+`Pipeline.load` restores it without reading anything from Synapse:
+
+    >>> p.save("my_session")
+    >>> p = Pipeline.load("my_session", syn)
+
+The view, metadata and schema are written as Feather files if pyarrow is
+installed (`pip install annotator[session]`), and read back memory-mapped,
+so that reopening a session costs little more than mapping its files. Without pyarrow, or for frames Feather
+cannot store (e.g. with non-string column names), they are pickled. The
+view of the 'sqlite' backend is copied to a SQLite database. Everything
+else (active columns, links, key column, settings, the operation log, the
+deferred plan, queued schema changes and the entity view) is kept in
+`state.json`, where dates in entity annotations are stored as ISO 8601
+strings.
+
+Backups are not saved: a loaded session cannot be undone past its save.
+Pickled frames can execute code when read, so only load sessions you
+trust.
+"""
+import os
+import json
+import datetime
+import pandas as pd
+import synapseclient as sc
+from . import backends
+from . import ops
+
+VERSION = 1
+STATE = 'state.json'
+FRAMES = ('view', '_meta', 'schema')
+_INDEX = '__index__'  # column of the row labels in Feather files
+
+
+def _writeFrame(df, path):
+    """ Write `df` to `path` plus the extension of its format.
+
+    Returns
+    -------
+    The name of the file written.
+    """
+    try:
+        import pyarrow  # noqa: F401
+        frame = df.reset_index(drop=True)
+        frame.insert(0, _INDEX, df.index)
+        frame.to_feather(path + '.feather')
+        return os.path.basename(path) + '.feather'
+    except (ImportError, ValueError, TypeError, NotImplementedError):
+        if os.path.exists(path + '.feather'):
+            os.remove(path + '.feather')
+        df.to_pickle(path + '.pkl')
+        return os.path.basename(path) + '.pkl'
+
+
+def _readFrame(path):
+    if path.endswith('.feather'):
+        from pyarrow import feather
+        table = feather.read_table(path, memory_map=True)
+        i = table.schema.get_field_index(_INDEX)
+        # set the index without `set_index`, which copies the frame
+        df = table.remove_column(i).to_pandas()
+        df.index = pd.Index(table.column(i).to_pandas())
+        df.index.name = None
+        return df
+    return pd.read_pickle(path)
+
+
+def _jsonDefault(obj):
+    """ Serialize the values of `state.json` JSON has no type for. """
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    raise TypeError("{!r} can not be saved in a session.".format(obj))
+
+
+def _entity(entity):
+    if entity is None:
+        return None
+    return {'properties': dict(entity.properties),
+            'annotations': dict(entity.annotations),
+            'localState': entity.local_state()}
+
+
+def save(pipeline, path):
+    """ Write the state of `pipeline` to the directory `path`.
+
+    A background publish is waited for first. Files of a session
+    previously saved to `path` are overwritten.
+    """
+    if pipeline._publishing is not None:
+        pipeline._publishing.result()
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    state = {'version': VERSION, 'frames': {}}
+    for name in FRAMES:
+        df = getattr(pipeline, name)
+        if df is None:
+            state['frames'][name] = None
+        elif isinstance(df, backends.SqliteView):
+            df.save(os.path.join(path, name + '.sqlite'))
+            state['frames'][name] = name + '.sqlite'
+        else:
+            state['frames'][name] = _writeFrame(df, os.path.join(path, name))
+    index = pipeline._index
+    state['index'] = (None if index is None
+                      or index.equals(pipeline.view.index)
+                      else list(index))
+    entity = pipeline._entityViewSchema
+    state['entityViewSchema'] = _entity(entity)
+    state.update({
+        'backend': pipeline._backend,
+        'activeCols': list(pipeline._activeCols),
+        'metaActiveCols': list(pipeline._metaActiveCols),
+        'links': ops._encode(pipeline.links),
+        'keyCol': pipeline.keyCol,
+        'sortCols': pipeline._sortCols,
+        'confirm': pipeline.confirm,
+        'lazy': pipeline._lazy,
+        'workers': pipeline.workers,
+        'ops': ops._encode(pipeline._ops),
+        'plan': ops._encode(pipeline._plan),
+        'schemaChanges': ops._encode(pipeline._schemaChanges)})
+    with open(os.path.join(path, STATE), 'w') as f:
+        json.dump(state, f, indent=2, default=_jsonDefault)
+
+
+def load(path, syn, check=False):
+    """ Restore a Pipeline saved by `save`.
+
+    Parameters
+    ----------
+    path : str
+        Directory the session was saved to.
+    syn : synapseclient.Synapse
+    check : bool
+        Optional. Whether to compare the etag of the entity view with its
+        etag when the session was saved, which changes along with its
+        schema or scope. Requires a connection to Synapse. Defaults to
+        False.
+
+    Returns
+    -------
+    Pipeline
+
+    Raises
+    ------
+    ValueError
+        If `check` is True and the entity view changed since the session
+        was saved.
+    """
+    from .Pipeline import Pipeline
+    with open(os.path.join(path, STATE)) as f:
+        state = json.load(f)
+    if state.get('version') != VERSION:
+        raise ValueError("Unsupported session version: {}".format(
+            state.get('version')))
+    p = Pipeline(syn, sortCols=state['sortCols'], confirm=state['confirm'],
+                 lazy=state['lazy'], backend=state['backend'],
+                 workers=state['workers'])
+    entity = state['entityViewSchema']
+    if entity is not None:
+        localState = entity['localState']
+        if 'ignoredAnnotationColumnNames' in localState:
+            localState['ignoredAnnotationColumnNames'] = set(
+                    localState['ignoredAnnotationColumnNames'])
+        entity = sc.Entity.create(entity['properties'],
+                                  entity['annotations'], localState)
+        if check:
+            p.syn.metadata.invalidate(entity.id)
+            etag = p.syn.get(entity.id, downloadFile=False).etag
+            if etag != entity.etag:
+                raise ValueError(
+                    "{} has changed since the session was saved. Load the "
+                    "session with `check=False` to use it anyways.".format(
+                        entity.id))
+    database = None
+    for name in FRAMES:
+        filename = state['frames'][name]
+        if filename is None:
+            df = None
+        elif filename.endswith('.sqlite'):
+            df = backends.SqliteView.load(os.path.join(path, filename),
+                                          database)
+            database = df.database
+        else:
+            df = _readFrame(os.path.join(path, filename))
+        setattr(p, name, df)
+    if isinstance(p.view, backends.SqliteView):
+        p._index = None
+    elif state['index'] is not None:
+        p._index = pd.Index(state['index'])
+    else:
+        p._index = None if p.view is None else p.view.index
+    p._entityViewSchema = entity
+    p._activeCols = state['activeCols']
+    p._metaActiveCols = state['metaActiveCols']
+    p.links = ops._decode(state['links'])
+    p.keyCol = state['keyCol']
+    p._ops = ops._decode(state['ops'])
+    p._plan = ops._decode(state['plan'])
+    p._schemaChanges = ops._decode(state['schemaChanges'])
+    return p
@@ -0,0 +1,400 @@
+import re
+import json
+import time
+import uuid
+import threading
+import itertools
+import collections
+from copy import deepcopy
+import pandas as pd
+import synapseclient as sc
+
+FILE_VIEW_COLUMNS = [
+        ('id', 'ENTITYID'), ('name', 'STRING'), ('createdOn', 'DATE'),
+        ('createdBy', 'USERID'), ('etag', 'STRING'), ('type', 'STRING'),
+        ('currentVersion', 'INTEGER'), ('parentId', 'ENTITYID'),
+        ('benefactorId', 'ENTITYID'), ('projectId', 'ENTITYID'),
+        ('modifiedOn', 'DATE'), ('modifiedBy', 'USERID'),
+        ('dataFileHandleId', 'FILEHANDLEID')]
+
+_QUERY = re.compile(
+        r"^\s*select\s+(?P<select>.+?)\s+from\s+(?P<table>syn\d+)"
+        r"(?:\s+where\s+(?P<where>.+?))?"
+        r"(?:\s+order\s+by\s+\"?(?P<order>\w+)\"?(?:\s+asc)?)?"
+        r"(?:\s+limit\s+(?P<limit>\d+))?(?:\s+offset\s+(?P<offset>\d+))?\s*$",
+        re.IGNORECASE | re.DOTALL)
+_IN = re.compile(r"^\s*\"?(\w+)\"?\s+in\s*\((.*)\)\s*$",
+                 re.IGNORECASE | re.DOTALL)
+_EQUALS = re.compile(r"^\s*\"?(\w+)\"?\s*=\s*(.+?)\s*$", re.DOTALL)
+_GREATER = re.compile(r"^\s*\"?(\w+)\"?\s*>\s*(\d+)\s*$")
+_ROW_LABEL = re.compile(r"^(\d+)_(\d+)")
+
+
+def _unquote(v):
+    v = v.strip()
+    if len(v) > 1 and v[0] == v[-1] and v[0] in "'\"":
+        return v[1:-1]
+    return v
+
+
+def _copy(entity):
+    """ A deep copy of a synapseclient.Entity. """
+    return sc.Entity.create(deepcopy(dict(entity.properties)),
+                            deepcopy(dict(entity.annotations)),
+                            deepcopy(entity.local_state()))
+
+
+def _cell(v):
+    """ A table cell as stored in a fake table. """
+    if isinstance(v, list):
+        v = v[0] if len(v) == 1 else v
+    if isinstance(v, float) and pd.isnull(v):
+        return None
+    return v
+
+
+class FakeRowSet(object):
+    """ The row references returned by `FakeQueryResult.asRowSet`. """
+
+    def __init__(self, tableId, rows):
+        self.tableId = tableId
+        self.rows = rows
+
+
+class FakeQueryResult(object):
+    """ The result of `FakeSynapse.tableQuery`. """
+
+    def __init__(self, tableId, df):
+        self.tableId = tableId
+        self._df = df
+
+    def asDataFrame(self):
+        df = self._df.copy()
+        if 'ROW_ID' in df:
+            df.index = ["{}_{}".format(i, v) for i, v in
+                        zip(df.pop('ROW_ID'), df.pop('ROW_VERSION'))]
+        return df
+
+    def asRowSet(self):
+        rows = list(zip(self._df['ROW_ID'], self._df['ROW_VERSION'])) \
+            if 'ROW_ID' in self._df else []
+        return FakeRowSet(self.tableId, rows)
+
+    def __len__(self):
+        return len(self._df)
+
+
+class FakeSynapse(object):
+    """ An in-memory stand-in for the subset of synapseclient.Synapse
+    used by annotator.
+
+    Entities (Projects, Folders, Files, Schemas and EntityViewSchemas),
+    column models, table rows and file annotations live in memory.
+    File views are computed from the annotations of the files in their
+    scope, and storing rows to a file view updates those annotations and
+    bumps each row's version, as Synapse does. Tables and views are always
+    built (see `_tableState`). Every call sleeps for `latency` seconds and
+    is counted in `calls`.
+    """
+
+    def __init__(self, latency=0.0):
+        """ Create a new FakeSynapse object.
+
+        Parameters
+        ----------
+        latency : float or callable
+            Optional. Seconds to sleep on every call, or a function of the
+            call name returning them. Defaults to 0.
+        """
+        self.latency = latency
+        # column models are cached per endpoint, keep fakes apart
+        self.repoEndpoint = 'https://{}.fake.synapse.org/repo/v1'.format(
+                uuid.uuid4())
+        self.calls = collections.Counter()
+        self._entities = {}
+        self._columns = {}
+        self._rows = {}  # table ID -> list of row dicts
+        self._rowVersions = {}  # file ID -> file view row version
+        self._ids = itertools.count(1000)
+        self._rowIds = itertools.count(1)
+        self._lock = threading.RLock()
+
+    def _call(self, name):
+        self.calls[name] += 1
+        latency = self.latency(name) if callable(self.latency) \
+            else self.latency
+        if latency:
+            time.sleep(latency)
+
+    def _newId(self):
+        return "syn{}".format(next(self._ids))
+
+    def _entity(self, synId):
+        synId = sc.core.utils.id_of(synId)
+        if synId not in self._entities:
+            raise ValueError("{} does not exist".format(synId))
+        return self._entities[synId]
+
+    def _projectId(self, entity):
+        while entity.get('parentId') in self._entities:
+            entity = self._entities[entity['parentId']]
+        return entity['id']
+
+    def _files(self, scope):
+        """ Files in `scope`: children of Folders, descendants of Projects. """
+        scope = set(sc.core.utils.id_of(s) for s in scope)
+        projects = {s for s in scope if isinstance(
+            self._entities.get(s), sc.Project)}
+        return [e for e in self._entities.values()
+                if isinstance(e, sc.File) and (
+                    e['parentId'] in scope or self._projectId(e) in projects)]
+
+    def _annotations(self, entity):
+        return {k: _cell(v) for k, v in dict(entity.annotations).items()}
+
+    # Entities
+
+    def get(self, obj, downloadFile=True, **kwargs):
+        self._call('get')
+        with self._lock:
+            return _copy(self._entity(obj))
+
+    def store(self, obj, **kwargs):
+        self._call('store')
+        with self._lock:
+            if isinstance(obj, sc.table.TableAbstractBaseClass):
+                return self._storeRows(obj)
+            addDefaultViewColumns = obj.__dict__.get('addDefaultViewColumns')
+            obj = _copy(obj)
+            if obj.get('id') is None:
+                obj['id'] = self._newId()
+                obj['createdOn'] = pd.Timestamp.now().isoformat()
+                obj['versionNumber'] = 1
+            obj['etag'] = str(uuid.uuid4())
+            if isinstance(obj, sc.File):
+                self._rowVersions[obj['id']] = \
+                    self._rowVersions.get(obj['id'], 0) + 1
+            if isinstance(obj, sc.table.SchemaBase):
+                self._storeSchema(obj, addDefaultViewColumns)
+            self._entities[obj['id']] = obj
+            return _copy(obj)
+
+    def _storeSchema(self, schema, addDefaultViewColumns):
+        columns = schema.__dict__.get('columns_to_store') or []
+        columns = [c for c in columns]
+        if isinstance(schema, sc.EntityViewSchema):
+            names = {self._columns[i]['name'] for i in schema.columnIds}
+            names.update(c['name'] for c in columns)
+            if addDefaultViewColumns:
+                columns += [c for c in self._defaultColumns(schema.scopeIds)
+                            if c['name'] not in names]
+            schema.__dict__['addDefaultViewColumns'] = False
+            schema.__dict__['addAnnotationColumns'] = False
+        if columns:
+            schema['columnIds'] = list(schema.get('columnIds') or []) + [
+                    c['id'] for c in self.createColumns(columns)]
+        schema.__dict__['columns_to_store'] = []
+
+    def delete(self, obj, **kwargs):
+        self._call('delete')
+        with self._lock:
+            if isinstance(obj, FakeQueryResult):
+                obj = obj.asRowSet()
+            if isinstance(obj, sc.table.TableAbstractBaseClass):
+                obj = FakeRowSet(obj.tableId, [
+                    tuple(int(i) for i in _ROW_LABEL.match(str(l)).groups())
+                    for l in obj.asDataFrame().index])
+            if isinstance(obj, FakeRowSet):
+                rowIds = {int(r[0]) for r in obj.rows}
+                self._rows[obj.tableId] = [
+                    r for r in self._rows.get(obj.tableId, [])
+                    if r['ROW_ID'] not in rowIds]
+                return
+            entity = self._entity(obj)
+            for child in [e['id'] for e in self._entities.values()
+                          if e.get('parentId') == entity['id']]:
+                self.delete(child)
+            del self._entities[entity['id']]
+
+    def getChildren(self, parent, includeTypes=None, **kwargs):
+        self._call('getChildren')
+        with self._lock:
+            parent = sc.core.utils.id_of(parent)
+            children = [{'id': e['id'], 'name': e['name'],
+                         'type': e['concreteType']}
+                        for e in self._entities.values()
+                        if e.get('parentId') == parent]
+        for c in sorted(children, key=lambda c: c['name']):
+            yield c
+
+    def onweb(self, entity, **kwargs):
+        self._call('onweb')
+
+    # Columns
+
+    def createColumns(self, columns):
+        self._call('createColumns')
+        with self._lock:
+            created = []
+            for c in columns:
+                c = sc.Column(**{k: v for k, v in dict(c).items()
+                                 if k != 'id'})
+                c['id'] = str(next(self._ids))
+                self._columns[c['id']] = c
+                created.append(sc.Column(**c))
+            return created
+
+    def getTableColumns(self, table, **kwargs):
+        self._call('getTableColumns')
+        with self._lock:
+            schema = self._entity(table)
+            columns = [sc.Column(**self._columns[i]) for i in schema.columnIds]
+        for c in columns:
+            yield c
+
+    def _defaultColumns(self, scope):
+        columns = [{'name': n, 'columnType': t} for n, t in FILE_VIEW_COLUMNS]
+        lengths = {}
+        for f in self._files(scope):
+            for k, v in self._annotations(f).items():
+                lengths[k] = max(lengths.get(k, 1), len(str(v)))
+        columns += [{'name': k, 'columnType': 'STRING', 'maximumSize': l}
+                    for k, l in sorted(lengths.items())]
+        return columns
+
+    def restGET(self, uri, **kwargs):
+        self._call('restGET')
+        with self._lock:
+            m = re.match(r"^/entity/(syn\d+)$", uri)
+            if m:
+                return dict(self._entity(m.group(1)).properties)
+            m = re.match(r"^/entity/(syn\d+)/table/status$", uri)
+            if m:
+                return {'tableId': m.group(1),
+                        'state': self._tableState(m.group(1))}
+        raise ValueError("FakeSynapse does not support GET {}".format(uri))
+
+    def restPOST(self, uri, body=None, **kwargs):
+        self._call('restPOST')
+        body = json.loads(body) if body else {}
+        with self._lock:
+            if uri == '/column/view/scope':
+                columns = self._defaultColumns(body['scope'])
+                return {'results': [dict(c) for c in
+                                    self.createColumns(columns)]}
+            if uri == '/column/batch':
+                return {'list': [dict(c) for c in
+                                 self.createColumns(body['list'])]}
+        raise ValueError("FakeSynapse does not support POST {}".format(uri))
+
+    # Tables
+
+    def _tableState(self, synId):
+        """ The state of the index of a table or view, which tests may
+        replace to simulate one being built. """
+        return 'AVAILABLE'
+
+    def _viewRows(self, view):
+        rows = []
+        for f in self._files(view.scopeIds):
+            row = {'id': f['id'], 'name': f['name'],
+                   'createdOn': f.get('createdOn'), 'etag': f['etag'],
+                   'type': 'file', 'currentVersion': f.get('versionNumber'),
+                   'parentId': f['parentId'],
+                   'benefactorId': self._projectId(f),
+                   'projectId': self._projectId(f)}
+            row.update(self._annotations(f))
+            row['ROW_ID'] = int(f['id'][3:])
+            row['ROW_VERSION'] = self._rowVersions.get(f['id'], 1)
+            rows.append(row)
+        return sorted(rows, key=lambda r: r['ROW_ID'])
+
+    def tableQuery(self, query, **kwargs):
+        self._call('tableQuery')
+        m = _QUERY.match(query)
+        if not m:
+            raise ValueError("FakeSynapse does not support the query: "
+                             "{}".format(query))
+        with self._lock:
+            schema = self._entity(m.group('table'))
+            names = [self._columns[i]['name'] for i in schema.columnIds]
+            rows = self._viewRows(schema) \
+                if isinstance(schema, sc.EntityViewSchema) \
+                else deepcopy(self._rows.get(schema['id'], []))
+        for condition in re.split(r"\s+and\s+", m.group('where') or '',
+                                  flags=re.IGNORECASE):
+            if not condition.strip():
+                continue
+            inCondition = _IN.match(condition)
+            greater = _GREATER.match(condition)
+            if greater:
+                col, bound = greater.group(1), int(greater.group(2))
+                rows = [r for r in rows if r.get(col) is not None
+                        and int(r[col]) > bound]
+                continue
+            if inCondition:
+                col, values = inCondition.groups()
+                values = {_unquote(v) for v in values.split(',')}
+            elif _EQUALS.match(condition):
+                col, value = _EQUALS.match(condition).groups()
+                values = {_unquote(value)}
+            else:
+                raise ValueError("FakeSynapse does not support the "
+                                 "condition: {}".format(condition.strip()))
+            rows = [r for r in rows if str(r.get(col)) in values]
+        if m.group('order'):
+            rows.sort(key=lambda r: r.get(m.group('order')))
+        offset = int(m.group('offset') or 0)
+        if m.group('limit'):
+            rows = rows[offset:offset + int(m.group('limit'))]
+        else:
+            rows = rows[offset:]
+        select = [_unquote(s) for s in m.group('select').split(',')]
+        if [s.lower() for s in select] == ['count(*)']:
+            return FakeQueryResult(schema['id'], pd.DataFrame(
+                {select[0]: [len(rows)]}))
+        columns = names if select == ['*'] else select
+        df = pd.DataFrame([[r.get(c) for c in columns + ['ROW_ID',
+                                                          'ROW_VERSION']]
+                           for r in rows],
+                          columns=columns + ['ROW_ID', 'ROW_VERSION'])
+        return FakeQueryResult(schema['id'], df)
+
+    def _storeRows(self, table):
+        tableId = table.tableId
+        df = table.asDataFrame()
+        schema = self._entity(tableId)
+        names = [self._columns[i]['name'] for i in schema.columnIds]
+        records = []
+        for label, values in zip(df.index, df.to_dict('records')):
+            m = _ROW_LABEL.match(str(label))
+            values = {k: _cell(v) for k, v in values.items() if k in names}
+            records.append((int(m.group(1)) if m else None, values))
+        if isinstance(schema, sc.EntityViewSchema):
+            defaults = {n for n, _ in FILE_VIEW_COLUMNS}
+            for rowId, values in records:
+                f = self._entity("syn{}".format(rowId))
+                for k, v in values.items():
+                    if k in defaults:
+                        continue
+                    if v is None:
+                        f.annotations.pop(k, None)
+                    else:
+                        f.annotations[k] = v
+                f['etag'] = str(uuid.uuid4())
+                self._rowVersions[f['id']] = \
+                    self._rowVersions.get(f['id'], 1) + 1
+        else:
+            rows = self._rows.setdefault(tableId, [])
+            byId = {r['ROW_ID']: r for r in rows}
+            for rowId, values in records:
+                if rowId in byId:
+                    byId[rowId].update(values)
+                    byId[rowId]['ROW_VERSION'] += 1
+                else:
+                    row = {n: None for n in names}
+                    row.update(values)
+                    row['ROW_ID'] = next(self._rowIds)
+                    row['ROW_VERSION'] = 1
+                    rows.append(row)
+        return table
@@ -0,0 +1,304 @@
+""" Opt-in tracing of annotator operations.
+
+Tracing is off by default, in which case traced functions cost a single
+flag check per call. Turn it on with `enable()` or by setting the
+ANNOTATOR_TRACE environment variable (to "memory" to also measure peak
+memory, which slows operations down considerably).
+
+    >>> from annotator import trace
+    >>> trace.enable()
+    >>> p.transferLinks()
+    >>> p.stats()
+    >>> trace.export("session.json")  # open in chrome://tracing or Perfetto
+"""
+import os
+import json
+import time
+import threading
+import functools
+import collections
+
+MAX_EVENTS = 100000
+
+_enabled = False
+_memory = False
+_events = collections.deque(maxlen=MAX_EVENTS)
+_local = threading.local()
+_epoch = time.perf_counter()
+_cpuTime = getattr(time, 'thread_time', time.process_time)
+
+
+def enable(memory=False):
+    """ Start recording traced operations.
+
+    Parameters
+    ----------
+    memory : bool
+        Optional. Whether to also record the peak memory allocated by
+        each operation, using tracemalloc. Defaults to False.
+    """
+    global _enabled, _memory
+    _enabled = True
+    _memory = memory
+    if memory:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+def disable():
+    """ Stop recording traced operations. Recorded events are kept. """
+    global _enabled, _memory
+    _enabled = False
+    if _memory:
+        import tracemalloc
+        tracemalloc.stop()
+    _memory = False
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    """ Forget all recorded events. """
+    _events.clear()
+
+
+def events(owner=None):
+    """ Recorded events, oldest first.
+
+    Parameters
+    ----------
+    owner : object
+        Optional. Only return events of operations called on `owner`
+        and of the operations they called. Defaults to all events.
+
+    Returns
+    -------
+    list of dict
+    """
+    return [e for e in list(_events)
+            if owner is None or e['owner'] == id(owner)]
+
+
+def current():
+    """ Name of the innermost operation running on this thread, if any. """
+    stack = getattr(_local, 'stack', None)
+    return stack[-1]['name'] if stack else None
+
+
+def operations():
+    """ Names of the operations running on this thread, outermost first. """
+    return [f['name'] for f in getattr(_local, 'stack', None) or []]
+
+
+def bind(func):
+    """ Make `func` run within the operations running on this thread.
+
+    Use to attribute work handed to other threads (e.g. a thread pool)
+    to the operation which started it.
+
+    Parameters
+    ----------
+    func : callable
+
+    Returns
+    -------
+    A callable with the same signature as `func`.
+    """
+    stack = getattr(_local, 'stack', None)
+    if not stack:
+        return func
+    stack = [dict(f) for f in stack]
+
+    @functools.wraps(func)
+    def bound(*args, **kwargs):
+        previous = getattr(_local, 'stack', None)
+        _local.stack = [dict(f) for f in stack]
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.stack = previous
+    return bound
+
+
+def _shape(obj):
+    # only `shape` defined by the class, never resolved by `__getattr__`
+    # (e.g. of a lazy Client, which would log in)
+    if not any('shape' in vars(k) for k in type(obj).__mro__):
+        return None
+    shape = obj.shape
+    if isinstance(shape, tuple) and len(shape) == 2:
+        return shape
+    return None
+
+
+def _touched(args, result):
+    """ Largest number of rows and columns of the DataFrames involved. """
+    shapes = [_shape(a) for a in args] + [_shape(result)]
+    if args:
+        # the stored view, without waiting for one loading in the background
+        shapes.append(_shape(getattr(args[0], '__dict__', {}).get('view')))
+    shapes = [s for s in shapes if s is not None]
+    if not shapes:
+        return None, None
+    return max(s[0] for s in shapes), max(s[1] for s in shapes)
+
+
+def _call(name, func, args, kwargs, owner):
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    parent = stack[-1] if stack else None
+    frame = {'name': name, 'children': 0.0, 'peak': 0,
+             'owner': owner if owner is not None else
+             parent['owner'] if parent else None}
+    if _memory:
+        import tracemalloc
+        allocated, peak = tracemalloc.get_traced_memory()
+        if parent:
+            parent['peak'] = max(parent['peak'], peak)
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        frame['allocated'] = frame['peak'] = allocated
+    stack.append(frame)
+    error = None
+    result = None
+    start, cpu = time.perf_counter(), _cpuTime()
+    try:
+        result = func(*args, **kwargs)
+        return result
+    except Exception as ex:
+        error = type(ex).__name__
+        raise
+    finally:
+        wall = time.perf_counter() - start
+        cpu = _cpuTime() - cpu
+        stack.pop()
+        event = {'name': name, 'start': start - _epoch, 'wall': wall,
+                 'cpu': cpu, 'self': wall - frame['children'],
+                 'memory': None, 'depth': len(stack),
+                 'thread': threading.current_thread().ident,
+                 'owner': frame['owner'], 'error': error}
+        if _memory:
+            import tracemalloc
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            event['memory'] = peak - frame['allocated']
+            if parent:
+                parent['peak'] = max(parent['peak'], peak)
+        if parent:
+            parent['children'] += wall
+        event['rows'], event['cols'] = _touched(args, result)
+        _events.append(event)
+
+
+def traced(func=None, name=None, method=False):
+    """ Decorate `func` to be recorded while tracing is enabled.
+
+    Parameters
+    ----------
+    func : callable
+    name : str
+        Optional. Name to record the operation under. Defaults to the
+        qualified name of `func`, prefixed with its module's name unless
+        `func` is a method.
+    method : bool
+        Optional. Whether `func` is a method, in which case calls are
+        attributed to the object it is called on (see `events`).
+        Defaults to False.
+    """
+    if func is None:
+        return functools.partial(traced, name=name, method=method)
+    if name is None:
+        name = getattr(func, '__qualname__', func.__name__)
+        if not method:
+            name = "{}.{}".format(func.__module__.split('.')[-1], name)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        owner = id(args[0]) if method and args else None
+        return _call(name, func, args, kwargs, owner)
+    wrapper.__traced__ = True
+    return wrapper
+
+
+def untraced(func):
+    """ Exclude the method `func` from `tracedMethods`. """
+    func.__traced__ = False
+    return func
+
+
+def tracedMethods(cls):
+    """ Class decorator tracing every public method of `cls`. """
+    for attr, value in list(vars(cls).items()):
+        if (not attr.startswith('_') and callable(value)
+                and not hasattr(value, '__traced__')
+                and not isinstance(value, (staticmethod, classmethod, type))):
+            setattr(cls, attr, traced(value, method=True))
+    return cls
+
+
+def stats(owner=None):
+    """ Aggregate recorded events by operation.
+
+    Parameters
+    ----------
+    owner : object
+        Optional. See `events`.
+
+    Returns
+    -------
+    pandas.DataFrame indexed by operation name, with the number of calls,
+    total and maximum wall time, self time (excluding traced operations
+    called from within), CPU time, maximum peak memory (if recorded) and
+    the largest number of rows and columns touched, sorted by total wall
+    time.
+    """
+    import pandas as pd
+    columns = ['calls', 'wall', 'max_wall', 'self', 'cpu', 'memory',
+               'rows', 'cols']
+    recorded = events(owner)
+    if not recorded:
+        return pd.DataFrame(columns=columns)
+    df = pd.DataFrame(recorded)
+    grouped = df.groupby('name')
+    result = pd.DataFrame({
+        'calls': grouped.size(),
+        'wall': grouped.wall.sum(),
+        'max_wall': grouped.wall.max(),
+        'self': grouped['self'].sum(),
+        'cpu': grouped.cpu.sum(),
+        'memory': grouped.memory.max(),
+        'rows': grouped.rows.max(),
+        'cols': grouped.cols.max()}, columns=columns)
+    return result.sort_values('wall', ascending=False)
+
+
+def export(path, owner=None):
+    """ Write recorded events to `path` in Chrome trace event format.
+
+    The file can be opened in chrome://tracing or https://ui.perfetto.dev.
+
+    Parameters
+    ----------
+    path : str
+    owner : object
+        Optional. See `events`.
+    """
+    pid = os.getpid()
+    traceEvents = []
+    for e in events(owner):
+        traceEvents.append({
+            'name': e['name'], 'cat': 'annotator', 'ph': 'X', 'pid': pid,
+            'tid': e['thread'], 'ts': e['start'] * 1e6, 'dur': e['wall'] * 1e6,
+            'args': {k: e[k] for k in ('cpu', 'memory', 'rows', 'cols',
+                                       'error') if e[k] is not None}})
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': traceEvents, 'displayTimeUnit': 'ms'}, f)
+
+
+if os.environ.get('ANNOTATOR_TRACE'):
+    enable(memory=os.environ['ANNOTATOR_TRACE'].lower() == 'memory')
@@ -1,10 +1,25 @@
-from __future__ import print_function
 import pandas as pd
 import synapseclient as sc
 import re
 import json
-
-
+import time
+import hashlib
+from . import cache
+from . import client
+from . import trace
+
+FILE_FORMAT_REGEX = r"\.(\w+)(?:\.gz)?$"  # file extension, ignoring .gz
+INTEGER_REGEX = r"^[+-]?\d+$"
+DOUBLE_REGEX = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"
+BOOLEAN_REGEX = r"^([Tt]rue|TRUE|[Ff]alse|FALSE)$"
+LEADING_ZERO_REGEX = r"^[+-]?0\d"  # e.g. zero-padded IDs like "007"
+MAX_STRING_SIZE = 1000  # longer values need a LARGETEXT column
+STRING_SIZE_STEP = 50  # STRING sizes are rounded up to a multiple of this
+PAGE_SIZE = 50000  # rows per query of `queryPages`
+POLL_INTERVAL = 2  # seconds between polls of a file view being built
+
+
+@trace.traced
 def synread(syn_, obj, silent=True, sortCols=True):
 
     """ A simple way to read in Synapse entities to pandas.DataFrame objects.
@@ -24,7 +39,7 @@ def synread(syn_, obj, silent=True, sortCols=True):
     """
     # if "syn" in globals(): syn_ = syn
     if isinstance(obj, pd.DataFrame):
-        obj = obj.sort_index(1) if sortCols else obj
+        obj = obj.sort_index(axis=1) if sortCols else obj
         return obj
     elif isinstance(obj, str):
         f = syn_.get(obj)
@@ -52,11 +67,12 @@ def _synread(synId, f, syn_, sortCols):
         q = syn_.tableQuery("select * from %s" % synId)
         d = q.asDataFrame()
     if sortCols:
-        return d.sort_index(1)
+        return d.sort_index(axis=1)
     else:
         return d
 
 
+@trace.traced
 def clipboardToDict(sep):
     """ Parse two-column delimited clipboard contents to a dictionary.
 
@@ -158,6 +174,7 @@ def _colsFromList(l, asSynapseCols):
     return _keyValCols(keys, values, asSynapseCols)
 
 
+@trace.traced
 def makeColumns(obj, asSynapseCols=True):
     """ Create new Synapse.Column compatible objects.
 
@@ -183,6 +200,75 @@ def makeColumns(obj, asSynapseCols=True):
         raise TypeError("{} is not a supported type.".format(type(obj)))
 
 
+# cache path -> column definition hash -> Synapse column ID
+_columnIds = {}
+
+
+def _withoutId(col):
+    """ A column definition without its Synapse-assigned fields. """
+    return {k: v for k, v in col.items()
+            if k not in ('id', 'concreteType') and v is not None}
+
+
+def _columnHash(syn, col):
+    """ Content hash of a column definition on the Synapse stack of `syn`. """
+    definition = _withoutId(col)
+    definition['endpoint'] = getattr(syn, 'repoEndpoint', '')
+    definition = json.dumps(definition, sort_keys=True, default=str)
+    return hashlib.sha256(definition.encode('utf-8')).hexdigest()
+
+
+@trace.traced
+def createColumns(syn, cols, columnCache=None):
+    """ Get Synapse column models for column definitions, reusing
+    previously created models.
+
+    Synapse column models are immutable, so a definition only ever needs
+    to be created once. Definitions are content-hashed and mapped to their
+    Synapse column IDs in a local cache. Definitions not yet in the cache
+    are created with a single batch request.
+
+    Parameters
+    ----------
+    syn : synapseclient.Synapse
+    cols : list of dict or synapseclient.Column
+        Column definitions. Definitions which already have an `id` are
+        returned as they are.
+    columnCache : cache.DiskCache
+        Optional. Where to persist definition hashes and column IDs.
+        Defaults to the 'columns' cache in `cache.CACHE_DIR`.
+
+    Returns
+    -------
+    A list of synapseclient.Column objects with IDs, which can be passed
+    to a schema to reference existing column models.
+    """
+    columnCache = cache.DiskCache('columns') if columnCache is None \
+        else columnCache
+    columnIds = _columnIds.setdefault(columnCache.path, {})
+    cols = [dict(c) for c in cols]
+    hashes = [None if c.get('id') else _columnHash(syn, c) for c in cols]
+    missing = {}
+    for c, h in zip(cols, hashes):
+        if h is None or h in columnIds or h in missing:
+            continue
+        columnId = columnCache.get(h)
+        if columnId is None:
+            missing[h] = c
+        else:
+            columnIds[h] = columnId
+    if missing:
+        created = syn.createColumns([sc.Column(**_withoutId(c))
+                                     for c in missing.values()])
+        for h, c in zip(missing, created):
+            columnIds[h] = c['id']
+            columnCache.set(h, c['id'])
+    return [sc.Column(**c) if h is None
+            else sc.Column(**dict(c, id=columnIds[h]))
+            for c, h in zip(cols, hashes)]
+
+
+@trace.traced
 def dropColumns(syn, target, cols):
     """ Delete columns from a file view on Synapse.
 
@@ -198,6 +284,7 @@ def dropColumns(syn, target, cols):
     -------
     synapseclient.table.EntityViewSchema
     """
+    syn = client.wrap(syn)
     cols = [cols] if isinstance(cols, str) else cols
     schema = syn.get(target) if isinstance(target, str) else target
     cols_ = syn.getTableColumns(schema.id)
@@ -208,6 +295,7 @@ def dropColumns(syn, target, cols):
     return schema
 
 
+@trace.traced
 def addToScope(syn, target, scope):
     """ Add further Folders/Projects to the scope of a file view.
 
@@ -223,6 +311,7 @@ def addToScope(syn, target, scope):
     -------
     synapseclient.Schema
     """
+    syn = client.wrap(syn)
     scope = [scope] if isinstance(scope, str) else scope
     target = syn.get(target) if isinstance(target, str) else target
     cols = list(syn.getTableColumns(target.id))
@@ -243,6 +332,168 @@ def addToScope(syn, target, scope):
     return schema
 
 
+@trace.traced
+def updateSchema(syn, target, drop=None, add=None, scope=None):
+    """ Apply several changes to the schema of a Synapse Table or File View
+    with a single update.
+
+    Parameters
+    ----------
+    syn : synapseclient.Synapse
+    target : str, synapseclient.Schema
+        The Synapse ID of a Synapse Table or File View, or its schema.
+    drop : list
+        Optional. Names of the columns to delete.
+    add : list
+        Optional. Column definitions (dict or synapseclient.Column) to add.
+        They replace the columns of the same name, e.g. to resize them.
+    scope : list
+        Optional. The Synapse IDs of Folders/Projects to add to the scope
+        of a file view. The default columns of the new scope which are not
+        in the view yet (or in `drop`) are added as well.
+
+    Returns
+    -------
+    synapseclient.Schema
+    """
+    syn = client.wrap(syn)
+    drop, add, scope = list(drop or []), list(add or []), list(scope or [])
+    schema = syn.get(target) if isinstance(target, str) else target
+    current = list(syn.getTableColumns(schema.id))
+    if scope:
+        scopeIds = list(schema['scopeIds'])
+        schema['scopeIds'] = scopeIds + [s for s in scope
+                                         if s not in scopeIds]
+        names = {c['name'] for c in current + add}.union(drop)
+        add += [c for c in getDefaultColumnsForScope(syn, schema['scopeIds'])
+                if c['name'] not in names]
+    replaced = set(drop).union(c['name'] for c in add)
+    for c in current:
+        if c['name'] in replaced:
+            schema.removeColumn(c)
+    if add:
+        schema.addColumns(createColumns(syn, add))
+    return syn.store(schema)
+
+
+def tableState(syn, synId):
+    """ The state of the index of a table or file view on Synapse:
+    'AVAILABLE' once it is built and up to date, 'PROCESSING' while it is
+    being built, or 'PROCESSING_FAILED'. """
+    status = client.wrap(syn).restGET(
+            '/entity/{}/table/status'.format(synId))
+    if status['state'] == 'PROCESSING_FAILED':
+        raise RuntimeError("Synapse failed to build {}: {}".format(
+            synId, status.get('errorMessage')))
+    return status['state']
+
+
+def queryPages(syn, synId, pageSize=PAGE_SIZE, interval=None):
+    """ Read the rows of a table or file view a page at a time, as they
+    become queryable, e.g. while Synapse builds a new file view.
+
+    The rows indexed so far are read in pages of `pageSize` rows ordered
+    by ROW_ID, each page starting after the last ROW_ID read. While the
+    status of the view is not AVAILABLE, the rows indexed in the meantime
+    are read every `interval` seconds, and reading stops once it is.
+    Rows indexed during the build behind the last ROW_ID read are read
+    by a final pass, if the view has more rows than were read. A view
+    which is already built is read in a single pass, without waiting.
+
+    Parameters
+    ----------
+    syn : synapseclient.Synapse
+    synId : str
+    pageSize : int
+        Optional. Defaults to `PAGE_SIZE`.
+    interval : float
+        Optional. Defaults to `POLL_INTERVAL`.
+
+    Yields
+    ------
+    pandas.DataFrame objects of rows not yielded before, indexed by
+    ROWID_VERSION labels.
+
+    Raises
+    ------
+    RuntimeError if Synapse fails to build the view.
+    """
+    syn = client.wrap(syn)
+    interval = POLL_INTERVAL if interval is None else interval
+    seen = set()
+    after = [0]  # the last ROW_ID read
+
+    def pages():
+        while True:
+            page = syn.tableQuery(
+                    "select * from {} where ROW_ID > {} order by ROW_ID "
+                    "limit {}".format(synId, after[0], pageSize)
+                    ).asDataFrame()
+            if not len(page):
+                return
+            rowIds = _rowIds(page.index)
+            after[0] = max(int(i) for i in rowIds)
+            new = page[~rowIds.isin(seen)]
+            seen.update(rowIds)
+            if len(new):
+                yield new
+            if len(page) < pageSize:
+                return
+
+    built = False
+    while True:
+        state = tableState(syn, synId)
+        for page in pages():
+            yield page
+        if state == 'AVAILABLE':
+            break
+        built = True
+        time.sleep(interval)
+    if built:
+        count = int(syn.tableQuery("select count(*) from {}".format(
+                synId)).asDataFrame().iloc[0, 0])
+        if len(seen) < count:
+            after[0] = 0
+            for page in pages():
+                yield page
+
+
+@trace.traced
+def readScope(syn, synId, scope, exclude=None, sortCols=True):
+    """ Read the rows of a file view which belong to some of its scope:
+    the files directly in Folders of `scope` and anywhere in Projects of
+    `scope`.
+
+    Parameters
+    ----------
+    syn : synapseclient.Synapse
+    synId : str
+        The Synapse ID of the file view.
+    scope : str, list
+        The Synapse IDs of Folders/Projects in the scope of the view.
+    exclude : pandas.Index
+        Optional. ROWID_VERSION labels of rows to leave out, matched on
+        their ROW_ID. Defaults to `None`.
+    sortCols : bool
+        Optional. Whether to sort columns lexicographically. Defaults to True.
+
+    Returns
+    -------
+    A pandas.DataFrame object.
+    """
+    syn = client.wrap(syn)
+    scope = [scope] if isinstance(scope, str) else list(scope)
+    ids = ", ".join("'{}'".format(s) for s in scope)
+    d = pd.concat([syn.tableQuery("select * from {} where {} in ({})".format(
+                        synId, col, ids)).asDataFrame()
+                   for col in ('parentId', 'projectId')])
+    d = d[~d.index.duplicated()]
+    if exclude is not None:
+        d = d[~_rowIds(d.index).isin(_rowIds(exclude))]
+    return d.sort_index(axis=1) if sortCols else d
+
+
+@trace.traced
 def getDefaultColumnsForScope(syn, scope):
     """ Fetches the columns which would be used in the creation
     of a file view with the given scope.
@@ -257,13 +508,19 @@ def getDefaultColumnsForScope(syn, scope):
     -------
     list of dict
     """
+    syn = client.wrap(syn)
     scope = [scope] if isinstance(scope, str) else scope
-    params = {'scope': scope, 'viewType': 'file'}
-    cols = syn.restPOST('/column/view/scope',
-                             json.dumps(params))['results']
+    cols = syn.metadata.defaultColumns(scope)
+    if cols is None:
+        params = {'scope': scope, 'viewType': 'file'}
+        # a query, retried like reads unlike `syn.restPOST`
+        cols = syn.call(syn.syn.restPOST, '/column/view/scope',
+                        json.dumps(params))['results']
+        syn.metadata.setDefaultColumns(scope, cols)
     return cols
 
 
+@trace.traced
 def combineSynapseTabulars(syn, tabulars, axis=0):
     """ Concatenate tabular files.
 
@@ -279,9 +536,10 @@ def combineSynapseTabulars(syn, tabulars, axis=0):
     pandas.DataFrame
     """
     tabulars = synread(syn, tabulars)
-    return pd.concat(tabulars, axis=axis, ignore_index=True).sort_index(1)
+    return pd.concat(tabulars, axis=axis, ignore_index=True).sort_index(axis=1)
 
 
+@trace.traced
 def compareDicts(dict1, dict2):
     """ Compare two dictionaries, returning sets containing keys from
     dict1 difference dict2, dict2 difference dict1, and shared keys with
@@ -304,6 +562,293 @@ def compareDicts(dict1, dict2):
     return new, missing, modified
 
 
+def _normalizeCell(v):
+    """ Canonical string form of a table cell, so values read back from
+    Synapse compare equal to the values they were stored from. """
+    if isinstance(v, bytes):
+        v = v.decode('utf-8')
+    if v is None or (isinstance(v, float) and pd.isnull(v)):
+        return ''
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+
+@trace.traced
+def diffDataFrames(old, new, key):
+    """ Compare two tables on the identity columns `key`, returning the
+    rows to delete from, insert into, and update in `old` to obtain `new`.
+
+    Cells are compared by their string form, treating missing values as
+    the empty string. Only columns present in both tables are compared.
+    Rows of `new` repeated with the same values are compared once.
+
+    Parameters
+    ----------
+    old : pd.DataFrame
+        The current table. Its index (e.g. ROWID_VERSION) is preserved
+        in the returned deleted and updated rows.
+    new : pd.DataFrame
+        The desired table.
+    key : list
+        Columns which together identify a row.
+
+    Returns
+    -------
+    pd.DataFrame, pd.DataFrame, pd.DataFrame
+        Rows of `old` missing from `new`, rows of `new` missing from `old`
+        and rows of `new` whose values differ from their match in `old`,
+        indexed like `old`.
+
+    Raises
+    ------
+    ValueError
+        If rows of `new` with the same identity have different values,
+        listing their identities.
+    """
+    cols = [c for c in new.columns if c in old.columns]
+    oldNorm = old[cols].apply(lambda c: c.map(_normalizeCell))
+    newNorm = new[cols].apply(lambda c: c.map(_normalizeCell))
+    oldNorm['_old'] = range(len(old))
+    newNorm['_new'] = range(len(new))
+    # duplicate identities in `old` can't be matched and are deleted
+    oldDuplicated = oldNorm.duplicated(key).values
+    newNorm = newNorm.drop_duplicates(cols)
+    conflicts = newNorm[newNorm.duplicated(key, keep=False)]
+    if len(conflicts):
+        raise ValueError(
+            "Rows with the same {} have different values: {}".format(
+                ", ".join(key), sorted(set(
+                    map(tuple, conflicts[key].values.tolist())))))
+    merged = oldNorm[~oldDuplicated].merge(
+            newNorm, on=key, how='outer', suffixes=('_old', '_new'))
+    deletedPositions = list(merged.loc[merged._new.isnull(), '_old'])
+    deletedPositions += [i for i, d in enumerate(oldDuplicated) if d]
+    deleted = old.iloc[sorted(int(i) for i in deletedPositions)]
+    inserted = new.iloc[
+            sorted(int(i) for i in merged.loc[merged._old.isnull(), '_new'])]
+    both = merged[merged._old.notnull() & merged._new.notnull()]
+    changed = pd.Series(False, index=both.index)
+    for c in cols:
+        if c not in key:
+            changed |= both[c + '_old'] != both[c + '_new']
+    both = both[changed].sort_values('_old')
+    updated = new.iloc[both._new.astype(int).values].copy()
+    updated.index = old.index[both._old.astype(int).values]
+    return deleted, inserted, updated
+
+
+def _rowIds(index):
+    """ The ROW_ID part of ROWID_VERSION labels. """
+    return pd.Index([str(i).split('_')[0] for i in index])
+
+
+@trace.traced
+def rebaseEdits(snapshot, edited, fresh):
+    """ Apply to `fresh` the edits made to `edited` since it was copied
+    from `snapshot`.
+
+    Rows are matched on their ROW_ID (the part of their label before the
+    first underscore), so that edits carry over to the new row versions
+    of `snapshot` once published.
+
+    Parameters
+    ----------
+    snapshot : pd.DataFrame
+        The view as it was published.
+    edited : pd.DataFrame
+        The view as it has been edited since.
+    fresh : pd.DataFrame
+        The view as published, with its new row versions.
+
+    Returns
+    -------
+    pd.DataFrame indexed like `fresh`, with the cells which differ between
+    `snapshot` and `edited` (and the columns added to `edited`) set to
+    their values in `edited`, and without the rows and columns dropped
+    from `edited`.
+    """
+    labels = pd.Series(fresh.index, index=_rowIds(fresh.index))
+    result = fresh.copy()
+    result.index = labels.index
+    before = snapshot.copy()
+    before.index = _rowIds(snapshot.index)
+    after = edited.copy()
+    after.index = _rowIds(edited.index)
+    result = result.drop(result.index.intersection(
+            before.index.difference(after.index)))
+    result = result.drop([c for c in before.columns if c not in after.columns
+                          and c in result.columns], axis=1)
+    rows = after.index.intersection(result.index)
+    for c in after.columns:
+        if c in before.columns:
+            common = rows.intersection(before.index)
+            old, new = before.loc[common, c], after.loc[common, c]
+            changed = common[((old != new) &
+                              ~(old.isnull() & new.isnull())).values]
+        else:
+            changed = rows
+        if not len(changed):
+            continue
+        if c not in result.columns:
+            result[c] = None
+        if result[c].dtype != after[c].dtype:
+            result[c] = result[c].astype(object)
+        result.loc[changed, c] = after.loc[changed, c].values
+    result.index = labels.loc[result.index].values
+    return result
+
+
+@trace.traced
+def readIndex(syn, synId, columns=('etag',)):
+    """ Read only the row labels of a table or file view, and `columns`.
+
+    Parameters
+    ----------
+    syn : synapseclient.Synapse
+    synId : str
+    columns : list
+        Optional. At least one column to read. Defaults to the etag column
+        of file views.
+
+    Returns
+    -------
+    pd.DataFrame indexed by ROWID_VERSION labels.
+    """
+    syn = client.wrap(syn)
+    q = syn.tableQuery("select {} from {}".format(
+            ", ".join('"{}"'.format(c) for c in columns), synId))
+    return q.asDataFrame()
+
+
+@trace.traced
+def relabel(view, fresh):
+    """ Give the rows of `view` the labels of the rows of `fresh` with the
+    same ROW_ID, e.g. the new row versions of a published view.
+
+    Parameters
+    ----------
+    view : pd.DataFrame
+    fresh : pd.DataFrame
+        Typically read by `readIndex`. The values of its columns replace
+        those of `view`.
+
+    Returns
+    -------
+    A copy of `view`. Rows with no match in `fresh` keep their label.
+    """
+    fresh = fresh[~_rowIds(fresh.index).duplicated()]
+    rowIds = _rowIds(view.index)
+    found = rowIds.isin(_rowIds(fresh.index))
+    matched = pd.Series(range(len(fresh)), index=_rowIds(fresh.index))[
+            rowIds[found]].values
+    result = view.copy()
+    for c in fresh.columns:
+        if c in result.columns:
+            if result[c].dtype != fresh[c].dtype:
+                result[c] = result[c].astype(object)
+            result.loc[found, c] = fresh[c].values[matched]
+    labels = result.index.values.astype(object)
+    labels[found] = fresh.index.values[matched]
+    result.index = pd.Index(labels)
+    return result
+
+
+@trace.traced
+def profileColumns(df, cols):
+    """ Summarize the values of columns of `df` to choose column types.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+    cols : list
+        Columns of `df`.
+
+    Returns
+    -------
+    pd.DataFrame indexed by column, with the number of non-null values
+    (`values`), of distinct values (`distinct`), the length of the longest
+    value as a string (`maxLength`), whether all values are integers
+    (`integer`), numbers (`double`) or booleans (`boolean`) as strings,
+    and whether any value has leading zeros (`leadingZeros`).
+    """
+    rows = []
+    for c in cols:
+        text = df[c].dropna().astype(str)
+        rows.append({
+            'values': len(text), 'distinct': text.nunique(),
+            'maxLength': int(text.str.len().max()) if len(text) else 0,
+            'integer': bool(text.str.match(INTEGER_REGEX).all()),
+            'double': bool(text.str.match(DOUBLE_REGEX).all()),
+            'boolean': bool(text.str.match(BOOLEAN_REGEX).all()),
+            'leadingZeros': bool(text.str.match(LEADING_ZERO_REGEX).any())})
+    return pd.DataFrame(rows, index=list(cols),
+                        columns=['values', 'distinct', 'maxLength', 'integer',
+                                 'double', 'boolean', 'leadingZeros'])
+
+
+@trace.traced
+def proposeColumns(profile, current):
+    """ Right-size the Synapse columns of profiled values.
+
+    Columns which are STRING columns (or not columns yet) become BOOLEAN,
+    INTEGER or DOUBLE columns if all their values are, otherwise STRING
+    columns sized for their longest value, or LARGETEXT columns if it is
+    longer than `MAX_STRING_SIZE`. Columns with zero-padded values (e.g.
+    specimen IDs like "007") stay STRING columns, since numbers would lose
+    the padding. STRING sizes are rounded up to a multiple of
+    `STRING_SIZE_STEP` (the size `makeColumns` gives empty columns), so
+    that values a little longer than today's still fit, while rows stay
+    far narrower than with a generous size. Other columns, and columns
+    without values, are left as they are.
+
+    Parameters
+    ----------
+    profile : pd.DataFrame
+        See `profileColumns`.
+    current : dict
+        Current column definitions (dict or synapseclient.Column) by name.
+
+    Returns
+    -------
+    pd.DataFrame indexed by column, with `profile` and the current and
+    proposed `columnType` and `maximumSize`, whether they differ
+    (`changed`) and the proposed column definition (`column`).
+    """
+    proposals = []
+    for name, p in profile.iterrows():
+        col = dict(current.get(name) or {'name': name, 'columnType': 'STRING'})
+        columnType, size = col.get('columnType'), col.get('maximumSize')
+        newType, newSize = columnType, size
+        if columnType == 'STRING' and p['values']:
+            if p['boolean']:
+                newType, newSize = 'BOOLEAN', None
+            elif p['integer'] and not p['leadingZeros']:
+                newType, newSize = 'INTEGER', None
+            elif p['double'] and not p['leadingZeros']:
+                newType, newSize = 'DOUBLE', None
+            elif p['maxLength'] > MAX_STRING_SIZE:
+                newType, newSize = 'LARGETEXT', None
+            else:
+                steps = -(-max(1, int(p['maxLength'])) // STRING_SIZE_STEP)
+                newSize = min(MAX_STRING_SIZE, steps * STRING_SIZE_STEP)
+        new = {k: v for k, v in _withoutId(col).items()
+               if k != 'maximumSize'}
+        new['columnType'] = newType
+        if newSize is not None:
+            new['maximumSize'] = newSize
+        proposals.append({'columnType': columnType, 'maximumSize': size,
+                          'newColumnType': newType, 'newMaximumSize': newSize,
+                          'changed': (newType, newSize) != (columnType, size)
+                          or name not in current,
+                          'column': new})
+    return pd.concat([profile, pd.DataFrame(
+        proposals, index=profile.index,
+        columns=['columnType', 'maximumSize', 'newColumnType',
+                 'newMaximumSize', 'changed', 'column'])], axis=1)
+
+
+@trace.traced
 def inferValues(df, col, referenceCols):
     """ Fill in values for indices which match on `referenceCols`
     and which have a single, unique, non-NaN value in `col`.
@@ -333,6 +878,7 @@ def inferValues(df, col, referenceCols):
     return df
 
 
+@trace.traced
 def substituteColumnValues(referenceList, mod):
     """ Substitute values in a column according to a mapping.
 
@@ -348,6 +894,7 @@ def substituteColumnValues(referenceList, mod):
     return referenceList
 
 
+@trace.traced
 def colFromRegex(referenceList, regex):
     """ Return a list created by mapping a regular expression to another list.
     The regular expression must contain at least one capture group.
@@ -0,0 +1,71 @@
+""" Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare base.json head.json [--threshold 1.25]
+
+Exits with status 1 if any operation got slower (wall time) or hungrier
+(peak memory) by more than `threshold` times at any size.
+"""
+import sys
+import json
+import argparse
+
+METRICS = ['wall', 'cpu', 'peak_memory']
+GATED = ['wall', 'peak_memory']
+
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return report, {(r['operation'], r['rows']): r for r in report['results']}
+
+
+def compare(base, head, threshold=1.25, minimum=0.01):
+    """ Ratios of `head` to `base` for every shared operation and size.
+
+    Parameters
+    ----------
+    base, head : dict
+        Results keyed by (operation, rows), see `load`.
+    threshold : float
+        Optional. Ratio above which a metric is a regression.
+        Defaults to 1.25.
+    minimum : float
+        Optional. Wall times under this many seconds in both runs are
+        never regressions, being mostly noise. Defaults to 0.01.
+
+    Returns
+    -------
+    list of (operation, rows, metric, base, head, ratio, regressed)
+    """
+    rows = []
+    for key in sorted(set(base) & set(head)):
+        for metric in METRICS:
+            if metric not in base[key] or metric not in head[key]:
+                continue
+            b, h = base[key][metric], head[key][metric]
+            ratio = h / b if b else float('inf') if h else 1.0
+            noise = metric in ('wall', 'cpu') and max(b, h) < minimum
+            regressed = metric in GATED and ratio > threshold and not noise
+            rows.append(key + (metric, b, h, ratio, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    opts = parser.parse_args(argv)
+    baseReport, base = load(opts.base)
+    headReport, head = load(opts.head)
+    print("{} -> {}".format(baseReport['commit'], headReport['commit']))
+    rows = compare(base, head, opts.threshold)
+    for operation, size, metric, b, h, ratio, regressed in rows:
+        print("{:>24} {:>9} {:>12} {:>14.4g} {:>14.4g} {:>7.2f}x{}".format(
+            operation, size, metric, b, h, ratio,
+            "  REGRESSION" if regressed else ""))
+    return 1 if any(r[-1] for r in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,256 @@
+""" Time and memory-profile the main Pipeline operations on synthetic data.
+
+    python -m benchmarks.run --sizes 10000 100000 1000000
+    python -m benchmarks.run --sizes 1000000 --operations saveSession \\
+        loadSession
+    python -m benchmarks.compare benchmarks/results/<old>.json \\
+        benchmarks/results/<new>.json
+
+Every operation runs on freshly generated inputs (not timed): once to
+measure wall and CPU time, and once under tracemalloc to measure its
+peak memory. Results are written as JSON, by default to
+benchmarks/results/<commit>.json.
+"""
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import contextlib
+import pandas as pd
+import annotator
+from annotator import schema
+from annotator import backends
+from annotator import __main__ as cli
+from annotator.testing import FakeSynapse
+from . import synthetic
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'results')
+LINKS = {'individualID': 'Individual ID', 'assayTarget': 'Histone Mark/Input',
+         'cellType': 'NeuN'}
+
+
+def _pipeline(rows, opts, meta=True):
+    view = synthetic.syntheticView(rows, opts.cardinality, opts.naming)
+    metadata = synthetic.syntheticMeta(opts.cardinality) if meta else None
+    return annotator.Pipeline(FakeSynapse(), view=view, meta=metadata,
+                              sortCols=False, backend=opts.backend,
+                              workers=opts.workers)
+
+
+def _linked(rows, opts):
+    """ A Pipeline with its key column and links in place. """
+    p = _pipeline(rows, opts)
+    _, regex = synthetic.NAMING[opts.naming]
+    newCol, _ = p._checkKeyCol('name', 'ChIP_Seq_ID', regex)
+    p._setKeyCol('name', 'ChIP_Seq_ID', regex, newCol)
+    p.keyCol = 'ChIP_Seq_ID'
+    p.addLinks(LINKS, backup=False)
+    return p
+
+
+def addKeyCol(rows, opts, tmp):
+    p = _pipeline(rows, opts)
+    _, regex = synthetic.NAMING[opts.naming]
+    if opts.backend == 'sqlite':
+        return lambda: p._checkKeyCol('name', 'ChIP_Seq_ID', regex)
+    return lambda: p._matchKeyCol('name', 'ChIP_Seq_ID', regex)
+
+
+def transferLinks(rows, opts, tmp):
+    p = _linked(rows, opts)
+    return p.transferLinks
+
+
+def inferValues(rows, opts, tmp):
+    p = _linked(rows, opts)
+    p.transferLinks(dropOn=False)
+    return lambda: p.inferValues('tissue', 'ChIP_Seq_ID')
+
+
+def substituteColumnValues(rows, opts, tmp):
+    p = _pipeline(rows, opts, meta=False)
+    return lambda: p.substituteColumnValues(
+            'cellType', {'Pos': 'NeuN+', 'Neg': 'NeuN-'})
+
+
+def validate(rows, opts, tmp):
+    p = _pipeline(rows, opts, meta=False)
+    path = synthetic.writeSchema(os.path.join(tmp, 'schema.json'), 1000)
+    p.schema = schema.flattenJson(path)
+    p.addActiveCols(list(synthetic.ANNOTATION_VALUES), backup=False)
+    return p._validate
+
+
+def backupUndo(rows, opts, tmp):
+    p = _pipeline(rows, opts)
+
+    def backupUndo():
+        p.backup("benchmark")
+        p.undo()
+    return backupUndo
+
+
+def flattenJson(rows, opts, tmp):
+    path = synthetic.writeSchema(os.path.join(tmp, 'schema.json'), rows,
+                                 opts.values_per_key)
+    return lambda: schema.flattenJson(path)
+
+
+def create_sync_manifest(rows, opts, tmp):
+    files, synapseDir = synthetic.syntheticFileList(tmp, rows)
+    root = os.path.abspath(tmp)
+
+    def create_sync_manifest():
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            cli.create_sync_manifest(files, ['used', 'executed'], synapseDir,
+                                     root, None)
+        finally:
+            os.chdir(cwd)
+    return create_sync_manifest
+
+
+def saveSession(rows, opts, tmp):
+    p = _linked(rows, opts)
+    return lambda: p.save(os.path.join(tmp, 'session'))
+
+
+def loadSession(rows, opts, tmp):
+    path = os.path.join(tmp, 'session')
+    _linked(rows, opts).save(path)
+    return lambda: annotator.Pipeline.load(path, FakeSynapse())
+
+
+OPERATIONS = [addKeyCol, transferLinks, inferValues, substituteColumnValues,
+              validate, backupUndo, flattenJson, create_sync_manifest,
+              saveSession, loadSession]
+
+
+@contextlib.contextmanager
+def _quiet():
+    """ Discard what the operations print. """
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull), \
+                contextlib.redirect_stderr(devnull):
+            yield
+
+
+def measure(operation, rows, opts):
+    """ Measure one operation at one size.
+
+    Returns
+    -------
+    dict of wall and CPU seconds and peak traced memory in bytes.
+    """
+    result = {'operation': operation.__name__, 'rows': rows}
+    tmp = tempfile.mkdtemp()
+    try:
+        with _quiet():
+            walls, cpus = [], []
+            for _ in range(opts.repeat):
+                func = operation(rows, opts, tmp)
+                gc.collect()
+                wall, cpu = time.perf_counter(), time.process_time()
+                func()
+                walls.append(time.perf_counter() - wall)
+                cpus.append(time.process_time() - cpu)
+            result['wall'] = min(walls)
+            result['cpu'] = min(cpus)
+            if opts.memory:
+                func = operation(rows, opts, tmp)
+                gc.collect()
+                tracemalloc.start()
+                func()
+                result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return result
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(opts):
+    operations = [o for o in OPERATIONS
+                  if not opts.operations or o.__name__ in opts.operations]
+    results = []
+    for rows in opts.sizes:
+        for operation in operations:
+            result = measure(operation, rows, opts)
+            results.append(result)
+            print("{operation:>24} {rows:>9} rows  {wall:9.3f}s wall "
+                  "{cpu:9.3f}s cpu".format(**result) +
+                  ("  {:9.1f}MB peak".format(result['peak_memory'] / 2 ** 20)
+                   if 'peak_memory' in result else ""))
+            sys.stdout.flush()
+    return {'commit': _commit(), 'timestamp': time.time(),
+            'python': platform.python_version(), 'pandas': pd.__version__,
+            'machine': platform.machine(), 'options': {
+                'cardinality': opts.cardinality, 'naming': opts.naming,
+                'values_per_key': opts.values_per_key,
+                'repeat': opts.repeat, 'backend': opts.backend,
+                'workers': opts.workers},
+            'results': results}
+
+
+def buildParser():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', nargs='+', type=int,
+                        default=[10000, 100000, 1000000],
+                        help='Numbers of rows to run every operation at.')
+    parser.add_argument('--operations', nargs='+',
+                        choices=[o.__name__ for o in OPERATIONS],
+                        help='Operations to run (default: all).')
+    parser.add_argument('--cardinality', type=int, default=1000,
+                        help='Number of distinct specimens in the view.')
+    parser.add_argument('--naming', choices=sorted(synthetic.NAMING),
+                        default='fastq', help='File naming pattern.')
+    parser.add_argument('--values-per-key', type=int, default=20,
+                        help='Enum values per key of synthetic schemas.')
+    parser.add_argument('--backend', choices=backends.BACKENDS,
+                        default='pandas',
+                        help='Pipeline backend to run operations with.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processes to partition Pipeline transforms '
+                             'across (0 for one per processor).')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Times to time each operation (best is kept).')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='Skip the tracemalloc pass.')
+    parser.add_argument('-o', '--output',
+                        help='Results file (default: results/<commit>.json).')
+    return parser
+
+
+def main(argv=None):
+    opts = buildParser().parse_args(argv)
+    report = run(opts)
+    output = opts.output or os.path.join(
+            RESULTS_DIR, "{}.json".format(report['commit']))
+    if os.path.dirname(output) and not os.path.isdir(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("Results written to", output)
+    return report
+
+
+if __name__ == '__main__':
+    main()
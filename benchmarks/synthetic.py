@@ -0,0 +1,144 @@
+""" Synthetic file views, metadata, schemas and directory listings at
+configurable size, cardinality and naming pattern. """
+import os
+import json
+import numpy as np
+import pandas as pd
+
+CENTERS = ['MSSM', 'PENN', 'PITT']
+
+# naming pattern -> (file name template, regex capturing the specimen ID)
+NAMING = {
+    'fastq': ("{key}_TAGCTT_BC90D9ANXX_L00{lane}_001.R{read}.fastq.gz",
+              r"^([A-Z]+_PFC_\d+_Pos_IN)_"),
+    'flat': ("{key}.bam", r"^(.+)\.bam$"),
+    'prefixed': ("run{lane}_lib{read}_{key}_final.txt",
+                 r"^run\d+_lib\d+_(.+)_final\.txt$"),
+}
+
+ANNOTATION_VALUES = {
+    'assay': ['ChIPSeq', 'rnaSeq', 'ATACSeq'],
+    'cellType': ['Pos', 'Neg'],
+    'fileFormat': ['fastq', 'bam', 'txt'],
+    'tissue': ['PFC', 'DLPFC', 'ACC', 'STG'],
+    'consortium': ['PEC'],
+}
+
+
+def specimenIds(cardinality):
+    """ `cardinality` distinct specimen IDs, like PENN_PFC_000042_Pos_IN. """
+    return np.array(["{}_PFC_{:06d}_Pos_IN".format(CENTERS[i % len(CENTERS)], i)
+                     for i in range(cardinality)], dtype=object)
+
+
+def syntheticView(rows, cardinality=1000, naming='fastq', annotations=5,
+                  missing=0.01, seed=0):
+    """ A file view of `rows` files, named after `cardinality` specimens.
+
+    Parameters
+    ----------
+    rows : int
+    cardinality : int
+        Optional. Number of distinct specimens. Defaults to 1000.
+    naming : str
+        Optional. A key of `NAMING`. Defaults to 'fastq'.
+    annotations : int
+        Optional. Number of annotation columns. Defaults to 5.
+    missing : float
+        Optional. Fraction of files which match no specimen and of
+        annotation values which are null. Defaults to 0.01.
+    seed : int
+
+    Returns
+    -------
+    pd.DataFrame indexed like a Synapse file view (ROWID_VERSION).
+    """
+    rng = np.random.RandomState(seed)
+    template, _ = NAMING[naming]
+    keys = specimenIds(cardinality)[rng.randint(0, cardinality, rows)]
+    lanes = rng.randint(1, 9, rows)
+    reads = rng.randint(1, 3, rows)
+    names = [template.format(key=k, lane=l, read=r)
+             for k, l, r in zip(keys, lanes, reads)]
+    junk = rng.rand(rows) < missing
+    names = np.where(junk, "randomPythonFile.pyc", names)
+    rowIds = np.arange(rows) + 10000000
+    view = pd.DataFrame({
+        'id': ["syn{}".format(i) for i in rowIds],
+        'name': names,
+        'parentId': ["syn{}".format(i) for i in
+                     rng.randint(0, max(1, cardinality // 10), rows)]},
+        index=["{}_1".format(i) for i in rowIds])
+    for col in sorted(ANNOTATION_VALUES)[:annotations]:
+        values = np.array(ANNOTATION_VALUES[col], dtype=object)
+        column = values[rng.randint(0, len(values), rows)]
+        column[rng.rand(rows) < missing] = None
+        view[col] = column
+    return view
+
+
+def syntheticMeta(cardinality=1000, seed=0):
+    """ Metadata with one row per specimen of `syntheticView`. """
+    rng = np.random.RandomState(seed)
+    keys = specimenIds(cardinality)
+    return pd.DataFrame({
+        'ChIP_Seq_ID': keys,
+        'Individual ID': ["CMC_{}".format(k.split('_')[2]) for k in keys],
+        'Histone Mark/Input': np.array(['Input', 'H3K4me3', 'H3K27ac'],
+                                       dtype=object)[rng.randint(0, 3, len(keys))],
+        'NeuN': np.array(['Pos', 'Neg'], dtype=object)[
+            rng.randint(0, 2, len(keys))]})
+
+
+def syntheticSchema(values, valuesPerKey=20):
+    """ A Synapse annotations JSON document with about `values` enum values.
+
+    Contains every key of `ANNOTATION_VALUES` (with their values) and as
+    many generated keys as needed to reach `values` enum values.
+
+    Returns
+    -------
+    list of dict
+    """
+    schema = [{'name': k, 'description': k, 'columnType': 'STRING',
+               'maximumSize': 50,
+               'enumValues': [{'value': v, 'description': v, 'source': ''}
+                              for v in vs]}
+              for k, vs in sorted(ANNOTATION_VALUES.items())]
+    for i in range(max(0, (values - 13) // valuesPerKey)):
+        schema.append({'name': "key{}".format(i), 'description': '',
+                       'columnType': 'STRING', 'maximumSize': 50,
+                       'enumValues': [{'value': "value{}".format(j),
+                                       'description': '', 'source': ''}
+                                      for j in range(valuesPerKey)]})
+    return schema
+
+
+def writeSchema(path, values, valuesPerKey=20):
+    """ Write `syntheticSchema` to `path`. """
+    with open(path, 'w') as f:
+        json.dump(syntheticSchema(values, valuesPerKey), f)
+    return path
+
+
+def syntheticFileList(root, rows, fanout=10, depth=3, seed=0):
+    """ Paths of `rows` files in a tree of directories under `root`.
+
+    Returns
+    -------
+    The list of file paths and a dict mapping each directory to a
+    synthetic Synapse ID (see `annotator.__main__._getSynapseDir`).
+    """
+    rng = np.random.RandomState(seed)
+    root = os.path.abspath(root)
+    dirs = [root]
+    level = [root]
+    for d in range(depth):
+        level = [os.path.join(parent, "dir{}".format(i))
+                 for parent in level for i in range(fanout)]
+        dirs += level
+    parents = np.array(dirs, dtype=object)[rng.randint(0, len(dirs), rows)]
+    files = [os.path.join(p, "file{}.txt".format(i))
+             for i, p in enumerate(parents)]
+    synapseDir = {d: "syn{}".format(i) for i, d in enumerate(dirs)}
+    return files, synapseDir
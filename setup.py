@@ -13,11 +13,13 @@ setup(
     author='Phil Snyder, Nasim Sanati',
     author_email='phil.snyder@sagebase.org',
     license='MIT',
-    packages=find_packages(),
+    python_requires='>=3.7',
+    packages=find_packages(exclude=['tests*', 'benchmarks*']),
     entry_points={
         'console_scripts': ['annotator = annotator.__main__:main']
     },
     install_requires=[
         'pandas',
         'synapseclient'],
+    extras_require={'yaml': ['pyyaml'], 'session': ['pyarrow']},
     tests_require=['pytest'])
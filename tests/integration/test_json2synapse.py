@@ -1,4 +1,3 @@
-from future.utils import iteritems
 import pandas
 import synapseclient
 from annotator import schema
@@ -17,7 +16,7 @@ def test_annotation_key_lengths_json_vs_table():
     currentTable = syn.tableQuery("SELECT * FROM %s" % tableSynId)
     currentTable = currentTable.asDataFrame()
 
-    for module, path in iteritems(names):
+    for module, path in names.items():
         table_key_set = set(currentTable[currentTable['module'] == module].key.unique())
         json_record = pandas.read_json(path)
         json_key_set = set(json_record['name'])
@@ -4,6 +4,8 @@ import logging
 import pandas
 import synapseclient
 import uuid
+import annotator.cache
+import annotator.testing
 
 
 SAMPLE_FILE = "https://raw.githubusercontent.com/Sage-Bionetworks/annotator/master/tests/sampleFile.csv"
@@ -124,3 +126,32 @@ def entities(syn, sampleFile, project):
             'table_schema': schema,
             'entity_view': entity_view_}
     return ents
+
+
+@pytest.fixture
+def fakeSyn():
+    return annotator.testing.FakeSynapse()
+
+
+def fake_entities(syn, n=3, annotations=None):
+    """ A project with a folder of `n` files and a file view of it,
+    stored to a `annotator.testing.FakeSynapse`. """
+    annotations = annotations or {}
+    project = syn.store(synapseclient.Project(str(uuid.uuid4())))
+    folder = syn.store(synapseclient.Folder(str(uuid.uuid4()), parent=project))
+    files = []
+    for i in range(n):
+        f = synapseclient.File(path=SAMPLE_FILE, name="file{}.csv".format(i),
+                               parent=folder)
+        for k, v in annotations.items():
+            f[k] = v
+        files.append(syn.store(f))
+    view = syn.store(synapseclient.EntityViewSchema(
+            name=str(uuid.uuid4()), parent=project, scopes=[folder]))
+    return {'project': project, 'folder': folder, 'files': files,
+            'entity_view': view}
+
+
+@pytest.fixture(autouse=True)
+def cacheDir(tmpdir, monkeypatch):
+    monkeypatch.setattr(annotator.cache, 'CACHE_DIR', str(tmpdir.join('cache')))
@@ -0,0 +1,231 @@
+import time
+import concurrent.futures
+import pytest
+import pandas
+import synapseclient
+import annotator
+from . import conftest
+
+
+@pytest.fixture
+def fakeEntities(fakeSyn):
+    return conftest.fake_entities(fakeSyn, annotations={'color': 'red'})
+
+
+@pytest.fixture
+def pipeline(fakeSyn, fakeEntities):
+    return annotator.Pipeline(fakeSyn, view=fakeEntities['entity_view'].id)
+
+
+class TestPipelineOffline(object):
+    def test_init(self, pipeline, fakeEntities):
+        assert pipeline.view.shape[0] == 3
+        assert list(pipeline.view.color) == ['red'] * 3
+        assert pipeline._entityViewSchema.id == fakeEntities['entity_view'].id
+
+    def test_init_loads_concurrently(self, fakeSyn, fakeEntities):
+        viewId = fakeEntities['entity_view'].id
+        fakeSyn.calls.clear()
+        fakeSyn.latency = 0.2
+        start = time.time()
+        p = annotator.Pipeline(fakeSyn, view=viewId, meta=viewId)
+        assert time.time() - start < 0.2
+        assert p.view.shape == p._meta.shape
+        # entity, query and meta entity, query
+        assert time.time() - start < 0.2 * 3.5
+        assert fakeSyn.calls['get'] == 2
+        assert p._entityViewSchema.id == viewId
+
+    def test_init_error_on_access(self, fakeSyn):
+        p = annotator.Pipeline(fakeSyn, view='syn0')
+        with pytest.raises(Exception):
+            p.view
+
+    def test_publish(self, fakeSyn, pipeline, fakeEntities):
+        oldIndex = list(pipeline.view.index)
+        pipeline.addDefaultValues({'color': 'blue'})
+        pipeline.publish(validate=False)
+        assert list(pipeline.view.index) != oldIndex
+        online = annotator.utils.synread(
+                fakeSyn, fakeEntities['entity_view'].id)
+        assert list(online.color) == ['blue'] * 3
+        assert list(pipeline.view.index) == list(online.index)
+        assert list(pipeline.view.etag) == list(online.etag)
+
+    def test_publish_background(self, fakeSyn, pipeline, fakeEntities):
+        oldIndex = list(pipeline.view.index)
+        pipeline.addDefaultValues({'color': 'blue'})
+        fakeSyn.latency = 0.1
+        handle = pipeline.publish(validate=False, background=True)
+        assert not handle.done()
+        pipeline.substituteColumnValues('color', {'blue': 'green'})
+        assert handle.result() == fakeEntities['entity_view'].id
+        assert handle.progress == 1.0 and handle.stage == 'done'
+        assert list(pipeline.view.index) != oldIndex
+        assert list(pipeline.view.color) == ['green'] * 3
+        online = annotator.utils.synread(
+                fakeSyn, fakeEntities['entity_view'].id)
+        assert list(online.color) == ['blue'] * 3
+
+    def test_publish_background_cancel(self, fakeSyn, pipeline):
+        oldIndex = list(pipeline.view.index)
+        fakeSyn.latency = 0.1
+        handle = pipeline.publish(validate=False, background=True)
+        assert handle.cancel()
+        with pytest.raises(concurrent.futures.CancelledError):
+            handle.result()
+        assert list(pipeline.view.index) == oldIndex
+
+    def test_addView(self, fakeSyn, pipeline, fakeEntities):
+        folder = fakeSyn.store(synapseclient.Folder(
+                'more', parent=fakeEntities['project']))
+        for i in range(2):
+            f = synapseclient.File(path=conftest.SAMPLE_FILE,
+                                   name="more{}.csv".format(i), parent=folder)
+            f['color'] = 'blue'
+            fakeSyn.store(f)
+        oldIndex = list(pipeline.view.index)
+        pipeline.substituteColumnValues('color', {'red': 'crimson'})
+        pipeline.addView(folder.id)
+        assert list(pipeline.view.index[:3]) == oldIndex
+        assert list(pipeline.view.color) == ['crimson'] * 3 + ['blue'] * 2
+        assert len(pipeline._index) == 5
+        pipeline.addView(fakeEntities['project'].id)  # overlaps the scope
+        assert pipeline.view.shape[0] == 5
+        pipeline.publish(validate=False)
+        online = annotator.utils.synread(
+                fakeSyn, pipeline._entityViewSchema.id)
+        assert sorted(online.color) == ['blue'] * 2 + ['crimson'] * 3
+
+    def test_save_load(self, fakeSyn, pipeline, fakeEntities, tmpdir):
+        pipeline.addActiveCols('color')
+        pipeline.substituteColumnValues('color', {'red': 'crimson'})
+        pipeline.save(str(tmpdir.join('session')))
+        fakeSyn.calls.clear()
+        p = annotator.Pipeline.load(str(tmpdir.join('session')), fakeSyn)
+        assert not fakeSyn.calls
+        pandas.testing.assert_frame_equal(p.view, pipeline.view)
+        assert list(p._index) == list(pipeline.view.index)
+        assert p._activeCols == ['color']
+        assert p.operations() == pipeline.operations()
+        assert p._entityViewSchema.id == fakeEntities['entity_view'].id
+        assert isinstance(p._entityViewSchema.ignoredAnnotationColumnNames,
+                          set)
+        p.publish(validate=False)
+        online = annotator.utils.synread(
+                fakeSyn, fakeEntities['entity_view'].id)
+        assert list(online.color) == ['crimson'] * 3
+
+    def test_load_check(self, fakeSyn, pipeline, fakeEntities, tmpdir):
+        path = str(tmpdir.join('session'))
+        pipeline.save(path)
+        annotator.Pipeline.load(path, fakeSyn, check=True)
+        fakeSyn.store(fakeSyn.get(fakeEntities['entity_view'].id))
+        with pytest.raises(ValueError):
+            annotator.Pipeline.load(path, fakeSyn, check=True)
+
+    def test_substituteColumnValues(self, pipeline):
+        pipeline.substituteColumnValues('color', {'red': 'crimson'})
+        assert list(pipeline.view.color) == ['crimson'] * 3
+        pipeline.undo()
+        assert list(pipeline.view.color) == ['red'] * 3
+
+    def test_drop_columns(self, fakeSyn, pipeline, fakeEntities):
+        pipeline.drop('color', axis=1)
+        assert 'color' not in pipeline.view.columns
+        pipeline.commitSchema()
+        cols = fakeSyn.getTableColumns(fakeEntities['entity_view'].id)
+        assert 'color' not in [c['name'] for c in cols]
+
+    def test_schema_changes_coalesced(self, fakeSyn, pipeline, fakeEntities):
+        viewId = fakeEntities['entity_view'].id
+        folder = fakeSyn.store(synapseclient.Folder(
+                'more', parent=fakeEntities['project']))
+        pipeline.drop(['color', 'type'], axis=1)
+        pipeline.addColumns({'assay': 'rnaSeq'})
+        pipeline.addView(folder.id, fetch=False)
+        pipeline.drop('etag', axis=1)
+        names = [c['name'] for c in fakeSyn.getTableColumns(viewId)]
+        assert 'color' in names and 'assay' not in names
+        fakeSyn.calls.clear()
+        pipeline.addDefaultValues({'assay': 'rnaSeq'})
+        pipeline.publish(validate=False)
+        assert fakeSyn.calls['store'] == 2  # the schema, then the rows
+        names = [c['name'] for c in fakeSyn.getTableColumns(viewId)]
+        assert 'assay' in names
+        assert not {'color', 'type', 'etag'} & set(names)
+        assert folder.id in fakeSyn.get(viewId).scopeIds
+        online = annotator.utils.synread(fakeSyn, viewId)
+        assert list(online.assay) == ['rnaSeq'] * 3
+
+    def test_optimizeColumns(self, fakeSyn, pipeline, fakeEntities):
+        viewId = fakeEntities['entity_view'].id
+        pipeline.addColumns({'assay': 'rnaSeq', 'count': None})
+        pipeline.addDefaultValues({'assay': 'rnaSeq', 'count': '12'})
+        proposal = pipeline.optimizeColumns(['assay', 'count'])
+        assert list(proposal.newColumnType) == ['STRING', 'INTEGER']
+        assert proposal.newMaximumSize['assay'] == 50
+        pipeline.addActiveCols(['assay', 'count'])
+        pipeline.publish(validate=False, optimize=True)
+        columns = {c['name']: c for c in fakeSyn.getTableColumns(viewId)}
+        assert columns['assay']['maximumSize'] == 50
+        assert columns['count']['columnType'] == 'INTEGER'
+        assert not pipeline.optimizeColumns(['assay', 'count']).changed.any()
+
+    def test_createFileView(self, fakeSyn, fakeEntities):
+        p = annotator.Pipeline(fakeSyn)
+        viewId = p.createFileView(
+                name='view', parent=fakeEntities['project'].id,
+                scope=fakeEntities['folder'].id,
+                addCols={'assay': 'rnaSeq', 'tissue': None})
+        assert viewId != fakeEntities['entity_view'].id
+        assert list(p.view.assay) == ['rnaSeq'] * 3
+        assert 'tissue' in p._activeCols
+        p.publish(validate=False)
+        online = annotator.utils.synread(fakeSyn, viewId)
+        assert list(online.assay) == ['rnaSeq'] * 3
+
+    def test_createFileView_lazy(self, fakeSyn, fakeEntities):
+        p = annotator.Pipeline(fakeSyn, view=pandas.DataFrame(
+                {'name': ['a.bam']}, index=['0_1']), lazy=True)
+        p.addDefaultValues({'tissue': 'PFC'})
+        p.createFileView(
+                name='view', parent=fakeEntities['project'].id,
+                scope=fakeEntities['folder'].id)
+        assert p._plan == [] and 'tissue' not in p.view.columns
+        p.undo()
+        assert list(p.view.tissue) == ['PFC']
+
+    def test_createFileView_background(self, fakeSyn, fakeEntities,
+                                       monkeypatch):
+        monkeypatch.setattr(annotator.utils, 'POLL_INTERVAL', 0)
+        p = annotator.Pipeline(fakeSyn)
+        fakeSyn.latency = 0.1
+        handle = p.createFileView(
+                name='view', parent=fakeEntities['project'].id,
+                scope=fakeEntities['folder'].id, addCols={'assay': 'rnaSeq'},
+                wait=False)
+        assert not handle.done()
+        assert handle.result() == p._entityViewSchema.id
+        assert handle.rows == 3 and handle.stage == 'done'
+        assert list(p.view.assay) == ['rnaSeq'] * 3
+        assert list(p._index) == list(p.view.index)
+        expected = annotator.utils.synread(fakeSyn, handle.viewId)
+        assert list(p.view.index) == list(expected.index)
+        assert list(p.view.columns) == list(expected.columns)
+        assert p._ops[-1] == {'op': 'addDefaultValues',
+                              'args': {'colVals': {'assay': 'rnaSeq'}}}
+
+    def test_createFileView_background_empty_sqlite(self, fakeSyn,
+                                                    fakeEntities,
+                                                    monkeypatch):
+        monkeypatch.setattr(annotator.utils, 'POLL_INTERVAL', 0)
+        folder = fakeSyn.store(synapseclient.Folder(
+                'empty', parent=fakeEntities['project']))
+        p = annotator.Pipeline(fakeSyn, backend='sqlite')
+        handle = p.createFileView(
+                name='view', parent=fakeEntities['project'].id,
+                scope=folder.id, addCols={'assay': 'rnaSeq'}, wait=False)
+        assert handle.result(timeout=5) == p._entityViewSchema.id
+        assert handle.rows == 0 and handle.stage == 'done'
+        assert len(p.view) == 0 and 'assay' in p.view.columns
@@ -0,0 +1,177 @@
+import pytest
+import pandas
+import annotator
+from annotator import backends
+from annotator import runner
+from . import conftest
+
+
+def _values(series):
+    return [v if pandas.notnull(v) else None for v in series]
+
+
+@pytest.fixture
+def frame():
+    return pandas.DataFrame(
+            {'name': ['a_1.fastq.gz', 'b_2.bam', 'c_3.txt', None],
+             'group': ['g1', 'g1', 'g2', 'g2'],
+             'tissue': [None, 'PFC', 'ACC', 'STG']},
+            index=['1_1', '2_1', '3_1', '4_1'])
+
+
+@pytest.fixture
+def view(frame):
+    return backends.SqliteView.fromFrame(frame, chunkSize=3)
+
+
+def test_roundtrip(frame, view):
+    assert view.shape == frame.shape
+    assert list(view.columns) == list(frame.columns)
+    assert [len(c) for c in view.chunks()] == [3, 1]
+    pandas.testing.assert_frame_equal(view.toFrame().fillna('-'),
+                                      frame.fillna('-'), check_dtype=False)
+    assert list(view.head(2).index) == ['1_1', '2_1']
+    assert list(view.tail(2).index) == ['3_1', '4_1']
+
+
+def test_operations_match_utils(frame, view):
+    regex = annotator.utils.FILE_FORMAT_REGEX
+    view.capture('name', 'fileFormat', regex)
+    assert _values(view['fileFormat']) == annotator.utils.colFromRegex(
+            frame.name.values, regex)
+    mod = {'fastq': 'FASTQ', 'txt': 'TXT'}
+    view.substitute('fileFormat', mod)
+    assert _values(view['fileFormat']) == \
+        annotator.utils.substituteColumnValues(
+            annotator.utils.colFromRegex(frame.name.values, regex), mod)
+    view.infer('tissue', 'group')
+    assert list(view['tissue']) == ['PFC', 'PFC', 'ACC', 'STG']
+
+
+def test_unmatched_and_transfer(view):
+    meta = pandas.DataFrame({'key': ['a', 'b'], 'age': [30, 40]})
+    count, sample = view.unmatched('name', r'^(\w)_', meta.key)
+    assert count == 2 and sample[0] == ('c', 'c_3.txt')
+    view.capture('name', 'key', r'^(\w)_')
+    view.transfer(meta, {'age': 'age'}, 'key')
+    assert list(view['age'].fillna(0)) == [30, 40, 0, 0]
+
+
+def test_transferLinks_how(frame):
+    p = annotator.Pipeline(None, view=frame, backend='sqlite',
+                           meta=pandas.DataFrame({'group': ['g1'],
+                                                  'region': ['PFC']}))
+    p.addLinks({'tissue': 'region'})
+    backups = len(p._backup)
+    for how in ('inner', 'right', 'outer'):
+        with pytest.raises(ValueError, match=how):
+            p.transferLinks(on='group', how=how)
+    assert len(p._backup) == backups and p.operations() == [
+        {'op': 'addLinks', 'args': {'links': {'tissue': 'region'},
+                                    'append': True}}]
+    p.transferLinks(on='group', dropOn=False)
+    assert _values(p.view['tissue']) == ['PFC', 'PFC', None, None]
+
+
+def test_snapshot_and_drop(view):
+    snapshot = view.snapshot()
+    view.drop('tissue', axis=1).drop(['1_1'])
+    assert view.shape == (3, 2)
+    assert snapshot.shape == (4, 3)
+    snapshot.discard()
+
+
+def test_pipeline(fakeSyn):
+    entities = conftest.fake_entities(fakeSyn, annotations={'tissue': 'x'})
+    p = annotator.Pipeline(fakeSyn, view=entities['entity_view'].id,
+                           backend='sqlite')
+    assert isinstance(p.view, backends.SqliteView)
+    p.addActiveCols('tissue')
+    p.substituteColumnValues('tissue', {'x': 'PFC'})
+    p.undo()
+    assert list(p.view['tissue']) == ['x'] * 3
+    p.substituteColumnValues('tissue', {'x': 'PFC'})
+    assert p._validate() == []
+    p.publish(validate=False)
+    online = annotator.utils.synread(fakeSyn, entities['entity_view'].id)
+    assert list(online.tissue) == ['PFC'] * 3
+
+
+def test_append(view):
+    rows = pandas.DataFrame({'name': ['e_5.txt', 'x.txt'], 'assay': ['a', 'b']},
+                            index=['5_1', '1_2'])
+    assert view.append(rows) == 1
+    frame = view.toFrame()
+    assert list(frame.index) == ['1_1', '2_1', '3_1', '4_1', '5_1']
+    assert list(frame.name)[0] == 'a_1.fastq.gz'
+    assert _values(frame.assay) == [None] * 4 + ['a']
+
+
+def test_relabel(view):
+    view.relabel(pandas.DataFrame({'group': ['g3', 'g5']},
+                                  index=['3_2', '5_1']))
+    frame = view.toFrame()
+    assert list(frame.index) == ['1_1', '2_1', '3_2', '4_1']
+    assert list(frame.group) == ['g1', 'g1', 'g3', 'g2']
+
+
+def test_profile(frame):
+    frame['size'] = ['10', '02', None, '-3']
+    view = backends.SqliteView.fromFrame(frame)
+    cols = list(frame.columns)
+    pandas.testing.assert_frame_equal(
+            view.profile(cols), annotator.utils.profileColumns(frame, cols),
+            check_dtype=False)
+
+
+def test_pipeline_publish_background(fakeSyn):
+    entities = conftest.fake_entities(fakeSyn, annotations={'tissue': 'x'})
+    p = annotator.Pipeline(fakeSyn, view=entities['entity_view'].id,
+                           backend='sqlite')
+    oldIndex = list(p.view.toFrame().index)
+    handle = p.publish(validate=False, background=True)
+    p.drop(oldIndex[-1], axis=0)
+    p.substituteColumnValues('tissue', {'x': 'PFC'})
+    p.addDefaultValues({'assay': 'rnaSeq'})
+    handle.result()
+    view = p.view.toFrame()
+    assert len(view) == 2 and not set(view.index) & set(oldIndex)
+    assert list(view.tissue) == ['PFC'] * 2
+    assert list(view.assay) == ['rnaSeq'] * 2
+
+
+def test_pipeline_save_load(fakeSyn, tmpdir):
+    entities = conftest.fake_entities(fakeSyn, annotations={'tissue': 'x'})
+    p = annotator.Pipeline(fakeSyn, view=entities['entity_view'].id,
+                           backend='sqlite')
+    p.substituteColumnValues('tissue', {'x': 'PFC'})
+    path = str(tmpdir.join('session'))
+    p.save(path)
+    loaded = annotator.Pipeline.load(path, fakeSyn)
+    assert isinstance(loaded.view, backends.SqliteView)
+    loaded.drop('tissue', axis=1)
+    pandas.testing.assert_frame_equal(
+            annotator.Pipeline.load(path, fakeSyn).view.toFrame(),
+            p.view.toFrame())
+
+
+def test_runSpec_backends_agree(fakeSyn):
+    results = []
+    for backend in backends.BACKENDS:
+        entities = conftest.fake_entities(
+                fakeSyn, annotations={'tissue': 'unknown'})
+        spec = {'name': backend, 'view': entities['entity_view'].id,
+                'backend': backend,
+                'meta': pandas.DataFrame({'specimenID': ['file0', 'file1'],
+                                          'tissue': ['PFC', 'ACC']}),
+                'keyCol': {'data': 'name', 'meta': 'specimenID',
+                           'regex': r'^(file\d)\.csv$'},
+                'links': {'tissue': 'tissue'}, 'transferLinks': True,
+                'fileFormat': True, 'publish': True}
+        result = runner.runSpec(fakeSyn, spec, confirm=True)
+        assert result['warnings'] == ['tissue has null values.']
+        online = annotator.utils.synread(fakeSyn, spec['view'])
+        results.append(online.drop(['id', 'etag', 'parentId', 'projectId',
+                                    'benefactorId', 'createdOn'], axis=1))
+    pandas.testing.assert_frame_equal(results[0].reset_index(drop=True),
+                                      results[1].reset_index(drop=True))
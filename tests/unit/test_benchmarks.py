@@ -0,0 +1,22 @@
+from benchmarks import run, compare
+
+
+def test_run_and_compare(tmpdir, capsys):
+    output = str(tmpdir.join("results.json"))
+    report = run.main(['--sizes', '50', '--cardinality', '10', '-o', output])
+    assert len(report['results']) == len(run.OPERATIONS)
+    assert all(r['wall'] >= 0 and r['peak_memory'] > 0
+               for r in report['results'])
+    assert compare.main([output, output]) == 0
+
+
+def test_compare_flags_regressions():
+    base = {('addKeyCol', 1000): {'wall': 1.0, 'peak_memory': 100}}
+    head = {('addKeyCol', 1000): {'wall': 2.0, 'peak_memory': 100}}
+    rows = compare.compare(base, head, threshold=1.25)
+    regressed = [r[2] for r in rows if r[-1]]
+    assert regressed == ['wall']
+    # tiny timings are noise
+    base[('addKeyCol', 1000)]['wall'] = 0.001
+    head[('addKeyCol', 1000)]['wall'] = 0.002
+    assert not any(r[-1] for r in compare.compare(base, head))
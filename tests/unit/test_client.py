@@ -0,0 +1,143 @@
+import pytest
+from annotator import client
+from annotator import utils
+from . import conftest
+
+
+class HTTPError(Exception):
+    def __init__(self, status, headers=None):
+        super(HTTPError, self).__init__(status)
+        self.response = type('Response', (object,), {
+            'status_code': status, 'headers': headers or {}})()
+
+
+class Syn(object):
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.calls = 0
+
+    def get(self, synId):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return synId
+
+    store = get
+
+
+class TestClient(object):
+    def test_retries_throttling(self):
+        syn = Syn([HTTPError(429), HTTPError(503, {'Retry-After': '0'})])
+        c = client.Client(syn, backoff=0)
+        limit = c.limiter.limit
+        assert c.get('syn1') == 'syn1'
+        assert syn.calls == 3
+        assert c.limiter.limit < limit
+
+    def test_does_not_retry_client_errors(self):
+        syn = Syn([HTTPError(404)])
+        c = client.Client(syn, backoff=0)
+        with pytest.raises(HTTPError):
+            c.get('syn1')
+        assert syn.calls == 1
+
+    def test_gives_up(self):
+        syn = Syn([HTTPError(503)] * 3)
+        c = client.Client(syn, maxRetries=2, backoff=0)
+        with pytest.raises(HTTPError):
+            c.get('syn1')
+        assert syn.calls == 3
+
+    def test_writes_retry_only_throttling(self):
+        syn = Syn([HTTPError(429), HTTPError(503)])
+        c = client.Client(syn, backoff=0)
+        with pytest.raises(HTTPError):
+            c.store('syn1')
+        assert syn.calls == 2
+
+    def test_caps_retry_after(self, monkeypatch):
+        delays = []
+        monkeypatch.setattr(client.time, 'sleep', delays.append)
+        syn = Syn([HTTPError(429, {'Retry-After': '3600'})])
+        c = client.Client(syn, maxBackoff=5)
+        assert c.get('syn1') == 'syn1'
+        assert delays == [5]
+
+    def test_map_ordered_and_nested(self):
+        c = client.Client(Syn([]), limiter=client.AdaptiveLimiter(initial=1))
+        ids = ['syn{}'.format(i) for i in range(20)]
+        assert c.map(c.get, ids) == ids
+
+    def test_wraps_share_limiter_and_pool(self):
+        import requests
+        syn = Syn([])
+        syn._requests_session = requests.Session()
+        c = client.wrap(syn)
+        adapter = syn._requests_session.get_adapter('https://')
+        assert client.wrap(syn).limiter is c.limiter
+        assert syn._requests_session.get_adapter('https://') is adapter
+
+    def test_wrap_is_idempotent(self):
+        c = client.wrap(Syn([]))
+        assert client.wrap(c) is c
+        assert client.wrap(None) is None
+        assert c.failures == []
+
+    def test_lazy(self):
+        created = []
+
+        def login():
+            created.append(Syn([]))
+            return created[-1]
+        c = client.lazy(login, backoff=0)
+        assert created == []
+        assert c.get('syn1') == 'syn1'
+        assert c.get('syn2') == 'syn2'
+        assert len(created) == 1 and created[0].calls == 2
+
+
+class TestMetadataCache(object):
+    @pytest.fixture
+    def entities(self, fakeSyn):
+        return conftest.fake_entities(fakeSyn)
+
+    def test_schemas_and_columns(self, fakeSyn, entities):
+        viewId = entities['entity_view'].id
+        c = client.Client(fakeSyn)
+        assert c.get(viewId).id == viewId
+        cols = c.getTableColumns(viewId)
+        fakeSyn.calls.clear()
+        schema = client.Client(fakeSyn).get(viewId)  # shared by Clients
+        assert [col['id'] for col in c.getTableColumns(viewId)] == \
+            [col['id'] for col in cols]
+        assert not fakeSyn.calls
+        schema.removeColumn(cols[0])
+        c.store(schema)
+        assert len(c.getTableColumns(viewId)) == len(cols) - 1
+        assert fakeSyn.calls['getTableColumns'] == 1
+        assert c.get(viewId).etag != entities['entity_view'].etag
+        assert fakeSyn.calls['get'] == 0
+
+    def test_default_columns(self, fakeSyn, entities):
+        scope = [entities['folder'].id]
+        c = client.Client(fakeSyn)
+        cols = utils.getDefaultColumnsForScope(c, scope)
+        assert utils.getDefaultColumnsForScope(c, scope) == cols
+        assert fakeSyn.calls['restPOST'] == 1
+        f = entities['files'][0]
+        f['tissue'] = 'PFC'
+        c.store(f)
+        names = [col['name'] for col in
+                 utils.getDefaultColumnsForScope(c, scope)]
+        assert 'tissue' in names and fakeSyn.calls['restPOST'] == 2
+
+    def test_persist(self, fakeSyn, entities, tmpdir):
+        viewId = entities['entity_view'].id
+        c = client.Client(fakeSyn, metadata=client.MetadataCache(
+                persist=True, root=str(tmpdir)))
+        c.get(viewId)
+        cols = c.getTableColumns(viewId)
+        c.metadata.clear()
+        c.get(viewId)
+        assert len(c.getTableColumns(viewId)) == len(cols)
+        assert fakeSyn.calls['getTableColumns'] == 1
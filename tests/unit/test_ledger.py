@@ -0,0 +1,99 @@
+import json
+import threading
+import pytest
+import requests
+import http.server
+from annotator import client, ledger, trace
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    failures = []
+
+    def do_GET(self):
+        status = self.failures.pop(0) if self.failures else 200
+        body = b'{"ok": true}'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield "http://127.0.0.1:{}".format(httpd.server_port)
+    httpd.shutdown()
+
+
+@pytest.fixture
+def recording():
+    ledger.reset()
+    trace.reset()
+    ledger.enable()
+    yield
+    ledger.disable()
+    trace.disable()
+    ledger.reset()
+    trace.reset()
+
+
+class Syn(object):
+    def __init__(self, url):
+        self.url = url
+
+    def restGET(self, uri):
+        response = requests.get(self.url + uri)
+        response.raise_for_status()
+        return response.json()
+
+
+@trace.traced(name='operation')
+def operation(syn):
+    return syn.map(syn.restGET, ['/entity/syn123', '/entity/syn456/bundle'])
+
+
+def test_endpoint():
+    assert (ledger.endpoint("https://repo-prod.prod.sagebase.org/repo/v1/"
+                            "entity/syn123.4/table/query/async/get/"
+                            "1234?mask=5")
+            == "repo-prod.prod.sagebase.org/repo/v1/entity/{id}/table/query"
+               "/async/get/{n}")
+
+
+def test_requests_are_attributed(server, recording):
+    syn = client.Client(Syn(server), backoff=0)
+    Handler.failures = [503]
+    assert operation(syn) == [{'ok': True}] * 2
+    entries = ledger.entries()
+    assert len(entries) == 3
+    assert {e['operation'] for e in entries} == {'operation'}
+    assert sorted(e['attempt'] for e in entries) == [0, 0, 1]
+    assert all(e['received'] == 12 for e in entries)
+    summary = ledger.summary(by=['operation', 'endpoint'])
+    host = server.split('//')[1]
+    assert summary.loc[('operation', host + '/entity/{id}'), 'requests'] in (1, 2)
+    assert summary.requests.sum() == 3
+    assert summary.retries.sum() == 1
+    assert summary.errors.sum() == 1
+
+
+def test_export(server, recording, tmpdir):
+    requests.get(server + '/unattributed')
+    path = str(tmpdir.join('ledger.json'))
+    ledger.export(path)
+    with open(path) as f:
+        report = json.load(f)
+    assert report['requests'][0]['operation'] is None
+    assert report['summary'][0]['requests'] == 1
+
+
+def test_disabled(server):
+    ledger.reset()
+    requests.get(server + '/unrecorded')
+    assert ledger.entries() == []
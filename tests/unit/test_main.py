@@ -0,0 +1,223 @@
+import json
+import os
+import sys
+import tempfile
+import subprocess
+import pandas
+import pytest
+import requests
+import synapseclient
+from annotator import __main__
+from . import conftest
+
+
+class TestSidecarAnnotations(object):
+    def _tree(self):
+        root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(root, 'a', 'b'))
+        os.makedirs(os.path.join(root, 'c'))
+        sidecars = {'': {'study': 'EpiDiff', 'assay': 'rnaSeq'},
+                    'a': {'assay': 'ChIPSeq'},
+                    os.path.join('a', 'b'): {'tissue': 'PFC'}}
+        for d, annotations in sidecars.items():
+            with open(os.path.join(root, d, 'annotations.json'), 'w') as f:
+                json.dump(annotations, f)
+        for f in ['top.txt', 'a/one.txt', 'a/b/two.txt', 'c/three.txt']:
+            open(os.path.join(root, f), 'w').close()
+        return root
+
+    def test__getSidecarAnnotations(self):
+        root = self._tree()
+        _, file_list = __main__._getLists(root, None)
+        files, values = __main__._getSidecarAnnotations(
+                file_list, root, 'annotations.json')
+        result = {os.path.relpath(f, root): v for f, v in zip(files, values)}
+        assert result == {
+                'top.txt': {'study': 'EpiDiff', 'assay': 'rnaSeq'},
+                'a/one.txt': {'study': 'EpiDiff', 'assay': 'ChIPSeq'},
+                'a/b/two.txt': {'study': 'EpiDiff', 'assay': 'ChIPSeq',
+                                'tissue': 'PFC'},
+                'c/three.txt': {'study': 'EpiDiff', 'assay': 'rnaSeq'}}
+
+    def test_create_sync_manifest_with_annotations(self, tmpdir):
+        root = self._tree()
+        dir_list, file_list = __main__._getLists(root, None)
+        files, values = __main__._getSidecarAnnotations(
+                file_list, root, 'annotations.json')
+        synapse_dir = {d: 'syn{}'.format(i) for i, d in enumerate(dir_list)}
+        with tmpdir.as_cwd():
+            __main__.create_sync_manifest(files, ['used', 'executed'],
+                                          synapse_dir, root, None,
+                                          annotations=values)
+            manifest = pandas.read_csv('annotations_manifest.csv')
+        assert list(manifest.columns[:5]) == ['path', 'name', 'parent',
+                                              'used', 'executed']
+        assert set(manifest.columns[5:]) == {'study', 'assay', 'tissue'}
+        two = manifest[manifest.name == 'two.txt'].iloc[0]
+        assert two.assay == 'ChIPSeq' and two.tissue == 'PFC'
+        assert (manifest.study == 'EpiDiff').all()
+
+
+class TestAnnotationKeys(object):
+    JSON = '[{"name": "assay", "enumValues": []},\n {"name": "tissue"}]'
+
+    def test__jsonKeys(self):
+        assert __main__._jsonKeys(self.JSON) == ['assay', 'tissue']
+        assert __main__._jsonKeys(' [ ] ') == []
+        chunks = [self.JSON[i:i + 3] for i in range(0, len(self.JSON), 3)]
+        assert __main__._jsonKeys(chunks) == ['assay', 'tissue']
+        with pytest.raises(ValueError):
+            __main__._jsonKeys(self.JSON[:20])
+
+    def test__getAnnotationKey_local_and_non_json(self, tmpdir):
+        path = tmpdir.join('module.json')
+        path.write(self.JSON)
+        other = tmpdir.join('module.csv')
+        other.write('name\nassay')
+        result = __main__._getAnnotationKey([str(path), str(other)])
+        assert result == ['used', 'executed', 'assay', 'tissue']
+        truncated = tmpdir.join('truncated.json')
+        truncated.write(self.JSON[:20])
+        result = __main__._getAnnotationKey([str(truncated), str(path)])
+        assert result == ['used', 'executed', 'assay', 'tissue']
+
+    def test__fetchAnnotationKeys_cached(self, tmpdir, monkeypatch):
+        class Response(object):
+            status_code = 200
+            headers = {'ETag': '"abc"'}
+            encoding = 'utf-8'
+            text = self.JSON
+
+            def raise_for_status(self):
+                pass
+
+            def iter_content(self, size, decode_unicode=False):
+                return iter([self.text[:10], self.text[10:]])
+
+            def close(self):
+                pass
+
+        calls = []
+
+        def get(url, headers, stream=False):
+            calls.append(headers)
+            return Response()
+
+        monkeypatch.setattr(requests, 'get', get)
+        annotation_cache = __main__.cache.DiskCache('test', str(tmpdir))
+        url = 'https://example.org/module.json'
+        assert __main__._fetchAnnotationKeys(url, annotation_cache) \
+            == ['assay', 'tissue']
+        assert __main__._fetchAnnotationKeys(url, annotation_cache) \
+            == ['assay', 'tissue']
+        assert len(calls) == 1
+        Response.status_code = 304
+        assert __main__._fetchAnnotationKeys(url, annotation_cache, ttl=0) \
+            == ['assay', 'tissue']
+        assert calls[-1] == {'If-None-Match': '"abc"'}
+        annotation_cache.set(url, {'keys': 'corrupt'})
+        Response.status_code = 200
+        assert __main__._fetchAnnotationKeys(url, annotation_cache) \
+            == ['assay', 'tissue']
+        assert calls[-1] == {}
+        Response.text = self.JSON[:20]
+        with pytest.raises(ValueError, match=url):
+            __main__._fetchAnnotationKeys(url, annotation_cache, ttl=0)
+        assert url not in annotation_cache
+
+
+class TestUpdateTable(object):
+    def test_updateTable_upserts(self, fakeSyn):
+        project = fakeSyn.store(synapseclient.Project('project'))
+        cols = [synapseclient.Column(name=n, columnType='STRING')
+                for n in ['key', 'value', 'module', 'description']]
+        table = fakeSyn.store(synapseclient.Schema(
+                name='annotations', columns=cols, parent=project))
+        old = pandas.DataFrame({'key': ['a', 'a', 'b'],
+                                'value': ['1', '2', '3'],
+                                'module': ['m'] * 3,
+                                'description': ['x', 'y', 'z']})
+        fakeSyn.store(synapseclient.Table(table.id, old))
+        new = pandas.DataFrame({'key': ['a', 'b', 'c'],
+                                'value': ['1', '3', '4'],
+                                'module': ['m'] * 3,
+                                'description': ['x', 'zz', 'w']})
+        __main__.updateTable(fakeSyn, table.id, new, 'v1.0.0')
+        result = fakeSyn.tableQuery(
+                "select * from {}".format(table.id)).asDataFrame()
+        result = result.sort_values('key').reset_index(drop=True)
+        pandas.testing.assert_frame_equal(result[new.columns], new)
+        annotations = fakeSyn.get(table.id).annotations
+        assert annotations['annotationReleaseVersion'] == 'v1.0.0'
+
+    def test_updateTable_marks_release_last(self, fakeSyn, monkeypatch):
+        project = fakeSyn.store(synapseclient.Project('project'))
+        cols = [synapseclient.Column(name=n, columnType='STRING')
+                for n in ['key', 'value', 'module']]
+        table = fakeSyn.store(synapseclient.Schema(
+                name='annotations', columns=cols, parent=project))
+        new = pandas.DataFrame({'key': ['a', 'b'], 'value': ['1', '2'],
+                                'module': ['m'] * 2})
+        store = fakeSyn.store
+
+        def failingStore(obj, *args, **kwargs):
+            if isinstance(obj, synapseclient.table.TableAbstractBaseClass):
+                raise RuntimeError("upload failed")
+            return store(obj, *args, **kwargs)
+        monkeypatch.setattr(fakeSyn, 'store', failingStore)
+        with pytest.raises(RuntimeError):
+            __main__.updateTable(fakeSyn, table.id, new, 'v1.0.0')
+        annotations = fakeSyn.get(table.id).annotations
+        assert 'annotationReleaseVersion' not in annotations
+
+
+class TestStartup(object):
+    HEAVY = ['pandas', 'synapseclient', 'synapseutils', 'requests',
+             'readline']
+    IMPORT_BUDGET = 0.5  # seconds
+
+    def _run(self, code):
+        return subprocess.check_output(
+                [sys.executable, '-X', 'importtime', '-c', code],
+                stderr=subprocess.STDOUT,
+                cwd=os.path.dirname(os.path.dirname(os.path.dirname(
+                    os.path.abspath(__file__))))).decode()
+
+    def test_no_heavy_imports(self):
+        output = self._run(
+                "import sys, annotator, annotator.__main__; "
+                "print([m for m in {!r} if m in sys.modules])".format(
+                    self.HEAVY))
+        assert output.strip().splitlines()[-1] == '[]'
+
+    def test_import_budget(self):
+        output = self._run("import annotator.__main__")
+        # import time: self [us] | cumulative [us] | package
+        cumulative = [int(line.split('|')[1]) for line in output.splitlines()
+                      if line.startswith('import time:') and
+                      line.split('|')[2].strip() == 'annotator.__main__']
+        assert cumulative and cumulative[0] / 1e6 < self.IMPORT_BUDGET
+
+    def test_no_command_does_not_login(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(__main__, 'synapseLogin',
+                            lambda: calls.append(1))
+        monkeypatch.setattr(sys, 'argv', ['annotator'])
+        __main__.main()
+        assert calls == []
+
+
+class TestRun(object):
+    def test_run(self, fakeSyn, tmpdir, capsys):
+        entities = conftest.fake_entities(fakeSyn, annotations={'assay': 'x'})
+        spec = tmpdir.join('spec.json')
+        spec.write(json.dumps({'view': entities['entity_view'].id,
+                               'defaults': {'assay': 'rnaSeq'},
+                               'publish': True}))
+        output = str(tmpdir.join('results.json'))
+        args = __main__.buildParser().parse_args(
+                ['run', str(spec), '--jobs', '2', '-o', output])
+        __main__.run(args, fakeSyn)
+        assert 'spec: published' in capsys.readouterr().out
+        with open(output) as f:
+            assert json.load(f)[0]['published']
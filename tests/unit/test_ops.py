@@ -0,0 +1,205 @@
+import pandas
+import pytest
+import annotator
+from annotator import ops
+
+
+def _view(n):
+    return pandas.DataFrame({
+        'name': ["sample{}_L{}.fastq".format(i % 4, i) for i in range(n)],
+        'cellType': ['Pos', 'Neg'] * (n // 2),
+        'tissue': [None] * n},
+        index=["{}_1".format(i) for i in range(n)])
+
+
+META = pandas.DataFrame({'specimenID': ["sample{}".format(i)
+                                        for i in range(4)],
+                         'brainRegion': ['PFC', 'ACC', 'STG', 'PFC']})
+
+
+def _session(p, monkeypatch):
+    monkeypatch.setattr(p, '_linkCols', lambda iters: {'name': 'specimenID'})
+    monkeypatch.setattr(p, '_inputDefault',
+                        lambda prompt, prefill='': r'^(sample\d)_')
+    p.addKeyCol()
+    p.addLinks({'tissue': 'brainRegion'})
+    p.transferLinks()
+    p.substituteColumnValues('cellType', {'Pos': 'NeuN+'})
+    p.substituteColumnValues('cellType', {'NeuN+': 'NeuNPos', 'Neg': 'NeuNNeg'})
+    p.addDefaultValues({'assay': 'rnaSeq'})
+    p.addDefaultValues({'consortium': 'PEC'})
+
+
+def test_record_and_replay(monkeypatch, tmpdir):
+    p = annotator.Pipeline(None, view=_view(8), meta=META)
+    _session(p, monkeypatch)
+    log = p.operations()
+    assert [o['op'] for o in log] == [
+        'addKeyCol', 'addLinks', 'transferLinks', 'substituteColumnValues',
+        'substituteColumnValues', 'addDefaultValues', 'addDefaultValues']
+    assert log[0]['args'] == {'dataKey': 'name', 'metaKey': 'specimenID',
+                              'regex': r'^(sample\d)_'}
+    path = str(tmpdir.join('session.json'))
+    p.exportOperations(path)
+
+    refreshed = annotator.Pipeline(None, view=_view(20), meta=META)
+    expected = annotator.Pipeline(None, view=_view(20), meta=META)
+    _session(expected, monkeypatch)
+    refreshed.replay(path)
+    pandas.testing.assert_frame_equal(refreshed.view, expected.view)
+    assert len(refreshed._backup) == 1
+    assert [o['op'] for o in refreshed.operations()][-2:] == [
+        'substituteColumnValues', 'addDefaultValues']
+    refreshed.undo()
+    assert 'assay' not in refreshed.view.columns
+
+
+def test_undo_forgets_operation():
+    p = annotator.Pipeline(None, view=_view(4), activeCols=['tissue'])
+    assert p.operations() == []
+    p.substituteColumnValues('cellType', {'Pos': 'NeuN+'})
+    p.undo()
+    assert p.operations() == []
+
+
+def test_fuse():
+    log = [{'op': 'addDefaultValues', 'args': {'colVals': {'a': 'x'}}},
+           {'op': 'substituteColumnValues',
+            'args': {'col': 'a', 'mod': {'x': 'y'}}},
+           {'op': 'substituteColumnValues',
+            'args': {'col': 'b', 'mod': {1: 2}}},
+           {'op': 'substituteColumnValues',
+            'args': {'col': 'b', 'mod': {2: 3, 4: 5}}},
+           {'op': 'addDefaultValues', 'args': {'colVals': {'b': 0}}},
+           {'op': 'addActiveCols', 'args': {'activeCols': ['a'],
+                                            'path': False, 'isMeta': False}},
+           {'op': 'addActiveCols', 'args': {'activeCols': ['b', 'a'],
+                                            'path': False, 'isMeta': False}}]
+    assert ops.fuse(log) == [
+        {'op': 'addDefaultValues', 'args': {'colVals': {'a': 'y', 'b': 0}}},
+        {'op': 'addActiveCols', 'args': {'activeCols': ['a', 'b'],
+                                         'path': False, 'isMeta': False}}]
+    assert ops._compose({1: 2}, {2: 3, 4: 5}) == {1: 3, 2: 3, 4: 5}
+
+
+def test_dump_load(tmpdir):
+    log = [{'op': 'substituteColumnValues',
+            'args': {'col': 'b', 'mod': {1: 2, 'x': None}}}]
+    path = str(tmpdir.join('log.json'))
+    ops.dump(log, path)
+    assert ops.load(path) == log
+
+
+def _transforms(p):
+    p.addDefaultValues({'assay': 'rnaSeq', 'tissue': 'PFC'})
+    p.substituteColumnValues('cellType', {'Pos': 'NeuN+'})
+    p.addFileFormatCol()
+    p.substituteColumnValues('assay', {'rnaSeq': 'RNA-seq'})
+    p.substituteColumnValues('cellType', {'Neg': 'NeuN-'})
+    p.addDefaultValues({'tissue': 'ACC', 'consortium': 'PEC'})
+    p.inferValues('fileFormat', 'cellType')
+
+
+def test_lazy_matches_eager():
+    eager = annotator.Pipeline(None, view=_view(8))
+    lazy = annotator.Pipeline(None, view=_view(8), lazy=True)
+    _transforms(eager)
+    _transforms(lazy)
+    assert 'assay' not in lazy.view.columns
+    assert len(lazy._backup) == 0
+    lazy.collect()
+    pandas.testing.assert_frame_equal(lazy.view, eager.view,
+                                      check_like=True, check_dtype=False)
+    assert len(lazy._backup) == 1
+    assert lazy.operations() == eager.operations()
+
+
+def test_optimize():
+    p = annotator.Pipeline(None, view=_view(4), lazy=True)
+    _transforms(p)
+    plan = ops.optimize(p._plan)
+    assert [o['op'] for o in plan] == [
+        'addDefaultValues', 'substituteColumnValues', 'addFileFormatCol',
+        'inferValues']
+    assert plan[0]['args']['colVals'] == {
+        'assay': 'RNA-seq', 'tissue': 'ACC', 'consortium': 'PEC'}
+    assert plan[1]['args']['mod'] == {'Pos': 'NeuN+', 'Neg': 'NeuN-'}
+    # an assignment read in between is kept
+    kept = ops.optimize([
+        {'op': 'addDefaultValues', 'args': {'colVals': {'a': 1}}},
+        {'op': 'inferValues', 'args': {'col': 'b', 'referenceCols': 'a'}},
+        {'op': 'addDefaultValues', 'args': {'colVals': {'a': 2}}}])
+    assert len(kept) == 3
+
+
+def test_lazy_explain_undo_and_flush(capsys):
+    p = annotator.Pipeline(None, view=_view(4), meta=META, lazy=True)
+    p.addDefaultValues({'assay': 'rnaSeq'})
+    p.addDefaultValues({'assay': 'ATACSeq'})
+    p.explain()
+    out = capsys.readouterr().out
+    assert "Deferred operations (2)" in out
+    assert "Optimized plan (1 operations" in out
+    p.undo()
+    assert len(p._plan) == 1 and len(p.operations()) == 1
+    # operations which can't be deferred run the plan first
+    p.addKeyCol('name', 'specimenID', r'^(sample\d)_')
+    assert p._plan == [] and list(p.view.assay) == ['rnaSeq'] * 4
+
+
+def test_lazy_reads_run_plan(capsys):
+    p = annotator.Pipeline(None, view=_view(4), lazy=True)
+    p.addDefaultValues({'assay': 'rnaSeq'})
+    p._activeCols = ['assay']
+    p.valueCounts()
+    assert p._plan == [] and "rnaSeq    4" in capsys.readouterr().out
+    p.addDefaultValues({'assay': 'ATACSeq'})
+    p.head()
+    assert p._plan == [] and "ATACSeq" in capsys.readouterr().out
+    assert list(p.view.assay) == ['ATACSeq'] * 4
+
+
+def test_replay_drops_by_id_and_runs_plan(monkeypatch):
+    view = _view(4)
+    view['id'] = ["syn{}".format(i) for i in range(4)]
+    p = annotator.Pipeline(None, view=view)
+    p.drop('1_1', axis=0)
+    _transforms(p)
+    assert p.operations()[0] == {'op': 'drop', 'args': {
+        'labels': None, 'axis': 0, 'ids': ['syn1']}}
+
+    refreshed = view.copy()
+    refreshed.index = ["{}_2".format(i) for i in range(4)]
+    replayed = annotator.Pipeline(None, view=refreshed)
+    executed = []
+    execute = ops.execute
+    monkeypatch.setattr(ops, 'execute', lambda view, plan: executed.append(
+        plan) or execute(view, plan))
+    replayed.replay(p.operations(), fuse=False)
+    assert list(replayed.view.index) == ['0_2', '2_2', '3_2']
+    assert len(executed) == 1 and len(executed[0]) == 4
+    expected = p.view.copy()
+    expected.index = list(replayed.view.index)
+    pandas.testing.assert_frame_equal(replayed.view, expected,
+                                      check_like=True, check_dtype=False)
+    assert replayed._plan == [] and not replayed._lazy
+
+
+def test_lazy_replay_undo_and_failure():
+    p = annotator.Pipeline(None, view=_view(4), lazy=True)
+    p.addDefaultValues({'assay': 'rnaSeq'})
+    log = [{'op': 'addDefaultValues', 'args': {'colVals': {'region': 'PFC'}}},
+           {'op': 'addDefaultValues', 'args': {'colVals': {'sex': 'F'}}}]
+    p.replay(log, fuse=False)
+    assert len(p._plan) == 2 and len(p.operations()) == 3
+    p.undo()
+    assert p._plan == [] and len(p.operations()) == 1
+    assert list(p.view.assay) == ['rnaSeq'] * 4
+    assert 'region' not in p.view.columns
+
+    backups = len(p._backup)
+    with pytest.raises(AttributeError):
+        p.replay(log + [{'op': 'noSuchOp', 'args': {}}], fuse=False)
+    assert p._plan == [] and len(p.operations()) == 1
+    assert len(p._backup) == backups and 'region' not in p.view.columns
+    assert p._lazy and not p._suspendBackup
@@ -0,0 +1,79 @@
+import pytest
+import numpy
+import pandas
+import annotator
+from annotator import parallel
+from annotator import utils
+
+
+@pytest.fixture(autouse=True)
+def partitionSmallViews(monkeypatch):
+    monkeypatch.setattr(parallel, 'MIN_ROWS', 0)
+
+
+@pytest.fixture
+def view():
+    n = 1000
+    return pandas.DataFrame({
+        'name': ["S{}_R{}.fastq.gz".format(i % 37, i) if i % 11 else None
+                 for i in range(n)],
+        'specimen': ["S{}".format(i % 37) for i in range(n)],
+        'tissue': [("PFC" if i % 37 < 30 else ["ACC", "STG"][i % 2])
+                   if i % 5 == 0 else None for i in range(n)]})
+
+
+def test_partitions():
+    assert parallel.partitions(10, 3) == [(0, 4), (4, 7), (7, 10)]
+    assert parallel.partitions(2, 4) == [(0, 1), (1, 2)]
+    assert parallel.partitions(0, 4) == [(0, 0)]
+
+
+def test_colFromRegex(view):
+    regex = utils.FILE_FORMAT_REGEX
+    assert parallel.colFromRegex(view.name.values, regex, workers=3) == \
+        utils.colFromRegex(view.name.values, regex)
+
+
+def test_matchKeys(view):
+    keys = {"S{}".format(i) for i in range(20)}
+    serial = parallel.matchKeys(view.name.values, r'^(S\d+)_', keys)
+    assert parallel.matchKeys(view.name.values, r'^(S\d+)_', keys,
+                              workers=4) == serial
+
+
+def test_uniqueValues(view):
+    values = parallel.uniqueValues(view, ['specimen', 'tissue'], workers=3)
+    assert values['specimen'] == set(view.specimen)
+    assert {v for v in values['tissue'] if pandas.notnull(v)} == \
+        {'PFC', 'ACC', 'STG'}
+
+
+def test_inferValues(view, capsys):
+    expected = utils.inferValues(view, 'tissue', 'specimen')
+    expectedOutput = capsys.readouterr().out
+    result = parallel.inferValues(view, 'tissue', 'specimen', workers=4)
+    pandas.testing.assert_frame_equal(result, expected)
+    assert capsys.readouterr().out == expectedOutput
+
+
+def test_pipeline_workers(fakeSyn, view):
+    p = annotator.Pipeline(fakeSyn, view=view, workers=2, sortCols=False)
+    p.addFileFormatCol()
+    serial = annotator.Pipeline(fakeSyn, view=view, sortCols=False)
+    serial.addFileFormatCol()
+    assert list(p.view.fileFormat) == list(serial.view.fileFormat)
+
+
+def test_does_not_fork_other_threads(view):
+    import threading
+    done = threading.Event()
+    thread = threading.Thread(target=done.wait)
+    thread.start()
+    try:
+        assert not parallel._context()[1]
+        regex = utils.FILE_FORMAT_REGEX
+        assert parallel.colFromRegex(view.name.values, regex, workers=2) == \
+            utils.colFromRegex(view.name.values, regex)
+    finally:
+        done.set()
+        thread.join()
@@ -0,0 +1,76 @@
+import json
+import pytest
+import pandas
+import annotator
+from annotator import runner
+from . import conftest
+
+
+@pytest.fixture
+def entities(fakeSyn):
+    return conftest.fake_entities(fakeSyn, annotations={'tissue': 'unknown', 'assay': 'unknown'})
+
+
+@pytest.fixture
+def spec(entities):
+    return {'name': 'test',
+            'view': entities['entity_view'].id,
+            'meta': pandas.DataFrame({'specimenID': ['file0', 'file1'],
+                                      'tissue': ['PFC', 'ACC']}),
+            'defaults': {'assay': 'ChIPSeq'},
+            'keyCol': {'data': 'name', 'meta': 'specimenID',
+                       'regex': r'^(file\d)\.csv$'},
+            'links': {'tissue': 'tissue'},
+            'transferLinks': True,
+            'substitutions': {'tissue': {'PFC': 'DLPFC'}},
+            'publish': {'validate': True}}
+
+
+def _online(fakeSyn, spec):
+    return annotator.utils.synread(fakeSyn, spec['view']).sort_values('name')
+
+
+def test_runSpec_declines_unmatched_keys(fakeSyn, spec):
+    with pytest.raises(ValueError):
+        runner.runSpec(fakeSyn, spec)
+    assert list(_online(fakeSyn, spec).tissue) == ['unknown'] * 3
+
+
+def test_runSpec_confirmed(fakeSyn, spec):
+    result = runner.runSpec(fakeSyn, spec, confirm=True)
+    assert result['published']
+    assert result['warnings'] == ['tissue has null values.']
+    online = _online(fakeSyn, spec)
+    assert list(online.tissue[:2]) == ['DLPFC', 'ACC']
+    assert pandas.isnull(online.tissue.iloc[2])
+    assert list(online.assay) == ['ChIPSeq'] * 3
+    assert 'specimenID' not in online.columns
+
+
+def test_runSpec_matched_without_confirmation(fakeSyn, spec):
+    spec['meta'] = pandas.DataFrame({'specimenID': ['file0', 'file1', 'fil'],
+                                     'tissue': ['PFC', 'ACC', 'STG']})
+    spec['keyCol']['regex'] = r'^(file[01]|fil)'
+    result = runner.runSpec(fakeSyn, spec)
+    assert result['published'] and result['warnings'] == []
+
+
+def test_validateSpec():
+    with pytest.raises(ValueError):
+        runner.validateSpec({'view': 'syn1', 'typo': 1})
+    with pytest.raises(ValueError):
+        runner.validateSpec({'view': 'syn1', 'create': {}})
+    with pytest.raises(ValueError):
+        runner.validateSpec({'view': 'syn1', 'keyCol': {'data': 'name'}})
+
+
+def test_runSpecs(fakeSyn, spec, tmpdir):
+    path = tmpdir.join('spec.json')
+    path.write(json.dumps({'view': spec['view'], 'defaults': {'a': 'b'},
+                           'publish': True}))
+    yamlPath = tmpdir.join('spec.yaml')
+    yamlPath.write("view: {}\nbogus: 1\n".format(spec['view']))
+    results = runner.runSpecs(fakeSyn, [str(path), str(yamlPath)], jobs=2,
+                              publish=False)
+    assert results[0]['name'] == 'spec' and not results[0]['published']
+    assert 'bogus' in results[1]['error']
@@ -0,0 +1,52 @@
+import json
+import pandas
+import pytest
+from annotator import schema
+
+
+@pytest.fixture
+def modules(tmpdir):
+    contents = {
+        'tissue': [{'name': 'organ', 'description': 'an organ',
+                    'columnType': 'STRING', 'maximumSize': 50,
+                    'enumValues': [{'value': 'brain', 'description': 'b',
+                                    'source': ''},
+                                   {'value': 'heart', 'description': 'h',
+                                    'source': ''}]}],
+        'assay': [{'name': 'assay', 'description': 'an assay',
+                   'columnType': 'STRING', 'maximumSize': 50,
+                   'enumValues': [{'value': 'rnaSeq', 'description': 'r',
+                                   'source': ''}]},
+                  {'name': 'notes', 'description': 'free text',
+                   'columnType': 'STRING', 'maximumSize': 250,
+                   'enumValues': []}]}
+    names = {}
+    for module, content in contents.items():
+        path = tmpdir.join(module + '.json')
+        path.write(json.dumps(content))
+        names[module] = str(path)
+    return names
+
+
+class TestFlatten(object):
+    def test_flattenJson(self, modules):
+        result = schema.flattenJson(modules['tissue'], 'tissue')
+        assert list(result.value) == ['brain', 'heart']
+        assert set(result.module) == {'tissue'}
+
+    def test_flattenModules_deterministic(self, modules):
+        serial = schema.flattenModules(modules, jobs=1)
+        parallel = schema.flattenModules(modules, jobs=2)
+        pandas.testing.assert_frame_equal(serial, parallel)
+        assert list(serial.module.unique()) == ['assay', 'tissue']
+
+    def test_flattenModules_does_not_fork(self, modules, monkeypatch):
+        contexts = []
+        executor = schema.ProcessPoolExecutor
+
+        def recording(max_workers, mp_context=None):
+            contexts.append(mp_context.get_start_method())
+            return executor(max_workers=max_workers, mp_context=mp_context)
+        monkeypatch.setattr(schema, 'ProcessPoolExecutor', recording)
+        schema.flattenModules(modules, jobs=2)
+        assert contexts and 'fork' not in contexts
@@ -0,0 +1,39 @@
+import time
+import pytest
+import synapseclient
+from . import conftest
+
+
+class TestFakeSynapse(object):
+    def test_tableQuery_filters(self, fakeSyn):
+        entities = conftest.fake_entities(fakeSyn, n=5)
+        view = entities['entity_view'].id
+        ids = [f.id for f in entities['files']]
+        q = "select id from {} where id in ('{}', '{}')".format(
+                view, ids[1], ids[3])
+        assert list(fakeSyn.tableQuery(q).asDataFrame().id) \
+            == [ids[1], ids[3]]
+        q = "select * from {} limit 2 offset 4".format(view)
+        assert len(fakeSyn.tableQuery(q).asDataFrame()) == 1
+        q = "select count(*) from {}".format(view)
+        assert fakeSyn.tableQuery(q).asDataFrame().iloc[0, 0] == 5
+
+    def test_unsupported(self, fakeSyn):
+        view = conftest.fake_entities(fakeSyn)['entity_view'].id
+        with pytest.raises(ValueError, match="does not support GET /version"):
+            fakeSyn.restGET('/version')
+        with pytest.raises(ValueError, match="does not support POST"):
+            fakeSyn.restPOST('/entity/children', body='{}')
+        with pytest.raises(ValueError, match="query"):
+            fakeSyn.tableQuery("select id from {} group by id".format(view))
+        with pytest.raises(ValueError, match="condition: id like 'syn%'"):
+            fakeSyn.tableQuery("select * from {} where id like 'syn%'".format(
+                view))
+
+    def test_latency(self, fakeSyn):
+        fakeSyn.latency = lambda call: 0.05 if call == 'get' else 0
+        project = fakeSyn.store(synapseclient.Project('project'))
+        start = time.time()
+        fakeSyn.get(project.id)
+        assert time.time() - start >= 0.05
+        assert fakeSyn.calls['get'] == 1 and fakeSyn.calls['store'] == 1
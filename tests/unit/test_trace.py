@@ -0,0 +1,96 @@
+import json
+import pytest
+import pandas
+import annotator
+from annotator import trace
+from . import conftest
+
+
+@pytest.fixture
+def tracing():
+    trace.reset()
+    trace.enable()
+    yield
+    trace.disable()
+    trace.reset()
+
+
+@trace.traced
+def outer(df):
+    return inner(df) + 1
+
+
+@trace.traced
+def inner(df):
+    return len(df)
+
+
+def test_disabled_records_nothing():
+    trace.reset()
+    assert not trace.enabled()
+    assert outer(pandas.DataFrame({'a': [1]})) == 2
+    assert trace.events() == []
+
+
+def test_nested_calls(tracing):
+    outer(pandas.DataFrame({'a': [1, 2, 3], 'b': [4, 5, 6]}))
+    innerEvent, outerEvent = trace.events()
+    assert innerEvent['name'] == 'test_trace.inner'
+    assert innerEvent['depth'] == 1 and outerEvent['depth'] == 0
+    assert (innerEvent['rows'], innerEvent['cols']) == (3, 2)
+    assert outerEvent['self'] <= outerEvent['wall'] - innerEvent['wall'] + 1e-6
+
+
+def test_errors_are_recorded(tracing):
+    with pytest.raises(TypeError):
+        outer(None)
+    assert [e['error'] for e in trace.events()] == ['TypeError'] * 2
+
+
+def test_memory(tracing):
+    trace.enable(memory=True)
+    outer(pandas.DataFrame({'a': range(1000)}))
+    assert all(e['memory'] is not None for e in trace.events())
+
+
+def test_pipeline_stats(tracing, fakeSyn, tmpdir):
+    entities = conftest.fake_entities(fakeSyn, annotations={'color': 'red'})
+    p = annotator.Pipeline(fakeSyn, view=entities['entity_view'].id)
+    other = annotator.Pipeline(fakeSyn, view=p.view)
+    p.substituteColumnValues('color', {'red': 'blue'})
+    other.addDefaultValues({'color': 'green'})
+    stats = p.stats()
+    assert stats.loc['Pipeline.substituteColumnValues', 'calls'] == 1
+    assert 'utils.substituteColumnValues' in stats.index
+    assert 'Pipeline.backup' in stats.index
+    assert 'Pipeline.addDefaultValues' not in stats.index
+    assert stats.loc['Pipeline.substituteColumnValues', 'rows'] == 3
+    path = str(tmpdir.join('trace.json'))
+    trace.export(path)
+    with open(path) as f:
+        events = json.load(f)['traceEvents']
+    assert {e['ph'] for e in events} == {'X'}
+    assert 'Pipeline.addDefaultValues' in [e['name'] for e in events]
+
+
+def test_does_not_resolve_pending_or_lazy(tracing):
+    from concurrent.futures import Future
+    from annotator import client
+    from annotator.Pipeline import _Loading
+
+    class Loading(object):
+        view = _Loading('view')
+
+        def __init__(self):
+            self.view = Future()  # never completes
+
+        @trace.traced(method=True)
+        def step(self, syn):
+            return 1
+
+    logins = []
+    syn = client.lazy(lambda: logins.append(1))
+    assert Loading().step(syn) == 1
+    assert logins == []
+    assert (trace.events()[0]['rows'], trace.events()[0]['cols']) == \
+        (None, None)
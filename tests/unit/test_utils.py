@@ -84,6 +84,37 @@ class TestSynapseColumnCreation(object):
             c['defaultValue'] = ''
         assert result == correctResult
 
+    def test_createColumns_cached(self, tmpdir):
+        class Syn(object):
+            repoEndpoint = 'https://repo.example.org'
+            calls = []
+
+            def createColumns(self, cols):
+                self.calls.append(cols)
+                return [synapseclient.Column(id=str(len(self.calls) * 100 + i),
+                                             **c)
+                        for i, c in enumerate(cols)]
+
+        syn = Syn()
+        columnCache = annotator.cache.DiskCache('columns', str(tmpdir))
+        cols = annotator.utils.makeColumns(['hello', 'goodbye', 'hello'],
+                                           asSynapseCols=False)
+        first = annotator.utils.createColumns(syn, cols, columnCache)
+        assert [c['id'] for c in first] == ['100', '101', '100']
+        assert len(syn.calls) == 1 and len(syn.calls[0]) == 2
+        annotator.utils._columnIds.clear()  # a new session, same disk cache
+        second = annotator.utils.createColumns(
+                syn, cols + [{'name': 'x', 'columnType': 'INTEGER'},
+                             {'id': '7', 'name': 'y'}], columnCache)
+        assert [c['id'] for c in second] == ['100', '101', '100', '200', '7']
+        assert len(syn.calls) == 2 and len(syn.calls[1]) == 1
+        # IDs memoized for one cache are still written to another
+        otherCache = annotator.cache.DiskCache('other', str(tmpdir))
+        annotator.utils.createColumns(syn, cols, otherCache)
+        assert len(syn.calls) == 3
+        assert otherCache.get(annotator.utils._columnHash(syn, cols[0])) \
+            == '300'
+
     def test_makeColumns(self):
         with pytest.raises(TypeError):
             annotator.utils.makeColumns(float("nan"))
@@ -173,6 +204,111 @@ class TestMisc(object):
         result = annotator.utils.compareDicts(d1, d2)
         assert result == ({'one'}, {'four'}, {'three'})
 
+    def test_diffDataFrames(self):
+        old = pandas.DataFrame(
+                {'key': ['a', 'a', 'b', 'c'], 'value': ['1', '2', '', 'x'],
+                 'maximumSize': [50.0, 50.0, float('nan'), 10.0]},
+                index=['1_1', '2_1', '3_1', '4_1'])
+        new = pandas.DataFrame(
+                {'key': ['a', 'a', 'b', 'd'], 'value': ['1', '2', '', 'y'],
+                 'maximumSize': [50, 100, None, 10]})
+        deleted, inserted, updated = annotator.utils.diffDataFrames(
+                old, new, ['key', 'value'])
+        assert list(deleted.index) == ['4_1']
+        assert list(inserted.key) == ['d']
+        assert list(updated.index) == ['2_1']
+        assert list(updated.maximumSize) == [100]
+        repeated = pandas.concat([new, new.iloc[[3]]], ignore_index=True)
+        assert len(annotator.utils.diffDataFrames(
+                old, repeated, ['key', 'value'])[1]) == 1
+        repeated.loc[4, 'maximumSize'] = 20
+        with pytest.raises(ValueError, match="'d', 'y'"):
+            annotator.utils.diffDataFrames(old, repeated, ['key', 'value'])
+
+    def test_rebaseEdits(self):
+        snapshot = pandas.DataFrame(
+                {'a': ['x', 'y', 'z'], 'b': [1.0, None, 3.0]},
+                index=['1_1', '2_1', '3_1'])
+        edited = snapshot.drop('3_1')
+        edited.loc['1_1', 'a'] = 'edited'
+        edited['c'] = 'new'
+        fresh = snapshot.copy()
+        fresh.index = ['1_2', '2_2', '3_2']
+        fresh.loc['2_2', 'a'] = 'remote'
+        result = annotator.utils.rebaseEdits(snapshot, edited, fresh)
+        assert list(result.index) == ['1_2', '2_2']
+        assert list(result.a) == ['edited', 'remote']
+        assert list(result.c) == ['new', 'new']
+
+    def test_relabel(self):
+        view = pandas.DataFrame({'a': ['x', 'y', 'z'], 'etag': ['e1'] * 3},
+                                index=['1_1', '2_1', '3_1'])
+        fresh = pandas.DataFrame({'etag': ['f3', 'f1', 'f4']},
+                                 index=['3_2', '1_2', '4_1'])
+        result = annotator.utils.relabel(view, fresh)
+        assert list(result.index) == ['1_2', '2_1', '3_2']
+        assert list(result.etag) == ['f1', 'e1', 'f3']
+        assert list(result.a) == ['x', 'y', 'z']
+        assert list(view.index) == ['1_1', '2_1', '3_1']
+
+    def test_queryPages(self, fakeSyn, monkeypatch):
+        entities = conftest.fake_entities(fakeSyn, n=5)
+        viewRows = fakeSyn._viewRows
+        # rows indexed after each poll: the count stalls mid-build, and
+        # rows behind the last ROW_ID read are indexed late
+        stages = [[4], [2, 4], [2, 4], [2, 4], [0, 1, 2, 3, 4]]
+        stage = [0]
+        monkeypatch.setattr(fakeSyn, '_viewRows', lambda view: [
+                viewRows(view)[i] for i in stages[stage[0]]])
+        monkeypatch.setattr(fakeSyn, '_tableState', lambda synId: (
+                'AVAILABLE' if stage[0] == len(stages) - 1
+                else 'PROCESSING'))
+        monkeypatch.setattr(annotator.utils.time, 'sleep',
+                            lambda s: stage.__setitem__(0, stage[0] + 1))
+        pages = list(annotator.utils.queryPages(
+                fakeSyn, entities['entity_view'].id, pageSize=2))
+        assert [len(p) for p in pages] == [1, 2, 2]
+        expected = annotator.utils.synread(
+                fakeSyn, entities['entity_view'].id, sortCols=False)
+        assert sorted(pandas.concat(pages).index) == sorted(expected.index)
+
+    def test_queryPages_built(self, fakeSyn, monkeypatch):
+        entities = conftest.fake_entities(fakeSyn, n=5)
+        monkeypatch.setattr(annotator.utils.time, 'sleep', None)  # no polls
+        pages = list(annotator.utils.queryPages(
+                fakeSyn, entities['entity_view'].id, pageSize=2))
+        assert [len(p) for p in pages] == [2, 2, 1]
+        assert fakeSyn.calls['tableQuery'] == 3
+
+    def test_profileColumns_proposeColumns(self):
+        df = pandas.DataFrame({'count': ['1', '20', None],
+                               'score': ['1.5', '-2', '3e2'],
+                               'flag': ['true', 'False', 'TRUE'],
+                               'name': ['abc', 'de', 'abc'],
+                               'notes': ['x' * 1001, None, None],
+                               'specimen': ['007', '12', '0123']})
+        profile = annotator.utils.profileColumns(df, list(df.columns))
+        assert list(profile['values']) == [2, 3, 3, 3, 1, 3]
+        assert list(profile.distinct) == [2, 3, 3, 2, 1, 3]
+        assert list(profile.maxLength) == [2, 3, 5, 3, 1001, 4]
+        assert list(profile.integer) == [True, False, False, False, False,
+                                         True]
+        assert list(profile.leadingZeros) == [False] * 5 + [True]
+        current = {'name': {'name': 'name', 'columnType': 'STRING',
+                            'maximumSize': 50, 'id': '7'},
+                   'flag': {'name': 'flag', 'columnType': 'ENTITYID'}}
+        proposal = annotator.utils.proposeColumns(profile, current)
+        assert list(proposal.newColumnType) == [
+                'INTEGER', 'DOUBLE', 'ENTITYID', 'STRING', 'LARGETEXT',
+                'STRING']
+        assert list(proposal.changed) == [True, True, False, False, True,
+                                          True]
+        assert proposal.newMaximumSize['specimen'] == 50
+        current['name']['maximumSize'] = 200
+        proposal = annotator.utils.proposeColumns(profile, current)
+        assert proposal.column['name'] == {
+                'name': 'name', 'columnType': 'STRING', 'maximumSize': 50}
+
     def test_clipboardToDict(self):
         string = "hello:world\ngoodbye:moon"
         os.system("echo '{}' | pbcopy".format(string))